@@ -15,6 +15,8 @@ function! s:ensure_python() abort
   py3 import mcp_vim_bridge
   py3 import mcp_tools
   py3 import mcp_server
+  py3 import mcp_trace
+  py3 import mcp_recorder
   let s:python_loaded = 1
   return 1
 endfunction
@@ -30,6 +32,20 @@ function! mcp_server#start(...) abort
   if s:timer_id == -1
     let s:timer_id = timer_start(50, function('s:poll_requests'), {'repeat': -1})
   endif
+  augroup vim_mcp_server_caches
+    autocmd!
+    autocmd BufFilePost * py3 mcp_tools._reset_bufname_cache()
+    if exists('##DirChanged')
+      autocmd DirChanged * py3 mcp_tools._reset_bufname_cache()
+    endif
+    autocmd SourcePost */filetype.vim,*/ftdetect/*.vim
+          \ py3 mcp_tools._reset_filetype_cache()
+    autocmd TabEnter * if exists('t:mcp_diff_id')
+          \ | execute 'py3 import vim as _vim; mcp_tools.fill_lazy_diff_tab(_vim)'
+          \ | endif
+    autocmd TabClosed * py3 import vim as _vim; mcp_tools.drop_closed_lazy_diffs(_vim)
+    autocmd TabClosed * py3 import vim as _vim; mcp_tools.restore_diffopt(_vim)
+  augroup END
 endfunction
 
 function! mcp_server#stop() abort
@@ -41,6 +57,9 @@ function! mcp_server#stop() abort
     call timer_stop(s:timer_id)
     let s:timer_id = -1
   endif
+  augroup vim_mcp_server_caches
+    autocmd!
+  augroup END
   py3 _mcp_result = mcp_server.stop()
   echo py3eval('_mcp_result')
 endfunction
@@ -59,6 +78,50 @@ function! mcp_server#status() abort
   endif
 endfunction
 
+function! mcp_server#trace(...) abort
+  if !s:ensure_python()
+    return
+  endif
+  let l:arg = get(a:, 1, '')
+  if l:arg ==# 'on'
+    let l:file = get(g:, 'mcp_server_trace_file',
+          \ expand('~/.cache/vim-mcp-server/trace.jsonl'))
+    py3 import vim as _vim; _mcp_result = mcp_trace.enable(_vim.eval('l:file'))
+  elseif l:arg ==# 'off'
+    py3 _mcp_result = mcp_trace.disable()
+  elseif l:arg ==# ''
+    py3 _mcp_result = mcp_trace.status()
+  else
+    echoerr 'McpServerTrace: expected "on" or "off", got "' . l:arg . '"'
+    return
+  endif
+  echo py3eval('_mcp_result')
+endfunction
+
+function! mcp_server#record(...) abort
+  if !s:ensure_python()
+    return
+  endif
+  let l:arg = get(a:, 1, '')
+  if l:arg ==# 'on'
+    let l:file = get(g:, 'mcp_server_record_file',
+          \ expand('~/.cache/vim-mcp-server/record.jsonl'))
+    py3 import vim as _vim; _mcp_result = mcp_recorder.start(_vim.eval('l:file'))
+  elseif l:arg ==# 'off'
+    py3 _mcp_result = mcp_recorder.stop()
+  elseif l:arg ==# ''
+    py3 _mcp_result = mcp_recorder.status()
+  else
+    echoerr 'McpServerRecord: expected "on" or "off", got "' . l:arg . '"'
+    return
+  endif
+  echo py3eval('_mcp_result')
+endfunction
+
+function! mcp_server#trace_complete(...) abort
+  return "on\noff"
+endfunction
+
 function! s:poll_requests(timer) abort
   py3 << EOF
 import vim as _vim
@@ -6,6 +6,8 @@ let g:loaded_mcp_server = 1
 command! -nargs=? McpServerStart call mcp_server#start(<f-args>)
 command! -nargs=0 McpServerStop  call mcp_server#stop()
 command! -nargs=0 McpServerStatus call mcp_server#status()
+command! -nargs=? -complete=custom,mcp_server#trace_complete McpServerTrace call mcp_server#trace(<f-args>)
+command! -nargs=? -complete=custom,mcp_server#trace_complete McpServerRecord call mcp_server#record(<f-args>)
 
 augroup vim_mcp_server
   autocmd!
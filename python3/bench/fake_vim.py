@@ -0,0 +1,892 @@
+import contextlib
+import json
+import os
+import re
+import threading
+
+import mcp_tools
+import mcp_vim_bridge
+
+
+# An in-memory stand-in for the `vim` module, good enough to run the real
+# tool code without Vim.  It understands the Ex commands and expressions
+# mcp_tools sends; anything else raises `error` the way Vim would, so a
+# tool that starts using something new fails loudly instead of getting a
+# made-up answer.
+
+
+class error(Exception):
+    pass
+
+
+_FNAMEESCAPE_CHARS = set(" \t\n*?[{`$\\%#'\"|!<")
+
+_FILETYPES = {
+    ".c": "c",
+    ".cpp": "cpp",
+    ".go": "go",
+    ".h": "c",
+    ".js": "javascript",
+    ".json": "json",
+    ".md": "markdown",
+    ".py": "python",
+    ".rs": "rust",
+    ".sh": "sh",
+    ".ts": "typescript",
+    ".txt": "text",
+    ".vim": "vim",
+}
+
+_WINDOW_OPTIONS = {"diff", "foldenable", "foldmethod", "scrollbind", "cursorbind", "synmaxcol", "wrap"}
+
+_MODIFIERS = {
+    "silent", "silent!", "noautocmd", "keepalt", "keepjumps", "keepmarks",
+    "lockmarks", "hide", "vert", "vertical",
+}
+
+def _to_vim(value):
+    # vim.eval() hands back numbers as strings, also inside lists and dicts.
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, list):
+        return [_to_vim(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _to_vim(v) for k, v in value.items()}
+    return value
+
+
+def _literal(text):
+    text = text.strip()
+    if text.startswith("'") and text.endswith("'") and len(text) >= 2:
+        return text[1:-1].replace("''", "'")
+    try:
+        return json.loads(text)
+    except ValueError:
+        raise error(f"E15: Invalid expression: {text}") from None
+
+
+def _split_top(text, sep):
+    parts = []
+    depth = 0
+    quote = None
+    start = 0
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if quote:
+            if ch == "\\" and quote == '"':
+                i += 1
+            elif ch == quote:
+                if quote == "'" and text[i + 1:i + 2] == "'":
+                    i += 1
+                else:
+                    quote = None
+        elif ch in "'\"":
+            quote = ch
+        elif ch in "([{":
+            depth += 1
+        elif ch in ")]}":
+            depth -= 1
+        elif ch == "\\" and sep == "|":
+            i += 1
+        elif ch == sep and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+        i += 1
+    parts.append(text[start:])
+    return [p.strip() for p in parts]
+
+
+def _unescape_filename(text):
+    return re.sub(r"\\(.)", r"\1", text.strip())
+
+
+class FakeBuffer:
+    def __init__(self, number, name="", lines=None):
+        self.number = number
+        self.name = name
+        self._lines = list(lines) if lines else [""]
+        self.vars = {}
+        self.options = {
+            "modified": 0,
+            "modifiable": 1,
+            "buflisted": 1,
+            "buftype": "",
+            "bufhidden": "",
+            "filetype": "",
+            "swapfile": 1,
+        }
+        self.changedtick = 1
+        self.loaded = True
+
+    def __len__(self):
+        return len(self._lines)
+
+    def __iter__(self):
+        return iter(self._lines)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._lines[index]
+        return self._lines[index]
+
+    def _changed(self):
+        if not self.options["modifiable"]:
+            raise error("E21: Cannot make changes, 'modifiable' is off")
+        self.changedtick += 1
+        self.options["modified"] = 1
+
+    def __setitem__(self, index, value):
+        self._changed()
+        if isinstance(index, slice):
+            self._lines[index] = list(value)
+        else:
+            self._lines[index] = value
+        if not self._lines:
+            self._lines.append("")
+
+    def __delitem__(self, index):
+        self._changed()
+        del self._lines[index]
+        if not self._lines:
+            self._lines.append("")
+
+    def append(self, lines, index=None):
+        if isinstance(lines, str):
+            lines = [lines]
+        if index is None:
+            index = len(self._lines)
+        self[index:index] = lines
+
+    def _is_empty_scratch(self):
+        return not self.name and not self.options["modified"] and self._lines == [""]
+
+
+class FakeWindow:
+    def __init__(self, window_id, buffer):
+        self.id = window_id
+        self.buffer = buffer
+        self._cursor = (1, 0)
+        self.vars = {}
+        self.options = {"diff": 0, "foldenable": 1, "foldmethod": "manual", "synmaxcol": 3000}
+        self.loclist = _QuickfixList()
+
+    @property
+    def cursor(self):
+        return self._cursor
+
+    @cursor.setter
+    def cursor(self, position):
+        row, col = position
+        if row < 1 or row > len(self.buffer):
+            raise error("cursor position outside buffer")
+        self._cursor = (row, max(0, min(col, len(self.buffer[row - 1]))))
+
+
+class FakeTabpage:
+    def __init__(self, window):
+        self.windows = [window]
+        self.window = window
+        self.vars = {}
+
+
+class _QuickfixList:
+    def __init__(self):
+        self.items = []
+        self.title = ""
+        self.id = 0
+        self.changedtick = 0
+
+
+class _Buffers:
+    def __init__(self, vim):
+        self._vim = vim
+
+    def __getitem__(self, number):
+        return self._vim._buffers[number]
+
+    def __iter__(self):
+        return iter(list(self._vim._buffers.values()))
+
+    def __len__(self):
+        return len(self._vim._buffers)
+
+
+class _Current:
+    def __init__(self, vim):
+        self._vim = vim
+
+    @property
+    def tabpage(self):
+        return self._vim._tab
+
+    @property
+    def window(self):
+        return self._vim._tab.window
+
+    @property
+    def buffer(self):
+        return self._vim._tab.window.buffer
+
+
+class FakeVim:
+    error = error
+
+    def __init__(self, features=("popupwin", "patch-8.1.0360", "patch-9.1.1009")):
+        self.features = set(features)
+        self.globals = {}
+        self.options = {"lazyredraw": 0, "eventignore": "", "diffopt": "internal,filler,closeoff", "hidden": 0}
+        self.messages = []
+        self.quickfix = _QuickfixList()
+        self._last_list_id = 0
+        self.visual = None
+        self.calls = {"eval": 0, "command": 0}
+        self.autocmds = []
+        self._buffers = {}
+        self._names = {}
+        self._next_buffer = 1
+        self._next_window = 1000
+        self._popups = {}
+        self.buffers = _Buffers(self)
+        self.current = _Current(self)
+        self._tab = FakeTabpage(self._new_window(self._new_buffer()))
+        self.tabpages = [self._tab]
+        self._evals = self._eval_table()
+
+    # -- setup helpers for tests and benchmarks --------------------------
+
+    def add_buffer(self, name="", lines=None, listed=True, show=False):
+        buf = self._new_buffer(name, lines)
+        buf.options["buflisted"] = int(listed)
+        if show:
+            self._show(self.current.window, buf)
+        return buf
+
+    @property
+    def windows(self):
+        return list(self._tab.windows)
+
+    def all_windows(self):
+        return [w for tab in self.tabpages for w in tab.windows]
+
+    # -- the vim module API ----------------------------------------------
+
+    def Function(self, name):
+        funcs = {
+            "getqflist": lambda what: self._get_list(self.quickfix, what),
+            "setqflist": lambda items, action, what: self._set_list(self.quickfix, action, what),
+            "getloclist": lambda nr, what: self._get_list(self._window_arg(nr).loclist, what),
+            "setloclist": lambda nr, items, action, what: self._set_list(self._window_arg(nr).loclist, action, what),
+        }
+        if name not in funcs:
+            raise error(f"E117: Unknown function: {name}")
+        return funcs[name]
+
+    def eval(self, expr):
+        self.calls["eval"] += 1
+        return _to_vim(self._eval(expr.strip()))
+
+    def command(self, cmd):
+        self.calls["command"] += 1
+        skipping = []
+        for part in _split_top(cmd, "|"):
+            if not part:
+                continue
+            word = part.split(None, 1)[0]
+            if word == "if":
+                skipping.append(bool(skipping and skipping[-1]) or not self._truthy(part[2:]))
+                continue
+            if word == "endif":
+                skipping.pop()
+                continue
+            if skipping and skipping[-1]:
+                continue
+            self._command(part)
+
+    # -- buffers, windows and tabs ---------------------------------------
+
+    def _new_buffer(self, name="", lines=None):
+        buf = FakeBuffer(self._next_buffer, name, lines)
+        self._next_buffer += 1
+        self._buffers[buf.number] = buf
+        if name:
+            self._names[name] = buf
+        return buf
+
+    def _new_window(self, buf):
+        win = FakeWindow(self._next_window, buf)
+        self._next_window += 1
+        return win
+
+    def _buffer_for_name(self, name, load):
+        buf = self._names.get(name)
+        if buf is None:
+            # Like a quickfix entry for a file that is not open: known to
+            # Vim, but neither loaded nor listed.
+            buf = self._new_buffer(name)
+            buf.loaded = False
+            buf.options["buflisted"] = 0
+        if load and not buf.loaded:
+            buf._lines = self._read(name)
+            buf.loaded = True
+            buf.options["buflisted"] = 1
+        return buf
+
+    def _read(self, path):
+        try:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                text = f.read()
+        except OSError:
+            return [""]
+        lines = text.split("\n")
+        if text.endswith("\n"):
+            lines.pop()
+        return lines or [""]
+
+    def _rename(self, buf, name):
+        if self._names.get(buf.name) is buf:
+            del self._names[buf.name]
+        buf.name = name
+        if name:
+            self._names[name] = buf
+
+    def _window_arg(self, nr):
+        if int(nr) == 0:
+            return self.current.window
+        for win in self.all_windows():
+            if win.id == int(nr):
+                return win
+        raise error(f"E957: Invalid window number: {nr}")
+
+    def _displayed(self, buf):
+        return any(w.buffer is buf for w in self.all_windows()) or any(
+            w.buffer is buf for w in self._popups.values()
+        )
+
+    def _show(self, win, buf, hide=False):
+        old = win.buffer
+        if old is buf:
+            return
+        if not hide and old.options["modified"] and not self.options["hidden"] and old.options["bufhidden"] not in ("hide", "wipe"):
+            if sum(w.buffer is old for w in self.all_windows()) == 1:
+                raise error("E37: No write since last change (add ! to override)")
+        win.buffer = buf
+        win._cursor = (1, 0)
+        self._abandon(old)
+
+    def _abandon(self, buf):
+        if self._displayed(buf):
+            return
+        if buf.options["bufhidden"] == "wipe" or buf._is_empty_scratch():
+            self._wipe(buf)
+
+    def _wipe(self, buf):
+        self._buffers.pop(buf.number, None)
+        if self._names.get(buf.name) is buf:
+            del self._names[buf.name]
+
+    def _find_window(self, window_id):
+        for win in self.all_windows():
+            if win.id == window_id:
+                return win
+        return self._popups.get(window_id)
+
+    def _with_window(self, win, func):
+        # Like win_execute(): make win current without autocommands, then
+        # put everything back.  Popups belong to no tab and borrow this one.
+        tab = next((t for t in self.tabpages if win in t.windows), None)
+        prev_tab, prev_win = self._tab, self._tab.window
+        if tab is None:
+            tab = self._tab
+            tab.windows.append(win)
+        tab_win = tab.window
+        self._tab = tab
+        tab.window = win
+        try:
+            func()
+        finally:
+            if win.id in self._popups and win in tab.windows:
+                tab.windows.remove(win)
+            tab.window = tab_win
+            self._tab = prev_tab
+            prev_tab.window = prev_win
+
+    # -- quickfix and location lists -------------------------------------
+
+    def _get_list(self, qf, what):
+        result = {}
+        if "title" in what:
+            result["title"] = qf.title
+        if "size" in what:
+            result["size"] = len(qf.items)
+        if "id" in what:
+            result["id"] = qf.id
+        if "changedtick" in what:
+            result["changedtick"] = qf.changedtick
+        if "items" in what:
+            result["items"] = [dict(item) for item in qf.items]
+        return result
+
+    def _set_list(self, qf, action, what):
+        # One list per stack: an id other than its own is a freed list.
+        if "id" in what and what["id"] != qf.id:
+            return -1
+        items = []
+        for item in what.get("items", []):
+            bufnr = item.get("bufnr", 0)
+            filename = item.get("filename")
+            if filename:
+                bufnr = self._buffer_for_name(filename, load=False).number
+            items.append({
+                "bufnr": bufnr,
+                "lnum": item.get("lnum", 0),
+                "col": item.get("col", 0),
+                "text": item.get("text", ""),
+                "type": item.get("type", ""),
+                "valid": 1,
+            })
+        if action == " " or not qf.id:
+            # A new list, with ids shared by quickfix and location lists.
+            self._last_list_id += 1
+            qf.id = self._last_list_id
+            qf.changedtick = 0
+            qf.title = ""
+        if action == "a":
+            qf.items.extend(items)
+        else:
+            qf.items = items
+        if "title" in what:
+            qf.title = what["title"]
+        qf.changedtick += 1
+        return 0
+
+    # -- expressions -----------------------------------------------------
+
+    def _eval_table(self):
+        def buffer_arg(text):
+            return self._buffers.get(int(text))
+
+        def bufname(n):
+            buf = buffer_arg(n)
+            return buf.name if buf else ""
+
+        def getbufvar(n, name):
+            buf = buffer_arg(n)
+            if buf is None:
+                return ""
+            if name == "changedtick":
+                return buf.changedtick
+            if name.startswith("&"):
+                return buf.options.get(name[1:], "")
+            return buf.vars.get(name, "")
+
+        table = [
+            (r"win_getid\(\)", lambda: self.current.window.id),
+            (r"tabpagenr\(\)", lambda: self.tabpages.index(self._tab) + 1),
+            (r"tabpagenr\('\$'\)", lambda: len(self.tabpages)),
+            (r"mode\(\)", lambda: self.visual["mode"] if self.visual else "n"),
+            (r"bufname\('%'\)", lambda: self.current.buffer.name),
+            (r"bufname\((\d+)\)", bufname),
+            (r"buflisted\((\d+)\)", lambda n: int(bool(buffer_arg(n)) and buffer_arg(n).options["buflisted"])),
+            (r"bufwinnr\((\d+)\)", self._bufwinnr),
+            (r"getbufvar\((\d+), '([&\w]+)'\)", getbufvar),
+            (r"has\('([\w.-]+)'\)", lambda name: int(name in self.features)),
+            (r"&(\w+)", self._option),
+            (r"get\(([gtbw]):, '(\w+)', (.+)\)", self._get_var),
+            (r"fnameescape\('(.*)'\)", lambda s: self._fnameescape(s.replace("''", "'"))),
+            (r"get\(win_findbuf\((\d+)\), 0, -1\)", self._first_window_for),
+            (r"popup_create\((\d+), \{'hidden': 1\}\)", self._popup_create),
+            (re.escape("getqflist({'id': 0}).id"), lambda: self.quickfix.id),
+            (r"execute\('messages'\)", lambda: "\n" + "\n".join(self.messages) if self.messages else ""),
+            (r"getpos\('([v.])'\)", self._getpos),
+            (r"getregion\(getpos\('v'\), getpos\('\.'\), #\{ type: mode\(\) \}\)", self._getregion),
+            (r"map\((\[[\d, ]*\]), 'bufname\(v:val\)'\)", lambda ns: [bufname(n) for n in json.loads(ns)]),
+            (
+                r"map\((\[[\d, ]*\]), '\[bufloaded\(v:val\), bufname\(v:val\), "
+                r"getbufvar\(v:val, \"changedtick\"\)\]'\)",
+                lambda ns: [
+                    [int(bool(buffer_arg(n)) and buffer_arg(n).loaded), bufname(n), getbufvar(n, "changedtick")]
+                    for n in json.loads(ns)
+                ],
+            ),
+            (
+                re.escape(
+                    "map(getbufinfo({'bufloaded': 1}), "
+                    "'[v:val.bufnr, v:val.name, v:val.changedtick, getbufvar(v:val.bufnr, \"&buftype\")]')"
+                ),
+                lambda: [
+                    [b.number, b.name, b.changedtick, b.options["buftype"]]
+                    for b in self._buffers.values() if b.loaded
+                ],
+            ),
+            (
+                re.escape(
+                    "map(filter(getbufinfo({'bufmodified': 1}), "
+                    "'v:val.name !=# \"\" && getbufvar(v:val.bufnr, \"&buftype\") ==# \"\"'), "
+                    "'v:val.bufnr')"
+                ),
+                lambda: [
+                    b.number for b in self._buffers.values()
+                    if b.options["modified"] and b.name and not b.options["buftype"]
+                ],
+            ),
+            (
+                re.escape("filter(range(1, tabpagenr('$')), 'gettabvar(v:val, \"mcp_diff_reuse\", 0)')"),
+                lambda: [i for i, tab in enumerate(self.tabpages, 1) if self._truthy_value(tab.vars.get("mcp_diff_reuse", 0))],
+            ),
+        ]
+        return [(re.compile(pattern), func) for pattern, func in table]
+
+    def _eval(self, expr):
+        for pattern, func in self._evals:
+            m = pattern.fullmatch(expr)
+            if m:
+                return func(*m.groups())
+        if expr.startswith("[") and expr.endswith("]"):
+            return [self._eval(part) for part in _split_top(expr[1:-1], ",") if part]
+        if re.fullmatch(r"-?\d+", expr) or expr.startswith("'"):
+            return _literal(expr)
+        raise error(f"E15: Invalid expression: \"{expr}\"")
+
+    def _truthy(self, expr):
+        return self._truthy_value(self._eval(expr.strip()))
+
+    def _truthy_value(self, value):
+        try:
+            return int(value) != 0
+        except (TypeError, ValueError):
+            return False
+
+    def _scope(self, scope):
+        return {
+            "g": self.globals,
+            "t": self._tab.vars,
+            "w": self.current.window.vars,
+            "b": self.current.buffer.vars,
+        }[scope]
+
+    def _get_var(self, scope, name, default):
+        variables = self._scope(scope)
+        if name in variables:
+            return variables[name]
+        return _literal(default)
+
+    def _option(self, name):
+        if name in self.options:
+            return self.options[name]
+        if name in _WINDOW_OPTIONS:
+            return self.current.window.options.get(name, "")
+        if name in self.current.buffer.options:
+            return self.current.buffer.options[name]
+        raise error(f"E113: Unknown option: {name}")
+
+    def _fnameescape(self, name):
+        escaped = "".join("\\" + ch if ch in _FNAMEESCAPE_CHARS else ch for ch in name)
+        if escaped[:1] in ("-", "+", ">"):
+            escaped = "\\" + escaped
+        return escaped
+
+    def _bufwinnr(self, number):
+        for i, win in enumerate(self._tab.windows, 1):
+            if win.buffer.number == int(number):
+                return i
+        return -1
+
+    def _first_window_for(self, number):
+        for win in self.all_windows():
+            if win.buffer.number == int(number):
+                return win.id
+        return -1
+
+    def _popup_create(self, number):
+        buf = self._buffers.get(int(number))
+        if buf is None:
+            raise error(f"E86: Buffer {number} does not exist")
+        win = self._new_window(buf)
+        self._popups[win.id] = win
+        return win.id
+
+    def _getpos(self, which):
+        row, col = self.current.window.cursor
+        if which == "v" and self.visual:
+            row, col = self.visual["start"]
+        return [0, row, col + 1, 0]
+
+    def _getregion(self):
+        mode = self.visual["mode"] if self.visual else "v"
+        start = self.visual["start"] if self.visual else self.current.window.cursor
+        end = self.current.window.cursor
+        (l1, c1), (l2, c2) = sorted([start, end])
+        lines = self.current.buffer[l1 - 1:l2]
+        if mode == "V":
+            return lines
+        if mode == "\x16":
+            left, right = sorted([c1, c2])
+            return [line[left:right + 1] for line in lines]
+        if len(lines) == 1:
+            return [lines[0][c1:c2 + 1]]
+        return [lines[0][c1:]] + lines[1:-1] + [lines[-1][:c2 + 1]]
+
+    # -- Ex commands -----------------------------------------------------
+
+    def _command(self, cmd):
+        silent = False
+        name, _, arg = cmd.strip().partition(" ")
+        while name in _MODIFIERS:
+            silent = silent or name == "silent!"
+            name, _, arg = arg.strip().partition(" ")
+        if not name:
+            return
+        try:
+            self._run_command(name, arg.strip())
+        except error:
+            if not silent:
+                raise
+
+    def _run_command(self, name, arg):
+        bang = name.endswith("!")
+        name = name.rstrip("!")
+        m = re.fullmatch(r"execute bufwinnr\((\d+)\) \. 'wincmd w'", f"{name} {arg}")
+        if m:
+            number = self._bufwinnr(m.group(1))
+            if number == -1:
+                raise error("E16: Invalid range")
+            self._tab.window = self._tab.windows[number - 1]
+            return
+        handler = getattr(self, "_cmd_" + name, None)
+        if handler is None:
+            raise error(f"E492: Not an editor command: {name} {arg}".rstrip())
+        handler(arg, bang)
+
+    def _cmd_set(self, arg, bang):
+        for item in arg.split():
+            m = re.fullmatch(r"(\w+)([+-]?=)(.*)", item)
+            if m is None:
+                key = item[2:] if item.startswith("no") else item
+                if key not in self.options:
+                    raise error(f"E518: Unknown option: {item}")
+                self.options[key] = 0 if item.startswith("no") else 1
+                continue
+            key, op, value = m.groups()
+            if key not in self.options:
+                raise error(f"E518: Unknown option: {key}")
+            current = [v for v in str(self.options[key]).split(",") if v]
+            if op == "+=":
+                current += [v for v in value.split(",") if v not in current]
+                value = ",".join(current)
+            elif op == "-=":
+                value = ",".join(v for v in current if v != value)
+            self.options[key] = value
+
+    def _cmd_setlocal(self, arg, bang):
+        buf = self.current.buffer
+        win = self.current.window
+        for item in arg.split():
+            if item.endswith("<"):
+                win.options.pop(item[:-1], None)
+                continue
+            if "=" in item:
+                key, value = item.split("=", 1)
+                value = int(value) if value.isdigit() else value
+            elif item.startswith("no"):
+                key, value = item[2:], 0
+            else:
+                key, value = item, 1
+            if key == "syntax":
+                continue
+            if key in _WINDOW_OPTIONS:
+                win.options[key] = value
+            else:
+                buf.options[key] = value
+
+    def _cmd_let(self, arg, bang):
+        target, _, value = arg.partition("=")
+        target = target.strip()
+        value = self._eval(value.strip()) if not value.strip().startswith("[") else _literal(value)
+        if target.startswith("&"):
+            self.options[target[1:]] = value
+            return
+        scope, _, name = target.partition(":")
+        self._scope(scope)[name] = value
+
+    def _cmd_unlet(self, arg, bang):
+        for target in arg.split():
+            scope, _, name = target.partition(":")
+            variables = self._scope(scope)
+            if name not in variables:
+                if not bang:
+                    raise error(f"E108: No such variable: \"{target}\"")
+                continue
+            del variables[name]
+
+    def _cmd_call(self, arg, bang):
+        m = re.fullmatch(r"win_execute\((\d+), '(.*)'\)", arg)
+        if m:
+            win = self._find_window(int(m.group(1)))
+            if win is None:
+                raise error(f"E994: Not allowed in a popup window: {m.group(1)}")
+            self._with_window(win, lambda: self.command(m.group(2).replace("''", "'")))
+            return
+        m = re.fullmatch(r"popup_close\((\d+)\)", arg)
+        if m:
+            self._popups.pop(int(m.group(1)), None)
+            return
+        m = re.fullmatch(r"setbufvar\((\d+), '(\w+)', (.*)\)", arg)
+        if m:
+            buf = self._buffers.get(int(m.group(1)))
+            if buf is not None:
+                buf.vars[m.group(2)] = _literal(m.group(3))
+            return
+        raise error(f"E117: Unknown function: {arg}")
+
+    def _cmd_doautocmd(self, arg, bang):
+        self.autocmds.append(arg.replace("<nomodeline>", "").strip())
+
+    def _cmd_echo(self, arg, bang):
+        self._eval(arg)
+
+    def _cmd_echomsg(self, arg, bang):
+        self.messages.append(str(self._eval(arg)))
+
+    _cmd_echom = _cmd_echomsg
+
+    def _cmd_edit(self, arg, bang):
+        name = os.path.abspath(_unescape_filename(arg))
+        self._show(self.current.window, self._buffer_for_name(name, load=True), hide=bang)
+
+    def _cmd_enew(self, arg, bang):
+        self._show(self.current.window, self._new_buffer(), hide=bang)
+
+    def _cmd_buffer(self, arg, bang):
+        buf = self._buffers.get(int(arg))
+        if buf is None:
+            raise error(f"E86: Buffer {arg} does not exist")
+        buf.loaded = True
+        self._show(self.current.window, buf, hide=True)
+
+    def _cmd_bdelete(self, arg, bang):
+        buf = self._buffers.get(int(arg)) if arg else self.current.buffer
+        if buf is None:
+            raise error(f"E516: No buffers were deleted: bdelete {arg}")
+        if buf.options["modified"] and not bang:
+            raise error(f"E89: No write since last change for buffer {buf.number} (add ! to override)")
+        buf.options["buflisted"] = 0
+        buf.loaded = False
+        buf.options["modified"] = 0
+        others = [b for b in self._buffers.values() if b is not buf and b.options["buflisted"]]
+        for win in self.all_windows():
+            if win.buffer is buf:
+                win.buffer = others[-1] if others else self._new_buffer()
+                win._cursor = (1, 0)
+
+    def _cmd_write(self, arg, bang):
+        buf = self.current.buffer
+        if buf.options["buftype"]:
+            raise error("E382: Cannot write, 'buftype' option is set")
+        if not buf.name:
+            raise error("E32: No file name")
+        try:
+            with open(buf.name, "w", encoding="utf-8") as f:
+                f.write("\n".join(buf) + "\n")
+        except OSError as e:
+            raise error(f"E212: Can't open file for writing: {e}") from None
+        buf.options["modified"] = 0
+        self.messages.append(f'"{buf.name}" {len(buf)}L written')
+
+    def _cmd_file(self, arg, bang):
+        name = _unescape_filename(arg)
+        other = self._names.get(name)
+        if other is not None and other is not self.current.buffer:
+            # Unlisted and unloaded buffers count too, as in Vim.
+            raise error("E95: Buffer with this name already exists")
+        self._rename(self.current.buffer, name)
+
+    def _cmd_filetype(self, arg, bang):
+        if arg != "detect":
+            raise error(f"E475: Invalid argument: {arg}")
+        ext = os.path.splitext(self.current.buffer.name)[1]
+        self.current.buffer.options["filetype"] = _FILETYPES.get(ext, "")
+
+    def _cmd_syntax(self, arg, bang):
+        pass
+
+    def _cmd_tabnew(self, arg, bang):
+        tab = FakeTabpage(self._new_window(self._new_buffer()))
+        self.tabpages.insert(self.tabpages.index(self._tab) + 1, tab)
+        self._tab = tab
+
+    def _cmd_tabnext(self, arg, bang):
+        index = int(arg) - 1 if arg else (self.tabpages.index(self._tab) + 1) % len(self.tabpages)
+        if not 0 <= index < len(self.tabpages):
+            raise error("E16: Invalid range")
+        self._tab = self.tabpages[index]
+
+    def _cmd_vnew(self, arg, bang):
+        win = self._new_window(self._new_buffer())
+        self._tab.windows.insert(self._tab.windows.index(self._tab.window), win)
+        self._tab.window = win
+
+    def _cmd_diffsplit(self, arg, bang):
+        buf = self._buffer_for_name(os.path.abspath(_unescape_filename(arg)), load=True)
+        win = self._new_window(buf)
+        self._tab.windows.insert(self._tab.windows.index(self._tab.window), win)
+        self._tab.window = win
+        self._cmd_diffthis("", False)
+
+    def _cmd_diffthis(self, arg, bang):
+        self.current.window.options.update({"diff": 1, "foldmethod": "diff", "foldenable": 1, "scrollbind": 1})
+
+    def _cmd_diffupdate(self, arg, bang):
+        pass
+
+    def _cmd_copen(self, arg, bang):
+        pass
+
+    _cmd_lopen = _cmd_copen
+
+
+@contextlib.contextmanager
+def inline(vim):
+    # Runs main-thread requests right away on the calling thread instead of
+    # queueing them for Vim's timer, the same way the timer would run them.
+    lock = threading.Lock()
+
+    def submit(func_name, args):
+        with lock:
+            try:
+                return mcp_tools.execute_on_main_thread(vim, func_name, args)
+            except Exception as e:
+                return {"error": str(e)}
+
+    original = mcp_tools._submit_to_main_thread
+    mcp_tools._submit_to_main_thread = submit
+    try:
+        yield vim
+    finally:
+        mcp_tools._submit_to_main_thread = original
+
+
+@contextlib.contextmanager
+def main_thread(vim, tick=0.05):
+    # Plays the part of Vim's timer in autoload/mcp_server.vim: every tick
+    # it drains the bridge queue and runs the requests one after another.
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(tick):
+            for req_id, func_name, args in mcp_vim_bridge.drain_requests():
+                try:
+                    result = mcp_tools.execute_on_main_thread(vim, func_name, args)
+                except Exception as e:
+                    result = {"error": str(e)}
+                mcp_vim_bridge.post_result(req_id, result)
+
+    thread = threading.Thread(target=loop, name="fake-vim-main", daemon=True)
+    thread.start()
+    try:
+        yield vim
+    finally:
+        stop.set()
+        thread.join()
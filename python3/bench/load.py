@@ -0,0 +1,261 @@
+import argparse
+import contextlib
+import http.client
+import json
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import mcp_server
+from bench import tools
+from bench.fake_vim import main_thread
+
+
+# Drives the real HTTP server with concurrent MCP clients.  Requests for
+# Vim's main thread are run by a thread that drains the bridge queue on a
+# timer, the way Vim does, against a fake Vim with realistic contents, so
+# this runs anywhere without Vim.
+#
+#   cd python3 && python -m bench.load --clients 8 --duration 10
+
+DEFAULT_MIX = {
+    "get_buffer": 4,
+    "get_cursor": 2,
+    "get_quickfix_list": 2,
+    "list_buffers": 1,
+    "search_buffers": 1,
+    "compute_diff": 1,
+    "get_messages": 1,
+    "apply_text_edits": 1,
+    "set_cursor": 1,
+}
+
+
+class Workload:
+    def __init__(self, env):
+        self.env = env
+        vim = env.fresh_vim()
+        self.others = env.many_buffers()
+        tools._set_quickfix(env, env.size(tools.QUICKFIX_ENTRIES))
+        self.big = env.big_buffer()
+        self.changed = env.vim.add_buffer(
+            env.path("changed.py"), tools._lines(env.size(tools.BUFFER_LINES), every=10)
+        )
+        self.quickfix_size = len(vim.quickfix.items)
+
+    def args(self, tool, rng):
+        return getattr(self, "_" + tool)(rng)
+
+    def _line(self, rng):
+        return rng.randrange(len(self.big))
+
+    def _get_buffer(self, rng):
+        start = self._line(rng) + 1
+        return {"buffer_id": self.big.number, "start_line": start, "end_line": start + 99}
+
+    def _get_cursor(self, rng):
+        return {}
+
+    def _set_cursor(self, rng):
+        return {"line": self._line(rng) + 1, "column": 1}
+
+    def _list_buffers(self, rng):
+        return {}
+
+    def _get_quickfix_list(self, rng):
+        return {"offset": rng.randrange(self.quickfix_size), "limit": 100}
+
+    def _search_buffers(self, rng):
+        return {"pattern": rf"rows\[{rng.randrange(1000)}\]", "max_results": 100}
+
+    def _compute_diff(self, rng):
+        return {"buffer_a": rng.choice(self.others).number, "buffer_b": self.changed.number, "format": "hunks"}
+
+    def _get_messages(self, rng):
+        return {"since": 0}
+
+    def _apply_text_edits(self, rng):
+        # Same-length replacement, so the buffer keeps its shape however
+        # long the run is.
+        line = self._line(rng)
+        return {
+            "buffer_id": self.big.number,
+            "edits": [{
+                "range": {"start": {"line": line, "character": 4}, "end": {"line": line, "character": 9}},
+                "newText": "total",
+            }],
+        }
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if not hasattr(Workload, "_" + name):
+            raise ValueError(f"no load-test arguments for tool: {name}")
+        mix[name] = float(weight) if weight else 1.0
+        if mix[name] < 0:
+            raise ValueError(f"negative weight for {name}")
+    if not any(mix.values()):
+        raise ValueError("the mix needs a tool with a positive weight")
+    return mix
+
+
+def percentile(values, pct):
+    # Nearest rank, on sorted values.
+    if not values:
+        return None
+    rank = max(1, -(-len(values) * pct // 100))
+    return values[int(rank) - 1]
+
+
+def post(port, payload):
+    # Returns the HTTP status and the decoded JSON-RPC response, which is
+    # None for notifications.
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+    try:
+        conn.request("POST", "/mcp", json.dumps(payload), {"Content-Type": "application/json"})
+        response = conn.getresponse()
+        body = response.read()
+    finally:
+        conn.close()
+    return response.status, json.loads(body) if response.status == 200 else None
+
+
+def is_ok(status, response):
+    if status == 202:
+        return response is None
+    return status == 200 and "result" in response and not response["result"].get("isError")
+
+
+@contextlib.contextmanager
+def serving(vim, tick=0.05):
+    # The real server on a free port, with requests for Vim's main thread
+    # run against `vim` every tick.
+    with main_thread(vim, tick):
+        mcp_server.start(0)
+        try:
+            yield mcp_server._server.server_address[1]
+        finally:
+            mcp_server.stop()
+
+
+def _client(port, workload, mix, deadline, seed, samples):
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    post(port, {"jsonrpc": "2.0", "id": 0, "method": "initialize", "params": {}})
+    request_id = 0
+    while time.monotonic() < deadline:
+        tool = rng.choices(names, weights)[0]
+        request_id += 1
+        payload = {
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "method": "tools/call",
+            "params": {"name": tool, "arguments": workload.args(tool, rng)},
+        }
+        start = time.monotonic()
+        try:
+            ok = is_ok(*post(port, payload))
+        except (OSError, http.client.HTTPException, ValueError):
+            ok = False
+        samples.append((tool, time.monotonic() - start, ok))
+
+
+def summary(latencies, errors, duration):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    ms = lambda v: None if v is None else round(v * 1000, 3)
+    return {
+        "requests": count,
+        "errors": errors,
+        "throughput_rps": round(count / duration, 2) if duration else None,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1] if latencies else None),
+    }
+
+
+def run(clients=8, duration=10.0, mix=None, tick=0.05, scale=1.0, seed=1):
+    mix = mix or DEFAULT_MIX
+    with tempfile.TemporaryDirectory(prefix="mcp-load-") as workdir:
+        tools._reset_caches()
+        workload = Workload(tools.Env(workdir, scale))
+        with serving(workload.env.vim, tick) as port:
+            per_client = [[] for _ in range(clients)]
+            start = time.monotonic()
+            threads = [
+                threading.Thread(target=_client, args=(port, workload, mix, start + duration, seed + i, samples))
+                for i, samples in enumerate(per_client)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.monotonic() - start
+        tools._reset_caches()
+
+    samples = [s for client_samples in per_client for s in client_samples]
+    by_tool = {}
+    for tool, latency, ok in samples:
+        entry = by_tool.setdefault(tool, ([], [0]))
+        entry[0].append(latency)
+        entry[1][0] += not ok
+    return {
+        "clients": clients,
+        "duration_s": round(elapsed, 3),
+        "tick_s": tick,
+        "scale": scale,
+        "mix": mix,
+        "overall": summary([s[1] for s in samples], sum(not s[2] for s in samples), elapsed),
+        "tools": {tool: summary(lat, err[0], elapsed) for tool, (lat, err) in sorted(by_tool.items())},
+    }
+
+
+def _format(report):
+    overall = report["overall"]
+    lines = [
+        f"{report['clients']} clients for {report['duration_s']:.1f}s, tick {report['tick_s'] * 1000:.0f}ms: "
+        f"{overall['requests']} requests, {overall['errors']} errors, {overall['throughput_rps']} req/s",
+        f"{'':<20} {'requests':>9} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'max ms':>10}",
+    ]
+    for name, s in [("all", overall)] + list(report["tools"].items()):
+        if not s["requests"]:
+            continue
+        lines.append(
+            f"{name:<20} {s['requests']:>9} {s['p50_ms']:>10.1f} {s['p95_ms']:>10.1f} {s['p99_ms']:>10.1f} {s['max_ms']:>10.1f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.load", description="Load-test the MCP server against a fake Vim.")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent MCP clients (default 8)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run (default 10)")
+    parser.add_argument("--mix", help="tool=weight,... (default %s)" % ",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items()))
+    parser.add_argument("--tick", type=float, default=0.05, help="seconds between main-thread drains (default 0.05, as in Vim)")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply the editor contents by this (default 1.0)")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the tool mix")
+    parser.add_argument("--output", help="also write the report as JSON to this file")
+    options = parser.parse_args(argv)
+    try:
+        mix = parse_mix(options.mix) if options.mix else None
+    except ValueError as e:
+        parser.error(str(e))
+
+    report = run(options.clients, options.duration, mix, options.tick, options.scale, options.seed)
+    print(_format(report))
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    return 1 if report["overall"]["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+import argparse
+import http.client
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from bench import load, tools
+
+
+# Re-issues requests recorded with :McpServerRecord against the real
+# server, backed by the fake Vim, at the recorded pace or faster.  The
+# editor state of the recording is not in the trace, so it is stood in
+# for: recorded buffer numbers get buffers of --lines lines, recorded
+# paths are mapped to files of that size under a scratch git repository,
+# and the quickfix list gets --quickfix-entries entries.
+#
+#   cd python3 && python -m bench.replay ~/.cache/vim-mcp-server/record.jsonl --speed 10
+
+_BUFFER_ARGS = ("buffer_id", "buffer_a", "buffer_b")
+_PATH_ARGS = ("buffer_path", "path", "file_a", "file_b")
+_DIRECTORY_TOOLS = {"search_files"}
+_FILES_PER_DIRECTORY = 20
+
+
+def load_trace(path):
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entries.append(json.loads(line))
+    entries.sort(key=lambda e: e["time"])
+    return entries
+
+
+def _arguments(entry):
+    params = entry.get("params")
+    if entry.get("method") != "tools/call" or not isinstance(params, dict):
+        return None, None
+    args = params.get("arguments")
+    return params.get("name"), args if isinstance(args, dict) else None
+
+
+def _local_path(env, path):
+    parts = [p for p in re.split(r"[\\/]+", os.path.splitdrive(path)[1]) if p not in ("", ".", "..")]
+    return env.path("root", *parts)
+
+
+def _write(path, lines):
+    try:
+        tools._write(path, lines)
+    except OSError:
+        # The recording used the path as both a file and a directory.
+        pass
+
+
+def _git_repo(root, changed):
+    git = tools._GIT + ["-C", root]
+    try:
+        subprocess.run(git + ["init", "-q"], check=True, capture_output=True)
+        subprocess.run(git + ["add", "-A"], check=True, capture_output=True)
+        subprocess.run(git + ["commit", "-q", "-m", "replay"], check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError):
+        return
+    # Working-tree changes, so the git diff tools have something to show.
+    for path in changed:
+        _write(path, changed[path])
+
+
+def prepare(env, entries, lines, quickfix_entries):
+    # Builds the fake editor and returns the payloads to send, with the
+    # recorded paths rewritten to their stand-ins.
+    vim = env.fresh_vim()
+    contents = tools._lines(lines)
+    buffer_ids, files, directories, buffer_paths = set(), set(), set(), set()
+    for entry in entries:
+        tool, args = _arguments(entry)
+        if args is None:
+            continue
+        for key in _BUFFER_ARGS:
+            if isinstance(args.get(key), int):
+                buffer_ids.add(args[key])
+        if isinstance(args.get("buffer_ids"), list):
+            buffer_ids.update(n for n in args["buffer_ids"] if isinstance(n, int))
+        for key in _PATH_ARGS:
+            value = args.get(key)
+            if not isinstance(value, str) or not value:
+                continue
+            if key == "path" and tool in _DIRECTORY_TOOLS:
+                directories.add(value)
+            else:
+                files.add(value)
+            if key == "buffer_path":
+                buffer_paths.add(value)
+
+    paths = {path: _local_path(env, path) for path in files | directories}
+    for path in files:
+        _write(paths[path], contents)
+    for path in directories:
+        for i in range(_FILES_PER_DIRECTORY):
+            _write(os.path.join(paths[path], f"file{i}.py"), contents)
+    if paths:
+        changed = tools._lines(lines, every=10)
+        _git_repo(env.path("root"), {paths[p]: changed for p in files})
+
+    # The fake numbers buffers from 1 like Vim, so the recorded numbers
+    # come out the same; the gaps are unlisted and empty.
+    if 1 in buffer_ids:
+        vim.buffers[1][:] = contents
+        vim.buffers[1].options["modified"] = 0
+    for number in range(2, max(buffer_ids, default=0) + 1):
+        if number in buffer_ids:
+            vim.add_buffer(env.path("buffers", f"buffer{number}.py"), contents)
+        else:
+            vim.add_buffer(listed=False)
+    for path in sorted(buffer_paths):
+        vim.add_buffer(paths[path], contents)
+    vim.add_buffer(env.path("buffers", "current.py"), contents, show=True)
+    if quickfix_entries:
+        tools._set_quickfix(env, quickfix_entries)
+
+    payloads = []
+    for entry in entries:
+        payload = {"jsonrpc": "2.0", "method": entry.get("method", "")}
+        if entry.get("id") is not None:
+            payload["id"] = entry["id"]
+        params = entry.get("params")
+        tool, args = _arguments(entry)
+        if args is not None:
+            args = {k: paths.get(v, v) if k in _PATH_ARGS and isinstance(v, str) else v for k, v in args.items()}
+            params = dict(params, arguments=args)
+        if params is not None:
+            payload["params"] = params
+        payloads.append(payload)
+    return payloads
+
+
+def _send(port, payload, samples, index):
+    start = time.monotonic()
+    try:
+        ok = load.is_ok(*load.post(port, payload))
+    except (OSError, http.client.HTTPException, ValueError):
+        ok = False
+    samples[index] = (time.monotonic() - start, ok)
+
+
+def _name(entry):
+    tool, _ = _arguments(entry)
+    return tool or entry.get("method", "")
+
+
+def replay(entries, speed=1.0, tick=0.05, lines=2000, quickfix_entries=1000):
+    # speed 1 keeps the recorded gaps between requests, 10 shrinks them
+    # tenfold, and 0 sends each request when the previous one is answered.
+    if not entries:
+        raise ValueError("the trace has no requests")
+    with tempfile.TemporaryDirectory(prefix="mcp-replay-") as workdir:
+        tools._reset_caches()
+        env = tools.Env(workdir, 1.0)
+        payloads = prepare(env, entries, lines, quickfix_entries)
+        samples = [None] * len(entries)
+        first = entries[0]["time"]
+        with load.serving(env.vim, tick) as port:
+            threads = []
+            start = time.monotonic()
+            for i, (entry, payload) in enumerate(zip(entries, payloads)):
+                if not speed:
+                    _send(port, payload, samples, i)
+                    continue
+                delay = start + (entry["time"] - first) / speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                thread = threading.Thread(target=_send, args=(port, payload, samples, i))
+                thread.start()
+                threads.append(thread)
+            for thread in threads:
+                thread.join()
+            elapsed = time.monotonic() - start
+        tools._reset_caches()
+
+    recorded_span = max(e["time"] + e.get("duration_ms", 0) / 1000 for e in entries) - first
+    groups = {}
+    for entry, (latency, ok) in zip(entries, samples):
+        group = groups.setdefault(_name(entry), {"recorded": [], "recorded_errors": 0, "replayed": [], "errors": 0})
+        group["recorded"].append(entry.get("duration_ms", 0) / 1000)
+        group["recorded_errors"] += bool(entry.get("error"))
+        group["replayed"].append(latency)
+        group["errors"] += not ok
+
+    def report(group):
+        return {
+            "recorded": load.summary(group["recorded"], group["recorded_errors"], recorded_span),
+            "replayed": load.summary(group["replayed"], group["errors"], elapsed),
+        }
+
+    everything = {"recorded": [], "recorded_errors": 0, "replayed": [], "errors": 0}
+    for group in groups.values():
+        for key in everything:
+            everything[key] += group[key]
+    return {
+        "requests": len(entries),
+        "speed": speed,
+        "tick_s": tick,
+        "recorded_duration_s": round(recorded_span, 3),
+        "duration_s": round(elapsed, 3),
+        # Calls that worked when recorded but not here.
+        "new_errors": sum(
+            1 for entry, (_, ok) in zip(entries, samples) if not ok and not entry.get("error")
+        ),
+        "overall": report(everything),
+        "tools": {name: report(group) for name, group in sorted(groups.items())},
+    }
+
+
+def _format(report):
+    lines = [
+        f"{report['requests']} requests recorded over {report['recorded_duration_s']:.1f}s, "
+        f"replayed in {report['duration_s']:.1f}s at speed {report['speed']:g}, tick {report['tick_s'] * 1000:.0f}ms; "
+        f"{report['new_errors']} failed that had succeeded",
+        f"{'':<26} {'requests':>9} {'errors':>11} {'p50 ms':>17} {'p95 ms':>17} {'p99 ms':>17}",
+        f"{'':<26} {'':>9} {'rec/replay':>11} {'rec/replay':>17} {'rec/replay':>17} {'rec/replay':>17}",
+    ]
+    for name, r in [("all", report["overall"])] + list(report["tools"].items()):
+        rec, rep = r["recorded"], r["replayed"]
+        cells = [f"{rec[k]:.1f}/{rep[k]:.1f}" for k in ("p50_ms", "p95_ms", "p99_ms")]
+        errors = f"{rec['errors']}/{rep['errors']}"
+        lines.append(f"{name:<26} {rep['requests']:>9} {errors:>11} {cells[0]:>17} {cells[1]:>17} {cells[2]:>17}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.replay", description="Replay recorded MCP traffic against a fake Vim.")
+    parser.add_argument("trace", help="file written by :McpServerRecord")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 keeps the recorded pace, 10 is ten times faster, 0 sends requests back to back")
+    parser.add_argument("--tick", type=float, default=0.05, help="seconds between main-thread drains (default 0.05, as in Vim)")
+    parser.add_argument("--lines", type=int, default=2000, help="lines in each stand-in buffer and file (default 2000)")
+    parser.add_argument("--quickfix-entries", type=int, default=1000, help="entries in the quickfix list (default 1000)")
+    parser.add_argument("--output", help="also write the report as JSON to this file")
+    options = parser.parse_args(argv)
+    if options.speed < 0:
+        parser.error("--speed must not be negative")
+
+    try:
+        report = replay(load_trace(options.trace), options.speed, options.tick, options.lines, options.quickfix_entries)
+    except (OSError, ValueError, KeyError) as e:
+        parser.error(f"cannot replay {options.trace}: {e}")
+    print(_format(report))
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    return 1 if report["new_errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,491 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import mcp_git
+import mcp_git_objects
+import mcp_tools
+from bench.fake_vim import FakeVim, inline
+
+
+# Times every tool in mcp_tools.TOOL_DEFINITIONS against a fake Vim holding
+# editor state of a realistic size.  Main-thread requests run inline, so
+# the numbers are the cost of the tool code and the Vim calls it makes,
+# without the 50ms timer tick in front of them.
+#
+#   cd python3 && python -m bench.tools --compare bench/results/<old>.json
+
+BIG_LINES = 100_000
+MANY_BUFFERS = 1_000
+BUFFER_LINES = 200
+QUICKFIX_ENTRIES = 50_000
+SEARCH_FILES = 1_000
+GIT_FILES = 50
+
+_RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+_GIT = ["git", "-c", "user.name=bench", "-c", "user.email=bench@localhost", "-c", "commit.gpgsign=false"]
+
+
+def _line(i):
+    return f"    total_{i % 977} = compute(rows[{i}], {i % 13})"
+
+
+def _lines(count, every=0):
+    # every > 0 changes one line in every `every`, for the other side of a diff.
+    return [_line(i) + (" # changed" if every and i % every == every // 2 else "") for i in range(count)]
+
+
+def _write(path, lines):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def _entries(count, files):
+    return [
+        {"filename": files[i % len(files)], "line": i % 500 + 1, "column": 5, "text": _line(i), "type": "W"}
+        for i in range(count)
+    ]
+
+
+def _reset_caches():
+    mcp_tools._reset_diffopt_patch_cache()
+    mcp_tools._reset_line_index_cache()
+    mcp_tools._reset_buffer_snapshots()
+    mcp_tools._reset_bufname_cache()
+    mcp_tools._reset_message_ring()
+    mcp_tools._reset_lazy_diffs()
+    mcp_tools._reset_rename_maps()
+    mcp_tools._reset_diff_cache()
+    mcp_tools._reset_filetype_cache()
+    mcp_git.reset_repo_root_cache()
+    mcp_git_objects.reset_cache()
+
+
+class Env:
+    def __init__(self, workdir, scale):
+        self.workdir = workdir
+        self.scale = scale
+        self.vim = None
+        self._fixtures = {}
+
+    def size(self, count):
+        return max(1, int(count * self.scale))
+
+    def fixture(self, name, make):
+        if name not in self._fixtures:
+            self._fixtures[name] = make()
+        return self._fixtures[name]
+
+    def fresh_vim(self):
+        self.vim = FakeVim()
+        self.vim.globals.update({
+            "mcp_server_allow_edit": 1,
+            "mcp_server_allow_save": 1,
+            "mcp_server_allow_execute": 1,
+        })
+        return self.vim
+
+    def path(self, *parts):
+        return os.path.join(self.workdir, *parts)
+
+    # -- shared fixtures -------------------------------------------------
+
+    def big_lines(self):
+        return self.fixture("big_lines", lambda: _lines(self.size(BIG_LINES)))
+
+    def big_lines_changed(self):
+        return self.fixture("big_lines_changed", lambda: _lines(self.size(BIG_LINES), every=100))
+
+    def big_buffer(self, show=True):
+        return self.vim.add_buffer(self.path("big.py"), self.big_lines(), show=show)
+
+    def many_buffers(self, modified=False):
+        lines = self.fixture("buffer_lines", lambda: _lines(self.size(BUFFER_LINES)))
+        buffers = []
+        os.makedirs(self.path("many"), exist_ok=True)
+        for i in range(self.size(MANY_BUFFERS)):
+            buf = self.vim.add_buffer(self.path("many", f"file{i}.py"), lines)
+            buf.options["modified"] = int(modified)
+            buffers.append(buf)
+        return buffers
+
+    def big_file(self, changed=False):
+        name = "big_changed.py" if changed else "big_file.py"
+
+        def make():
+            _write(self.path(name), self.big_lines_changed() if changed else self.big_lines())
+            return self.path(name)
+        return self.fixture(name, make)
+
+    def quickfix_files(self):
+        return self.fixture("qf_files", lambda: [self.path("src", f"module{i}.py") for i in range(200)])
+
+    def search_tree(self):
+        def make():
+            lines = _lines(BUFFER_LINES)
+            for i in range(self.size(SEARCH_FILES)):
+                _write(self.path("tree", f"dir{i % 20}", f"file{i}.py"), lines)
+            return self.path("tree")
+        return self.fixture("search_tree", make)
+
+    def git_repo(self):
+        def make():
+            root = self.path("repo")
+            os.makedirs(root)
+            subprocess.run(_GIT + ["init", "-q", root], check=True)
+            _write(os.path.join(root, "big.py"), self.big_lines())
+            small = _lines(self.size(BUFFER_LINES) * 10)
+            for i in range(GIT_FILES):
+                _write(os.path.join(root, "src", f"file{i}.py"), small)
+            subprocess.run(_GIT + ["-C", root, "add", "-A"], check=True)
+            subprocess.run(_GIT + ["-C", root, "commit", "-q", "-m", "base"], check=True)
+            _write(os.path.join(root, "big.py"), self.big_lines_changed())
+            changed = _lines(self.size(BUFFER_LINES) * 10, every=50)
+            for i in range(GIT_FILES):
+                _write(os.path.join(root, "src", f"file{i}.py"), changed)
+            return root
+        return self.fixture("git_repo", make)
+
+
+def _set_quickfix(env, count):
+    items = mcp_tools._build_setqflist_items(_entries(count, env.quickfix_files()))
+    env.vim.Function("setqflist")([], "r", {"items": items, "title": "bench"})
+
+
+def _set_loclist(env, count):
+    items = mcp_tools._build_setqflist_items(_entries(count, env.quickfix_files()))
+    env.vim.Function("setloclist")(0, [], "r", {"items": items, "title": "bench"})
+
+
+def _big_contents(env, **args):
+    return dict(args, content_a="\n".join(env.big_lines()), content_b="\n".join(env.big_lines_changed()))
+
+
+def _list_buffers(env):
+    env.many_buffers()
+    return {}
+
+
+def _get_buffer(env):
+    env.big_buffer()
+    return {}
+
+
+def _get_buffer_range(env):
+    middle = len(env.big_buffer()) // 2
+    return {"start_line": middle, "end_line": middle + 99}
+
+
+def _edit_buffer(env):
+    middle = len(env.big_buffer()) // 2
+    return {"action": "replace", "start_line": middle, "end_line": middle + 99, "new_lines": _lines(100, every=2)}
+
+
+def _apply_text_edits(env):
+    lines = len(env.big_buffer())
+    step = max(1, lines // 1000)
+    return {"edits": [
+        {
+            "range": {"start": {"line": i, "character": 4}, "end": {"line": i, "character": 9}},
+            "newText": "result",
+        }
+        for i in range(0, lines, step)
+    ]}
+
+
+def _open_file(env):
+    return {"path": env.big_file()}
+
+
+def _save_buffer(env):
+    return {"buffer_id": env.big_buffer().number}
+
+
+def _save_modified_buffers(env):
+    env.many_buffers(modified=True)
+    return {"all_modified": True}
+
+
+def _close_buffer(env):
+    buffers = env.many_buffers()
+    return {"buffer_id": buffers[len(buffers) // 2].number}
+
+
+def _get_cursor(env):
+    env.big_buffer()
+    return {}
+
+
+def _set_cursor(env):
+    return {"line": max(1, len(env.big_buffer()) * 3 // 4), "column": 5}
+
+
+def _get_visual_selection(env):
+    buf = env.big_buffer()
+    start = len(buf) // 2
+    env.vim.visual = {"mode": "V", "start": (start, 0)}
+    env.vim.current.window.cursor = (min(len(buf), start + env.size(10_000)), 0)
+    return {}
+
+
+def _execute_command(env):
+    return {"command": "echomsg 'bench'"}
+
+
+def _get_quickfix_list(env):
+    _set_quickfix(env, env.size(QUICKFIX_ENTRIES))
+    return {}
+
+
+def _get_quickfix_page(env):
+    _set_quickfix(env, env.size(QUICKFIX_ENTRIES))
+    return {"offset": env.size(QUICKFIX_ENTRIES) // 2, "limit": 100}
+
+
+def _get_quickfix_unchanged(env):
+    _set_quickfix(env, env.size(QUICKFIX_ENTRIES))
+    return {"changedtick": env.vim.quickfix.changedtick, "id": env.vim.quickfix.id}
+
+
+def _set_list_entries(env):
+    return {"entries": _entries(env.size(QUICKFIX_ENTRIES), env.quickfix_files()), "title": "bench"}
+
+
+def _get_location_list(env):
+    _set_loclist(env, env.size(QUICKFIX_ENTRIES))
+    return {}
+
+
+def _get_messages(env):
+    env.vim.messages.extend(f"E{i}: failure {i}" if i % 10 == 0 else f"message {i}" for i in range(1000))
+    mcp_tools._exec_get_messages(env.vim, {"since": 0})
+    env.vim.messages.extend(f"message {i}" for i in range(1000, 1100))
+    return {"since": 1000, "severity": ["error", "info"]}
+
+
+def _search_big_buffer(env):
+    env.big_buffer()
+    return {"pattern": r"rows\[\d+99\]", "max_results": 1000}
+
+
+def _search_many_buffers(env):
+    env.many_buffers()
+    return {"pattern": "total_5", "max_results": 5000, "quickfix": True}
+
+
+def _search_files(env):
+    return {"pattern": r"rows\[\d*77\]", "path": env.search_tree(), "max_results": 10_000}
+
+
+def _show_diff_contents(env):
+    return _big_contents(env)
+
+
+def _show_diff_reused_tab(env):
+    # The first diff opens the tab outside the timing; the measured one
+    # refills it.
+    mcp_tools.call_tool("show_diff", dict(_big_contents(env), content_b="\n".join(env.big_lines()), reuse_tab=True))
+    return _big_contents(env, reuse_tab=True)
+
+
+def _show_diff_files(env):
+    return {"file_a": env.big_file(), "file_b": env.big_file(changed=True)}
+
+
+def _show_diff_unified(env):
+    return _big_contents(env, view="unified")
+
+
+def _show_git_diff(env):
+    return {"path": os.path.join(env.git_repo(), "big.py")}
+
+
+def _show_git_diff_all(env):
+    return {"path": os.path.join(env.git_repo(), "big.py"), "all_files": True}
+
+
+def _show_git_diff_all_unified(env):
+    return {"path": os.path.join(env.git_repo(), "big.py"), "all_files": True, "view": "unified"}
+
+
+def _compute_diff_contents(env):
+    return _big_contents(env)
+
+
+def _compute_diff_buffers(env):
+    other = env.vim.add_buffer(env.path("big2.py"), env.big_lines_changed())
+    return {"buffer_a": env.big_buffer().number, "buffer_b": other.number, "format": "hunks"}
+
+
+SCENARIOS = [
+    ("list_buffers", "1k buffers", _list_buffers),
+    ("get_buffer", "100k lines", _get_buffer),
+    ("get_buffer", "100 of 100k lines", _get_buffer_range),
+    ("edit_buffer", "replace 100 of 100k lines", _edit_buffer),
+    ("apply_text_edits", "1k edits in 100k lines", _apply_text_edits),
+    ("open_file", "100k-line file", _open_file),
+    ("save_buffer", "100k lines", _save_buffer),
+    ("save_buffer", "1k modified buffers", _save_modified_buffers),
+    ("close_buffer", "1 of 1k buffers", _close_buffer),
+    ("get_cursor", "100k lines", _get_cursor),
+    ("set_cursor", "100k lines", _set_cursor),
+    ("get_visual_selection", "10k of 100k lines", _get_visual_selection),
+    ("execute_command", "echomsg", _execute_command),
+    ("get_quickfix_list", "50k entries", _get_quickfix_list),
+    ("get_quickfix_list", "page of 50k entries", _get_quickfix_page),
+    ("get_quickfix_list", "50k entries unchanged", _get_quickfix_unchanged),
+    ("set_quickfix_list", "50k entries", _set_list_entries),
+    ("get_location_list", "50k entries", _get_location_list),
+    ("set_location_list", "50k entries", _set_list_entries),
+    ("get_messages", "100 new of 1.1k messages", _get_messages),
+    ("search_buffers", "100k lines", _search_big_buffer),
+    ("search_buffers", "1k buffers to quickfix", _search_many_buffers),
+    ("search_files", "1k files", _search_files),
+    ("show_diff", "100k-line contents", _show_diff_contents),
+    ("show_diff", "100k-line contents in reused tab", _show_diff_reused_tab),
+    ("show_diff", "100k-line files", _show_diff_files),
+    ("show_diff", "100k-line contents, unified", _show_diff_unified),
+    ("show_git_diff", "100k-line file", _show_git_diff),
+    ("show_git_diff", "all files", _show_git_diff_all),
+    ("show_git_diff", "all files, unified", _show_git_diff_all_unified),
+    ("compute_diff", "100k-line contents", _compute_diff_contents),
+    ("compute_diff", "100k-line buffers", _compute_diff_buffers),
+]
+
+
+def run_scenario(env, tool, setup, repeat):
+    times = []
+    stats = {}
+    for _ in range(repeat):
+        _reset_caches()
+        vim = env.fresh_vim()
+        with inline(vim):
+            args = setup(env)
+            calls = dict(vim.calls)
+            start = time.perf_counter()
+            try:
+                result = mcp_tools.call_tool(tool, args)
+            except Exception as e:
+                result = {"error": f"{type(e).__name__}: {e}"}
+            times.append(time.perf_counter() - start)
+        if isinstance(result, dict) and "error" in result:
+            return {"tool": tool, "error": result["error"]}
+        stats = {
+            "evals": vim.calls["eval"] - calls["eval"],
+            "commands": vim.calls["command"] - calls["command"],
+            "result_bytes": len(result if isinstance(result, str) else json.dumps(result)),
+        }
+    return {
+        "tool": tool,
+        "runs": repeat,
+        "min_ms": round(min(times) * 1000, 3),
+        "median_ms": round(statistics.median(times) * 1000, 3),
+        "mean_ms": round(statistics.mean(times) * 1000, 3),
+        "max_ms": round(max(times) * 1000, 3),
+        **stats,
+    }
+
+
+def run(scale=1.0, repeat=3, only=None, log=None):
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="mcp-bench-") as workdir:
+        env = Env(workdir, scale)
+        for tool, variant, setup in SCENARIOS:
+            name = f"{tool}: {variant}"
+            if only and only not in name:
+                continue
+            results[name] = run_scenario(env, tool, setup, repeat)
+            if log:
+                log(_format_row(name, results[name]))
+    mcp_git.close_all()
+    _reset_caches()
+    return results
+
+
+def _git_commit():
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(
+            ["git", "-C", here, "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "-C", here, "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("-dirty" if dirty else "")
+
+
+def _format_row(name, result):
+    if "error" in result:
+        return f"{name:<50} ERROR {result['error']}"
+    return f"{name:<50} {result['median_ms']:>10.2f} ms  (min {result['min_ms']:.2f}, {result['evals']} evals, {result['commands']} commands)"
+
+
+def compare(old, new, threshold):
+    lines = []
+    regressions = []
+    for name, result in new["results"].items():
+        before = old["results"].get(name)
+        if before is None or "error" in before or "error" in result:
+            continue
+        ratio = result["median_ms"] / before["median_ms"] if before["median_ms"] else float("inf")
+        flag = ""
+        if ratio > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 / threshold:
+            flag = "  faster"
+        lines.append(f"{name:<50} {before['median_ms']:>10.2f} -> {result['median_ms']:>10.2f} ms  x{ratio:.2f}{flag}")
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.tools", description="Benchmark every MCP tool against a fake Vim.")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every size by this (default 1.0)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario (default 3)")
+    parser.add_argument("--only", help="run only scenarios whose name contains this")
+    parser.add_argument("--output", help="JSON file to write (default bench/results/<commit>.json)")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="median ratio counted as a regression (default 1.25)")
+    options = parser.parse_args(argv)
+
+    commit = _git_commit()
+    report = {
+        "commit": commit,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": options.scale,
+        "repeat": options.repeat,
+        "results": run(options.scale, max(1, options.repeat), options.only, log=print),
+    }
+    output = options.output or os.path.join(_RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+    print(f"Results written to {output}")
+
+    failed = any("error" in r for r in report["results"].values())
+    if options.compare:
+        with open(options.compare, encoding="utf-8") as f:
+            old = json.load(f)
+        lines, regressions = compare(old, report, options.threshold)
+        print(f"\nCompared with {old.get('commit', options.compare)}:")
+        print("\n".join(lines))
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
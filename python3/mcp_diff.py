@@ -0,0 +1,239 @@
+import bisect
+import difflib
+from collections import Counter
+
+
+_MAX_CHAIN = 64
+# Regions without a unique line cost up to quadratic time: the histogram
+# scan tries every common line, and SequenceMatcher takes 0.2s on 1000 x
+# 1000 lines of a two-line alphabet.  One diff may spend this many steps
+# (lines compared, or lines of a times lines of b for SequenceMatcher) on
+# them in all; regions past that are reported as one replacement.
+_BUDGET = 500_000
+
+
+def _intern(a, b):
+    ids = {}
+    a_ids = [ids.setdefault(line, len(ids)) for line in a]
+    b_ids = [ids.setdefault(line, len(ids)) for line in b]
+    return a_ids, b_ids
+
+
+def _unique_anchors(a, b, a0, a1, b0, b1):
+    # Patience diff: the lines that occur exactly once on each side,
+    # matched up in order (the longest increasing run of their positions
+    # in b).  The counts are taken once for the region and every gap
+    # between two anchors is diffed on its own, so an evenly changed file
+    # costs O(n log n) instead of one scan of the rest per change.
+    count_a = Counter(a[a0:a1])
+    count_b = Counter(b[b0:b1])
+    position_b = {b[j]: j for j in range(b0, b1) if count_b[b[j]] == 1 and count_a[b[j]] == 1}
+    if not position_b:
+        return []
+    pairs = [(i, position_b[a[i]]) for i in range(a0, a1) if a[i] in position_b]
+    tails, tail_js, previous = [], [], []
+    for k, (_, j) in enumerate(pairs):
+        n = bisect.bisect_left(tail_js, j)
+        previous.append(tails[n - 1] if n else None)
+        if n == len(tails):
+            tails.append(k)
+            tail_js.append(j)
+        else:
+            tails[n] = k
+            tail_js[n] = j
+    anchors = []
+    k = tails[-1]
+    while k is not None:
+        anchors.append(pairs[k])
+        k = previous[k]
+    anchors.reverse()
+    return anchors
+
+
+def _best_region(a, b, a0, a1, b0, b1, budget):
+    # Histogram diff, for regions without a line unique to both sides:
+    # prefer the common region anchored on the line that is rarest in a,
+    # then the longest such region.
+    occurrences = {}
+    for i in range(a0, a1):
+        occurrences.setdefault(a[i], []).append(i)
+
+    best = None
+    best_count = _MAX_CHAIN + 1
+    j = b0
+    while j < b1:
+        if budget[0] <= 0:
+            return None
+        positions = occurrences.get(b[j])
+        if positions is None or len(positions) > best_count:
+            j += 1
+            continue
+        next_j = j + 1
+        for i in positions:
+            start_a, start_b = i, j
+            while start_a > a0 and start_b > b0 and a[start_a - 1] == b[start_b - 1]:
+                start_a -= 1
+                start_b -= 1
+            end_a, end_b = i + 1, j + 1
+            while end_a < a1 and end_b < b1 and a[end_a] == b[end_b]:
+                end_a += 1
+                end_b += 1
+            count = min(len(occurrences[a[k]]) for k in range(start_a, end_a))
+            length = end_a - start_a
+            budget[0] -= length + 1
+            if best is None or count < best_count or (count == best_count and length > best[2]):
+                best = (start_a, start_b, length)
+                best_count = count
+            next_j = max(next_j, end_b)
+        j = next_j
+    return best
+
+
+def _fallback_blocks(a, b, a0, a1, b0, b1, budget):
+    cells = (a1 - a0) * (b1 - b0)
+    if cells > budget[0]:
+        return []
+    budget[0] -= cells
+    matcher = difflib.SequenceMatcher(None, a[a0:a1], b[b0:b1], autojunk=False)
+    return [(a0 + i, b0 + j, n) for i, j, n in matcher.get_matching_blocks() if n]
+
+
+def matching_blocks(a, b):
+    a, b = _intern(a, b)
+    blocks = []
+    stack = [(0, len(a), 0, len(b))]
+    budget = [_BUDGET]
+    while stack:
+        a0, a1, b0, b1 = stack.pop()
+        prefix = 0
+        while a0 + prefix < a1 and b0 + prefix < b1 and a[a0 + prefix] == b[b0 + prefix]:
+            prefix += 1
+        if prefix:
+            blocks.append((a0, b0, prefix))
+            a0 += prefix
+            b0 += prefix
+        suffix = 0
+        while a1 - suffix > a0 and b1 - suffix > b0 and a[a1 - suffix - 1] == b[b1 - suffix - 1]:
+            suffix += 1
+        if suffix:
+            blocks.append((a1 - suffix, b1 - suffix, suffix))
+            a1 -= suffix
+            b1 -= suffix
+        if a0 == a1 or b0 == b1:
+            continue
+        anchors = _unique_anchors(a, b, a0, a1, b0, b1)
+        if anchors:
+            blocks.extend((i, j, 1) for i, j in anchors)
+            edges = [(a0 - 1, b0 - 1)] + anchors + [(a1, b1)]
+            for (i0, j0), (i1, j1) in zip(edges, edges[1:]):
+                stack.append((i0 + 1, i1, j0 + 1, j1))
+            continue
+        region = _best_region(a, b, a0, a1, b0, b1, budget)
+        if region is None:
+            blocks.extend(_fallback_blocks(a, b, a0, a1, b0, b1, budget))
+            continue
+        start_a, start_b, length = region
+        blocks.append(region)
+        stack.append((start_a + length, a1, start_b + length, b1))
+        stack.append((a0, start_a, b0, start_b))
+    blocks.sort()
+    merged = []
+    for block in blocks:
+        if merged and merged[-1][0] + merged[-1][2] == block[0] and merged[-1][1] + merged[-1][2] == block[1]:
+            merged[-1] = (merged[-1][0], merged[-1][1], merged[-1][2] + block[2])
+        else:
+            merged.append(block)
+    return merged
+
+
+def opcodes(a, b):
+    codes = []
+    i = j = 0
+    for start_a, start_b, length in matching_blocks(a, b) + [(len(a), len(b), 0)]:
+        if i < start_a and j < start_b:
+            codes.append(("replace", i, start_a, j, start_b))
+        elif i < start_a:
+            codes.append(("delete", i, start_a, j, start_b))
+        elif j < start_b:
+            codes.append(("insert", i, start_a, j, start_b))
+        if length:
+            if codes and codes[-1][0] == "equal":
+                tag, i1, _, j1, _ = codes.pop()
+                codes.append(("equal", i1, start_a + length, j1, start_b + length))
+            else:
+                codes.append(("equal", start_a, start_a + length, start_b, start_b + length))
+        i, j = start_a + length, start_b + length
+    return codes
+
+
+def hunks(a, b, codes, context):
+    result = []
+    for group in _grouped(codes, context):
+        first, last = group[0], group[-1]
+        hunk = {
+            "old_start": first[1] + 1,
+            "old_lines": last[2] - first[1],
+            "new_start": first[3] + 1,
+            "new_lines": last[4] - first[3],
+            "lines": [],
+        }
+        # Same convention as diff -u: an empty range starts at the line
+        # before it.
+        if hunk["old_lines"] == 0:
+            hunk["old_start"] -= 1
+        if hunk["new_lines"] == 0:
+            hunk["new_start"] -= 1
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                hunk["lines"].extend(" " + line for line in a[i1:i2])
+                continue
+            hunk["lines"].extend("-" + line for line in a[i1:i2])
+            hunk["lines"].extend("+" + line for line in b[j1:j2])
+        result.append(hunk)
+    return result
+
+
+def _grouped(codes, context):
+    codes = list(codes)
+    if not codes or all(code[0] == "equal" for code in codes):
+        return []
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = (tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2)
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = (tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context))
+    groups = []
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal" and i2 - i1 > 2 * context:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            groups.append(group)
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        groups.append(group)
+    groups = [[code for code in g if code[1] != code[2] or code[3] != code[4]] for g in groups]
+    return [g for g in groups if g]
+
+
+def _range(start, length):
+    if length == 1:
+        return str(start)
+    return f"{start},{length}"
+
+
+def hunk_header(hunk):
+    return (
+        f"@@ -{_range(hunk['old_start'], hunk['old_lines'])} "
+        f"+{_range(hunk['new_start'], hunk['new_lines'])} @@"
+    )
+
+
+def unified(label_a, label_b, hunk_list):
+    lines = [f"--- {label_a}", f"+++ {label_b}"]
+    for hunk in hunk_list:
+        lines.append(hunk_header(hunk))
+        lines.extend(hunk["lines"])
+    return "\n".join(lines)
@@ -0,0 +1,225 @@
+import collections
+import mmap
+import os
+import re
+import threading
+
+import mcp_vim_bridge
+
+
+_BINARY_SNIFF_BYTES = 8192
+_BATCH_SIZE = 64
+_MAX_PENDING_BATCHES = 64
+_MAX_LINE_TEXT = 500
+
+def _glob_to_regex(glob):
+    out = []
+    i = 0
+    n = len(glob)
+    while i < n:
+        ch = glob[i]
+        if ch == "*":
+            if glob[i:i + 3] == "**/":
+                out.append("(?:.*/)?")
+                i += 3
+                continue
+            if glob[i:i + 2] == "**":
+                out.append(".*")
+                i += 2
+                continue
+            out.append("[^/]*")
+        elif ch == "?":
+            out.append("[^/]")
+        elif ch == "[":
+            end = glob.find("]", i + 2)
+            if end == -1:
+                out.append(re.escape(ch))
+            else:
+                body = glob[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append("[" + body.replace("\\", "\\\\") + "]")
+                i = end + 1
+                continue
+        elif ch == "\\" and i + 1 < n:
+            out.append(re.escape(glob[i + 1]))
+            i += 2
+            continue
+        else:
+            out.append(re.escape(ch))
+        i += 1
+    return "".join(out)
+
+
+def parse_gitignore(text):
+    rules = []
+    for raw in text.splitlines():
+        line = raw.rstrip()
+        if not line or line.startswith("#"):
+            continue
+        negated = line.startswith("!")
+        if negated:
+            line = line[1:]
+        elif line.startswith("\\"):
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            continue
+        anchored = "/" in line
+        line = line.lstrip("/")
+        try:
+            regex = re.compile(_glob_to_regex(line) + r"\Z", re.DOTALL)
+        except re.error:
+            continue
+        rules.append((regex, negated, dir_only, anchored))
+    return rules
+
+
+def _read_ignore_file(path):
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return parse_gitignore(f.read())
+    except OSError:
+        return []
+
+
+def is_ignored(rule_sets, rel_path, is_dir):
+    name = rel_path.rsplit("/", 1)[-1]
+    ignored = False
+    for base, rules in rule_sets:
+        sub = rel_path[len(base) + 1:] if base else rel_path
+        for regex, negated, dir_only, anchored in rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(sub if anchored else name):
+                ignored = not negated
+    return ignored
+
+
+def iter_files(root):
+    root_rules = _read_ignore_file(os.path.join(root, ".git", "info", "exclude"))
+    stack = [(root, "", [("", root_rules)] if root_rules else [])]
+    while stack:
+        dir_path, rel_dir, rule_sets = stack.pop()
+        local_rules = _read_ignore_file(os.path.join(dir_path, ".gitignore"))
+        if local_rules:
+            rule_sets = rule_sets + [(rel_dir, local_rules)]
+        try:
+            with os.scandir(dir_path) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            if entry.name == ".git":
+                continue
+            rel = entry.name if not rel_dir else rel_dir + "/" + entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if not is_ignored(rule_sets, rel, True):
+                        subdirs.append((entry.path, rel, rule_sets))
+                elif entry.is_file(follow_symlinks=False):
+                    if not is_ignored(rule_sets, rel, False):
+                        yield entry.path
+            except OSError:
+                continue
+        stack.extend(reversed(subdirs))
+
+
+def _scan(mm, regex, limit):
+    matches = []
+    size = len(mm)
+    pos = 0
+    line_no = 1
+    counted = 0
+    while len(matches) < limit and pos <= size:
+        m = regex.search(mm, pos)
+        if m is None:
+            break
+        start = mm.rfind(b"\n", 0, m.start()) + 1
+        end = mm.find(b"\n", m.end())
+        if end == -1:
+            end = size
+        line_no += mm[counted:start].count(b"\n")
+        counted = start
+        text = mm[start:min(end, start + _MAX_LINE_TEXT)].rstrip(b"\r")
+        matches.append((line_no, m.start() - start + 1, text.decode("utf-8", errors="replace")))
+        pos = end + 1
+    return matches
+
+
+def _search_file(path, regex, limit):
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return []
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if mm.find(b"\0", 0, _BINARY_SNIFF_BYTES) != -1:
+                    return None
+                return _scan(mm, regex, limit)
+    except (OSError, ValueError):
+        return None
+
+
+def _search_batch(paths, regex, limit, cancel):
+    results = []
+    for path in paths:
+        if cancel.is_set():
+            break
+        results.append((path, _search_file(path, regex, limit)))
+    return results
+
+
+def search_files(root, regex, max_results, on_chunk=None, chunk_size=2000):
+    pool = mcp_vim_bridge.worker_pool()
+    cancel = threading.Event()
+    pending = collections.deque()
+    state = {"files": 0, "truncated": False}
+    matches = []
+    chunk = []
+
+    def collect(keep):
+        while pending and not state["truncated"] and (
+            len(pending) > keep or pending[0].done()
+        ):
+            for path, file_matches in pending.popleft().result():
+                if file_matches is None:
+                    continue
+                state["files"] += 1
+                for line, column, text in file_matches:
+                    if len(matches) >= max_results:
+                        state["truncated"] = True
+                        cancel.set()
+                        break
+                    entry = {"filename": path, "line": line, "column": column, "text": text}
+                    matches.append(entry)
+                    chunk.append(entry)
+                    if on_chunk is not None and len(chunk) >= chunk_size:
+                        on_chunk(list(chunk))
+                        chunk.clear()
+
+    def submit(batch):
+        pending.append(pool.submit(_search_batch, batch, regex, max_results, cancel))
+        collect(_MAX_PENDING_BATCHES)
+
+    batch = []
+    for path in iter_files(root):
+        batch.append(path)
+        if len(batch) >= _BATCH_SIZE:
+            submit(batch)
+            batch = []
+        if state["truncated"]:
+            break
+    if batch and not state["truncated"]:
+        submit(batch)
+
+    collect(0)
+    cancel.set()
+    while pending:
+        pending.popleft().result()
+
+    if on_chunk is not None and chunk:
+        on_chunk(list(chunk))
+
+    return matches, state["files"], state["truncated"]
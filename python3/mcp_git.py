@@ -0,0 +1,325 @@
+import atexit
+import os
+import subprocess
+import threading
+import time
+
+
+_IDLE_TIMEOUT = 300
+_REAP_INTERVAL = 30
+
+_processes = {}
+_processes_lock = threading.Lock()
+_reaper = None
+
+_root_cache = {}
+_root_cache_lock = threading.Lock()
+
+
+class GitBatchError(Exception):
+    pass
+
+
+def git_dir(repo_root):
+    dot_git = os.path.join(repo_root, ".git")
+    if os.path.isdir(dot_git):
+        return dot_git
+    try:
+        with open(dot_git, "r", encoding="utf-8") as f:
+            line = f.readline().strip()
+    except OSError:
+        return None
+    if not line.startswith("gitdir:"):
+        return None
+    return os.path.join(repo_root, line[len("gitdir:"):].strip())
+
+
+def _entry_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _is_git_entry(dot_git):
+    if os.path.isdir(dot_git):
+        return os.path.isfile(os.path.join(dot_git, "HEAD"))
+    try:
+        with open(dot_git, "r", encoding="utf-8") as f:
+            return f.readline().startswith("gitdir:")
+    except (OSError, UnicodeDecodeError):
+        return False
+
+
+def reset_repo_root_cache():
+    with _root_cache_lock:
+        _root_cache.clear()
+
+
+def _has_closer_git_entry(start_dir, root):
+    # A repository created below the cached root since the lookup.
+    current = start_dir
+    while current != root:
+        if os.path.lexists(os.path.join(current, ".git")):
+            return True
+        parent = os.path.dirname(current)
+        if parent == current:
+            return False
+        current = parent
+    return False
+
+
+def repo_root(path):
+    start_dir = path if os.path.isdir(path) else os.path.dirname(path)
+    if not start_dir:
+        return None
+    start_dir = os.path.abspath(start_dir)
+
+    with _root_cache_lock:
+        cached = _root_cache.get(start_dir)
+    if cached is not None:
+        root, dot_git, mtime = cached
+        if _entry_mtime(dot_git) == mtime and not _has_closer_git_entry(start_dir, root):
+            return root
+
+    current = start_dir
+    while True:
+        dot_git = os.path.join(current, ".git")
+        mtime = _entry_mtime(dot_git)
+        if mtime is not None and _is_git_entry(dot_git):
+            with _root_cache_lock:
+                _root_cache[start_dir] = (current, dot_git, mtime)
+            return current
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
+
+
+def _index_state(git_dir):
+    if git_dir is None:
+        return None
+    try:
+        st = os.stat(os.path.join(git_dir, "index"))
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class _CatFile:
+    def __init__(self, repo_root, mode):
+        self.repo_root = repo_root
+        self.mode = mode
+        self.git_dir = git_dir(repo_root)
+        self.lock = threading.Lock()
+        self.proc = None
+        self.state = None
+        self.last_used = time.monotonic()
+
+    def _command(self):
+        return ["git", "cat-file", self.mode]
+
+    def _state(self):
+        return _index_state(self.git_dir)
+
+    def _start(self):
+        try:
+            self.proc = subprocess.Popen(
+                self._command(),
+                cwd=self.repo_root,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+        except OSError as e:
+            self.proc = None
+            raise GitBatchError(str(e))
+        self.state = self._state()
+
+    def close(self):
+        proc = self.proc
+        self.proc = None
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            proc.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+
+    def _encode(self, spec):
+        return spec.encode("utf-8") + b"\n"
+
+    def _read_reply(self):
+        header = self.proc.stdout.readline()
+        if not header.endswith(b"\n"):
+            raise GitBatchError("git cat-file exited unexpectedly")
+        header = header[:-1]
+        if header.endswith(b" missing") or header.endswith(b" ambiguous"):
+            return None
+        parts = header.split(b" ")
+        if len(parts) != 3:
+            raise GitBatchError("unexpected git cat-file output")
+        oid = parts[0].decode("ascii")
+        obj_type = parts[1].decode("ascii")
+        size = int(parts[2])
+        data = None
+        if self.mode == "--batch":
+            data = self.proc.stdout.read(size + 1)
+            if len(data) != size + 1:
+                raise GitBatchError("git cat-file exited unexpectedly")
+            data = data[:-1]
+        return oid, obj_type, size, data
+
+    def _query_locked(self, spec):
+        # cat-file loads the index once per process, so a changed index
+        # means the process would answer ":path" lookups from stale data.
+        if self.proc is not None and (
+            self.proc.poll() is not None
+            or self._state() != self.state
+        ):
+            self.close()
+        if self.proc is None:
+            self._start()
+        self.proc.stdin.write(self._encode(spec))
+        self.proc.stdin.flush()
+        return self._read_reply()
+
+    def query(self, spec):
+        with self.lock:
+            self.last_used = time.monotonic()
+            try:
+                return self._query_locked(spec)
+            except (OSError, ValueError, GitBatchError):
+                self.close()
+            try:
+                return self._query_locked(spec)
+            except (OSError, ValueError, GitBatchError) as e:
+                self.close()
+                raise GitBatchError(str(e) or "git cat-file failed")
+
+
+_ATTRIBUTES = ("binary", "diff", "text")
+
+
+class _CheckAttr(_CatFile):
+    def _command(self):
+        return ["git", "check-attr", "--stdin", "-z"] + list(_ATTRIBUTES)
+
+    def _state(self):
+        # Attribute files are read lazily and cached by the process; the
+        # top-level .gitattributes is the one that is routinely edited.
+        try:
+            st = os.stat(os.path.join(self.repo_root, ".gitattributes"))
+            top = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            top = None
+        return (_index_state(self.git_dir), top)
+
+    def _encode(self, spec):
+        return spec.encode("utf-8") + b"\0"
+
+    def _read_reply(self):
+        values = {}
+        for _ in _ATTRIBUTES:
+            fields = []
+            while len(fields) < 3:
+                field = bytearray()
+                while True:
+                    ch = self.proc.stdout.read(1)
+                    if not ch:
+                        raise GitBatchError("git check-attr exited unexpectedly")
+                    if ch == b"\0":
+                        break
+                    field.extend(ch)
+                fields.append(bytes(field))
+            values[fields[1].decode("ascii")] = fields[2].decode("utf-8", errors="replace")
+        return values
+
+
+def _reap_loop():
+    global _reaper
+    while True:
+        time.sleep(_REAP_INTERVAL)
+        reap_idle()
+        with _processes_lock:
+            if not any(p.proc is not None for p in _processes.values()):
+                _reaper = None
+                return
+
+
+def _get_process(repo_root, mode):
+    global _reaper
+    key = (repo_root, mode)
+    with _processes_lock:
+        proc = _processes.get(key)
+        if proc is None:
+            proc_class = _CheckAttr if mode == "check-attr" else _CatFile
+            proc = proc_class(repo_root, mode)
+            _processes[key] = proc
+        if _reaper is None:
+            _reaper = threading.Thread(target=_reap_loop, daemon=True)
+            _reaper.start()
+        return proc
+
+
+def _query(repo_root, mode, spec):
+    if "\n" in spec or "\r" in spec:
+        raise GitBatchError("object name contains a newline")
+    return _get_process(repo_root, mode).query(spec)
+
+
+def object_info(repo_root, spec):
+    result = _query(repo_root, "--batch-check", spec)
+    if result is None:
+        return None
+    return result[:3]
+
+
+def object_contents(repo_root, spec):
+    return _query(repo_root, "--batch", spec)
+
+
+def attributes(repo_root, rel_path):
+    if "\0" in rel_path:
+        raise GitBatchError("path contains a NUL byte")
+    return _get_process(repo_root, "check-attr").query(rel_path)
+
+
+def is_binary_by_attributes(repo_root, rel_path):
+    values = attributes(repo_root, rel_path)
+    if values.get("diff") == "set":
+        return False
+    if values.get("binary") == "set" or values.get("diff") == "unset":
+        return True
+    if values.get("text") == "unset":
+        return True
+    return None
+
+
+def reap_idle(now=None):
+    if now is None:
+        now = time.monotonic()
+    with _processes_lock:
+        procs = list(_processes.values())
+    for proc in procs:
+        with proc.lock:
+            if proc.proc is not None and now - proc.last_used > _IDLE_TIMEOUT:
+                proc.close()
+
+
+def close_all():
+    with _processes_lock:
+        procs = list(_processes.values())
+        _processes.clear()
+    for proc in procs:
+        with proc.lock:
+            proc.close()
+
+
+atexit.register(close_all)
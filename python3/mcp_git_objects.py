@@ -0,0 +1,632 @@
+import collections
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+
+import mcp_git
+
+
+_TYPE_NAMES = {1: "commit", 2: "tree", 3: "blob", 4: "tag"}
+_OFS_DELTA = 6
+_REF_DELTA = 7
+
+_INFLATE_CHUNK = 64 * 1024
+_MAX_DELTA_CHAIN = 64
+_BASE_CACHE_BYTES = 32 * 1024 * 1024
+_TREE_CACHE_ENTRIES = 256
+_MAX_PEELS = 16
+
+_HEX_OID = re.compile(r"[0-9a-f]{40}\Z")
+_SIMPLE_REF = re.compile(r"[A-Za-z0-9_./-]+\Z")
+_ROOT_REF = re.compile(r"[A-Z_]+\Z")
+
+_repos = {}
+_repos_lock = threading.Lock()
+_reaper = None
+
+
+class Unsupported(Exception):
+    pass
+
+
+def reset_cache():
+    with _repos_lock:
+        repos = list(_repos.values())
+        _repos.clear()
+    for repo in repos:
+        repo.close()
+
+
+class _LRU:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, cost):
+        if cost > self.max_bytes // 4:
+            return
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = (value, cost)
+            self.size += cost
+            while self.size > self.max_bytes:
+                _, (_, old_cost) = self.entries.popitem(last=False)
+                self.size -= old_cost
+
+
+def _read_varint(data, pos):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, pos
+
+
+def _apply_delta(base, delta):
+    src_size, pos = _read_varint(delta, 0)
+    dst_size, pos = _read_varint(delta, pos)
+    if src_size != len(base):
+        raise Unsupported("delta base size mismatch")
+    out = bytearray()
+    end = len(delta)
+    while pos < end:
+        op = delta[pos]
+        pos += 1
+        if op & 0x80:
+            offset = 0
+            size = 0
+            for i in range(4):
+                if op & (1 << i):
+                    offset |= delta[pos] << (8 * i)
+                    pos += 1
+            for i in range(3):
+                if op & (0x10 << i):
+                    size |= delta[pos] << (8 * i)
+                    pos += 1
+            if size == 0:
+                size = 0x10000
+            out += base[offset:offset + size]
+        elif op:
+            out += delta[pos:pos + op]
+            pos += op
+        else:
+            raise Unsupported("invalid delta opcode")
+    if len(out) != dst_size:
+        raise Unsupported("delta result size mismatch")
+    return bytes(out)
+
+
+def _inflate(buf, pos):
+    # Feed the compressed stream in chunks so that a large pack is never
+    # copied wholesale into zlib's unconsumed input.
+    d = zlib.decompressobj()
+    out = []
+    while not d.eof:
+        chunk = buf[pos:pos + _INFLATE_CHUNK]
+        if not chunk:
+            raise Unsupported("truncated zlib stream")
+        pos += len(chunk)
+        out.append(d.decompress(chunk))
+    return b"".join(out)
+
+
+def _inflate_head(buf, pos, limit):
+    return zlib.decompressobj().decompress(buf[pos:pos + 1024], limit)
+
+
+def _identity(st):
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+class _Pack:
+    def __init__(self, idx_path):
+        self.idx_path = idx_path
+        self.pack_path = idx_path[:-4] + ".pack"
+        with open(idx_path, "rb") as f:
+            self.idx = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            identity = _identity(os.fstat(f.fileno()))
+        try:
+            with open(self.pack_path, "rb") as f:
+                self.pack = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self.identity = identity, _identity(os.fstat(f.fileno()))
+        except (OSError, ValueError):
+            self.idx.close()
+            raise
+        if self.idx[:8] != b"\377tOc\0\0\0\2":
+            self.close()
+            raise Unsupported("unsupported pack index version")
+        self.fanout = struct.unpack(">256I", self.idx[8:8 + 1024])
+        self.count = self.fanout[255]
+        self.names_at = 8 + 1024
+        self.offsets_at = self.names_at + 24 * self.count
+        self.large_at = self.offsets_at + 4 * self.count
+
+    def close(self):
+        self.idx.close()
+        if getattr(self, "pack", None) is not None:
+            self.pack.close()
+
+    def is_current(self):
+        # False once either file was replaced, e.g. by git repack.
+        try:
+            return self.identity == (_identity(os.stat(self.idx_path)), _identity(os.stat(self.pack_path)))
+        except OSError:
+            return False
+
+    def find(self, oid):
+        first = oid[0]
+        lo = self.fanout[first - 1] if first else 0
+        hi = self.fanout[first]
+        idx = self.idx
+        base = self.names_at
+        while lo < hi:
+            mid = (lo + hi) // 2
+            name = idx[base + 20 * mid:base + 20 * mid + 20]
+            if name < oid:
+                lo = mid + 1
+            elif name > oid:
+                hi = mid
+            else:
+                return self._offset(mid)
+        return None
+
+    def _offset(self, index):
+        at = self.offsets_at + 4 * index
+        offset = struct.unpack(">I", self.idx[at:at + 4])[0]
+        if offset & 0x80000000:
+            at = self.large_at + 8 * (offset & 0x7FFFFFFF)
+            offset = struct.unpack(">Q", self.idx[at:at + 8])[0]
+        return offset
+
+    def entry_header(self, offset):
+        pack = self.pack
+        byte = pack[offset]
+        pos = offset + 1
+        type_num = (byte >> 4) & 7
+        size = byte & 0x0F
+        shift = 4
+        while byte & 0x80:
+            byte = pack[pos]
+            pos += 1
+            size |= (byte & 0x7F) << shift
+            shift += 7
+        base = None
+        if type_num == _OFS_DELTA:
+            byte = pack[pos]
+            pos += 1
+            rel = byte & 0x7F
+            while byte & 0x80:
+                byte = pack[pos]
+                pos += 1
+                rel = ((rel + 1) << 7) | (byte & 0x7F)
+            base = offset - rel
+        elif type_num == _REF_DELTA:
+            base = bytes(pack[pos:pos + 20])
+            pos += 20
+        return type_num, size, base, pos
+
+
+class _Repo:
+    def __init__(self, repo_root):
+        git_dir = mcp_git.git_dir(repo_root)
+        if git_dir is None or not os.path.isdir(git_dir):
+            raise Unsupported("no git directory")
+        self.git_dir = git_dir
+        common = git_dir
+        try:
+            with open(os.path.join(git_dir, "commondir"), "r", encoding="utf-8") as f:
+                common = os.path.normpath(os.path.join(git_dir, f.read().strip()))
+        except OSError:
+            pass
+        self.common_dir = common
+        self._check_supported()
+        objects = os.path.join(common, "objects")
+        self.object_dirs = [objects] + self._alternates(objects)
+        self.packs = {}
+        self.pack_dir_state = None
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+        self.bases = _LRU(_BASE_CACHE_BYTES)
+        self.trees = collections.OrderedDict()
+
+    def _check_supported(self):
+        if os.path.exists(os.path.join(self.common_dir, "reftable")):
+            raise Unsupported("reftable refs")
+        try:
+            with open(os.path.join(self.common_dir, "config"), "r", encoding="utf-8", errors="replace") as f:
+                config = f.read().lower()
+        except OSError:
+            config = ""
+        if re.search(r"^\s*objectformat\s*=\s*sha256", config, re.M):
+            raise Unsupported("sha256 repositories")
+
+    def _alternates(self, objects):
+        try:
+            with open(os.path.join(objects, "info", "alternates"), "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return []
+        dirs = []
+        for line in lines:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                dirs.append(os.path.normpath(os.path.join(objects, line)))
+        return dirs
+
+    def close(self):
+        with self.lock:
+            self._close_packs()
+
+    def close_idle(self, now):
+        # Open mappings keep deleted packs on disk, and on Windows stop
+        # git gc from deleting them at all.
+        with self.lock:
+            if self.packs and now - self.last_used > mcp_git._IDLE_TIMEOUT:
+                self._close_packs()
+
+    def _close_packs(self):
+        for pack in self.packs.values():
+            pack.close()
+        self.packs.clear()
+        self.pack_dir_state = None
+
+    def _pack_list(self, rescan=False):
+        state = []
+        for objects in self.object_dirs:
+            pack_dir = os.path.join(objects, "pack")
+            try:
+                state.append(os.stat(pack_dir).st_mtime_ns)
+            except OSError:
+                state.append(None)
+        with self.lock:
+            self.last_used = time.monotonic()
+            if rescan or state != self.pack_dir_state:
+                seen = set()
+                for objects in self.object_dirs:
+                    pack_dir = os.path.join(objects, "pack")
+                    try:
+                        names = sorted(os.listdir(pack_dir))
+                    except OSError:
+                        continue
+                    for name in names:
+                        if not name.endswith(".idx"):
+                            continue
+                        path = os.path.join(pack_dir, name)
+                        seen.add(path)
+                        if path in self.packs and not self.packs[path].is_current():
+                            self.packs.pop(path).close()
+                        if path not in self.packs:
+                            try:
+                                self.packs[path] = _Pack(path)
+                            except (OSError, ValueError):
+                                continue
+                for path in list(self.packs):
+                    if path not in seen:
+                        self.packs.pop(path).close()
+                self.pack_dir_state = state
+            return list(self.packs.values())
+
+    def _locate(self, oid):
+        hex_oid = oid.hex()
+        for objects in self.object_dirs:
+            path = os.path.join(objects, hex_oid[:2], hex_oid[2:])
+            if os.path.isfile(path):
+                return path, None
+        for rescan in (False, True):
+            for pack in self._pack_list(rescan):
+                offset = pack.find(oid)
+                if offset is not None:
+                    return pack, offset
+        # Possibly a promisor or otherwise unusual object store; let the
+        # caller fall back to git.
+        raise Unsupported(f"object {hex_oid} not found")
+
+    def _read_loose(self, path, header_only=False):
+        with open(path, "rb") as f:
+            if header_only:
+                data = _inflate_head(f.read(1024), 0, 64)
+            else:
+                data = zlib.decompress(f.read())
+        nul = data.find(b"\0")
+        if nul == -1:
+            raise Unsupported("corrupt loose object")
+        obj_type, size = data[:nul].split(b" ")
+        return obj_type.decode("ascii"), int(size), data[nul + 1:]
+
+    def _read_packed(self, pack, offset):
+        chain = []
+        while True:
+            key = (pack.pack_path, offset)
+            cached = self.bases.get(key)
+            if cached is not None:
+                obj_type, data = cached
+                break
+            type_num, size, base, pos = pack.entry_header(offset)
+            if type_num in _TYPE_NAMES:
+                obj_type = _TYPE_NAMES[type_num]
+                data = _inflate(pack.pack, pos)
+                if len(data) != size:
+                    raise Unsupported("corrupt pack entry")
+                if chain:
+                    self.bases.put(key, (obj_type, data), len(data))
+                break
+            if type_num not in (_OFS_DELTA, _REF_DELTA):
+                raise Unsupported("unsupported pack entry")
+            if len(chain) >= _MAX_DELTA_CHAIN:
+                raise Unsupported("delta chain too long")
+            chain.append((pack, offset, pos))
+            if type_num == _OFS_DELTA:
+                offset = base
+                continue
+            located, base_offset = self._locate(base)
+            if base_offset is None:
+                obj_type, _, data = self._read_loose(located)
+                break
+            pack, offset = located, base_offset
+
+        # Intermediate results are the bases of later reads of the same
+        # chain, so they go into the cache; the requested object does not.
+        for i in range(len(chain) - 1, -1, -1):
+            delta_pack, delta_offset, pos = chain[i]
+            data = _apply_delta(data, _inflate(delta_pack.pack, pos))
+            if i:
+                self.bases.put((delta_pack.pack_path, delta_offset), (obj_type, data), len(data))
+        return obj_type, data
+
+    def object_header(self, oid):
+        located, offset = self._locate(oid)
+        if offset is None:
+            obj_type, size, _ = self._read_loose(located, header_only=True)
+            return obj_type, size
+        pack = located
+        type_num, size, base, pos = pack.entry_header(offset)
+        if type_num in _TYPE_NAMES:
+            return _TYPE_NAMES[type_num], size
+        if type_num not in (_OFS_DELTA, _REF_DELTA):
+            raise Unsupported("unsupported pack entry")
+        # The result size of a delta is stored at the start of the delta
+        # data; the type is that of the chain's base.
+        head = _inflate_head(pack.pack, pos, 20)
+        _, at = _read_varint(head, 0)
+        size, _ = _read_varint(head, at)
+        for _ in range(_MAX_DELTA_CHAIN):
+            if type_num == _OFS_DELTA:
+                offset = base
+            else:
+                located, offset = self._locate(base)
+                if offset is None:
+                    return self._read_loose(located, header_only=True)[0], size
+                pack = located
+            type_num, _, base, _ = pack.entry_header(offset)
+            if type_num in _TYPE_NAMES:
+                return _TYPE_NAMES[type_num], size
+            if type_num not in (_OFS_DELTA, _REF_DELTA):
+                raise Unsupported("unsupported pack entry")
+        raise Unsupported("delta chain too long")
+
+    def read(self, oid):
+        located, offset = self._locate(oid)
+        if offset is None:
+            obj_type, size, data = self._read_loose(located)
+            if len(data) != size:
+                raise Unsupported("corrupt loose object")
+            return obj_type, data
+        return self._read_packed(located, offset)
+
+    def _read_ref_file(self, name):
+        for base in (self.git_dir, self.common_dir):
+            try:
+                with open(os.path.join(base, name), "r", encoding="utf-8") as f:
+                    return f.read().strip()
+            except (OSError, UnicodeDecodeError):
+                continue
+        return None
+
+    def _packed_refs(self):
+        try:
+            with open(os.path.join(self.common_dir, "packed-refs"), "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except (OSError, UnicodeDecodeError):
+            return {}
+        refs = {}
+        for line in lines:
+            if not line or line[0] in "#^":
+                continue
+            parts = line.split(" ", 1)
+            if len(parts) == 2:
+                refs[parts[1]] = parts[0]
+        return refs
+
+    def _resolve_name(self, name, packed):
+        for _ in range(_MAX_PEELS):
+            value = self._read_ref_file(name)
+            if value is None:
+                if packed is None:
+                    packed = self._packed_refs()
+                value = packed.get(name)
+                if value is None:
+                    return None
+            if value.startswith("ref:"):
+                name = value[4:].strip()
+                continue
+            if _HEX_OID.match(value):
+                return value
+            raise Unsupported("unexpected ref contents")
+        raise Unsupported("symbolic ref loop")
+
+    def resolve(self, ref):
+        if _HEX_OID.match(ref):
+            return bytes.fromhex(ref)
+        if not _SIMPLE_REF.match(ref) or ".." in ref:
+            raise Unsupported("revision expression")
+        replace = os.path.join(self.common_dir, "refs", "replace")
+        packed = self._packed_refs()
+        if (os.path.isdir(replace) and os.listdir(replace)) or any(
+            name.startswith("refs/replace/") for name in packed
+        ):
+            raise Unsupported("replace refs")
+        # Same lookup order as git's ref disambiguation.
+        for pattern in ("%s", "refs/%s", "refs/tags/%s", "refs/heads/%s",
+                        "refs/remotes/%s", "refs/remotes/%s/HEAD"):
+            if pattern == "%s" and not (_ROOT_REF.match(ref) or ref.startswith("refs/")):
+                continue
+            value = self._resolve_name(pattern % ref, packed)
+            if value is not None:
+                return bytes.fromhex(value)
+        raise Unsupported("unknown revision")
+
+    def _commit_tree(self, oid):
+        for _ in range(_MAX_PEELS):
+            obj_type, data = self.read(oid)
+            if obj_type == "tag":
+                match = re.match(rb"object ([0-9a-f]{40})\n", data)
+                if match is None:
+                    raise Unsupported("corrupt tag")
+                oid = bytes.fromhex(match.group(1).decode("ascii"))
+                continue
+            if obj_type == "commit":
+                match = re.match(rb"tree ([0-9a-f]{40})\n", data)
+                if match is None:
+                    raise Unsupported("corrupt commit")
+                return bytes.fromhex(match.group(1).decode("ascii"))
+            if obj_type == "tree":
+                return oid
+            raise Unsupported(f"{obj_type} is not a tree-ish")
+        raise Unsupported("tag chain too long")
+
+    def _tree_entries(self, oid):
+        with self.lock:
+            entries = self.trees.get(oid)
+            if entries is not None:
+                self.trees.move_to_end(oid)
+                return entries
+        obj_type, data = self.read(oid)
+        if obj_type != "tree":
+            raise Unsupported("expected a tree")
+        entries = {}
+        pos = 0
+        end = len(data)
+        while pos < end:
+            space = data.index(b" ", pos)
+            nul = data.index(b"\0", space)
+            mode = data[pos:space]
+            name = data[space + 1:nul].decode("utf-8", errors="surrogateescape")
+            entries[name] = (mode, data[nul + 1:nul + 21])
+            pos = nul + 21
+        with self.lock:
+            self.trees[oid] = entries
+            while len(self.trees) > _TREE_CACHE_ENTRIES:
+                self.trees.popitem(last=False)
+        return entries
+
+    def lookup(self, ref, rel_path):
+        tree = self._commit_tree(self.resolve(ref))
+        parts = [p for p in rel_path.split("/") if p]
+        if not parts:
+            return tree, "tree"
+        for i, part in enumerate(parts):
+            entry = self._tree_entries(tree).get(part)
+            if entry is None:
+                return None
+            mode, oid = entry
+            if mode == b"40000":
+                kind = "tree"
+            elif mode == b"160000":
+                kind = "commit"
+            else:
+                kind = "blob"
+            if i < len(parts) - 1:
+                if kind != "tree":
+                    return None
+                tree = oid
+        return oid, kind
+
+
+def _reap_loop():
+    global _reaper
+    while True:
+        time.sleep(mcp_git._REAP_INTERVAL)
+        reap_idle()
+        with _repos_lock:
+            if not any(repo.packs for repo in _repos.values()):
+                _reaper = None
+                return
+
+
+def reap_idle(now=None):
+    if now is None:
+        now = time.monotonic()
+    with _repos_lock:
+        repos = list(_repos.values())
+    for repo in repos:
+        repo.close_idle(now)
+
+
+def _repo(repo_root):
+    global _reaper
+    with _repos_lock:
+        repo = _repos.get(repo_root)
+        if repo is None:
+            repo = _Repo(repo_root)
+            _repos[repo_root] = repo
+        if _reaper is None:
+            _reaper = threading.Thread(target=_reap_loop, daemon=True)
+            _reaper.start()
+        return repo
+
+
+def _guard(func, *args):
+    try:
+        return func(*args)
+    except Unsupported:
+        raise
+    except (OSError, ValueError, IndexError, KeyError, struct.error, zlib.error) as e:
+        raise Unsupported(str(e) or type(e).__name__)
+
+
+def path_info(repo_root, ref, rel_path):
+    def run():
+        repo = _repo(repo_root)
+        found = repo.lookup(ref, rel_path)
+        if found is None:
+            return None
+        oid, kind = found
+        if kind == "commit":
+            return oid.hex(), kind, 0
+        obj_type, size = repo.object_header(oid)
+        return oid.hex(), obj_type, size
+
+    return _guard(run)
+
+
+def read_object(repo_root, oid_hex):
+    def run():
+        return _repo(repo_root).read(bytes.fromhex(oid_hex))
+
+    return _guard(run)
+
+
+def resolve_ref(repo_root, ref):
+    def run():
+        return _repo(repo_root).resolve(ref).hex()
+
+    return _guard(run)
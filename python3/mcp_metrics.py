@@ -0,0 +1,121 @@
+import math
+import threading
+
+
+_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_METRICS = {
+    "mcp_tool_calls_total": ("counter", "Tool calls received, by tool."),
+    "mcp_tool_errors_total": ("counter", "Tool calls that returned an error or raised, by tool."),
+    "mcp_tool_duration_seconds": ("histogram", "Time from receiving a tool call to having its result, by tool."),
+    "mcp_main_thread_queue_wait_seconds": (
+        "histogram",
+        "Time from queueing a request to Vim starting to execute it, by function.",
+    ),
+    "mcp_main_thread_execution_seconds": (
+        "histogram",
+        "Time Vim spent executing a request, by function.",
+    ),
+    "mcp_main_thread_timeouts_total": ("counter", "Requests that gave up waiting for Vim, by function."),
+    "mcp_http_request_bytes_total": ("counter", "Bytes of HTTP request bodies received."),
+    "mcp_http_response_bytes_total": ("counter", "Bytes of HTTP response bodies sent."),
+}
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_gauges = {}
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def _key(name, labels):
+    if name not in _METRICS:
+        raise KeyError(f"Unknown metric: {name}")
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    key = _key(name, labels)
+    with _lock:
+        entry = _histograms.get(key)
+        if entry is None:
+            entry = _histograms[key] = [[0] * len(_BUCKETS), 0.0, 0]
+        for i, bound in enumerate(_BUCKETS):
+            if seconds <= bound:
+                entry[0][i] += 1
+                break
+        entry[1] += seconds
+        entry[2] += 1
+
+
+def register_gauge(name, help_text, func):
+    # Gauges are read when /metrics is scraped; func returns None when
+    # there is nothing to report yet.
+    with _lock:
+        _gauges[name] = (help_text, func)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        if math.isnan(value):
+            return "NaN"
+        return repr(value)
+    return str(value)
+
+
+def render():
+    with _lock:
+        counters = dict(_counters)
+        histograms = {k: (list(v[0]), v[1], v[2]) for k, v in _histograms.items()}
+        gauges = dict(_gauges)
+
+    lines = []
+    for name, (kind, help_text) in _METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for (metric, pairs), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_labels(pairs)} {_number(value)}")
+            continue
+        for (metric, pairs), (buckets, total, count) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, bucket in zip(_BUCKETS, buckets):
+                cumulative += bucket
+                lines.append(f"{name}_bucket{_labels(pairs + (('le', _number(bound)),))} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(pairs + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_labels(pairs)} {_number(total)}")
+            lines.append(f"{name}_count{_labels(pairs)} {count}")
+
+    for name, (help_text, func) in sorted(gauges.items()):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        value = func()
+        if value is not None:
+            lines.append(f"{name} {_number(value)}")
+    return "\n".join(lines) + "\n"
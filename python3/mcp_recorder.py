@@ -0,0 +1,93 @@
+import json
+import os
+import re
+import threading
+import time
+
+
+REDACTED = "[REDACTED]"
+
+# Argument names whose values are dropped whole, wherever they appear.
+_SECRET_KEY = re.compile(r"pass(word|wd|phrase)?|secret|token|api[_-]?key|auth|credential|private[_-]?key|cookie", re.I)
+
+# Secrets inside free text: edits, commands, diff contents.
+_SECRET_TEXT = [
+    (re.compile(r"-----BEGIN [A-Z ]*PRIVATE KEY-----.*?-----END [A-Z ]*PRIVATE KEY-----", re.S), REDACTED),
+    (re.compile(r"\b(?:gh[pousr]_[A-Za-z0-9]{20,}|github_pat_[A-Za-z0-9_]{20,})"), REDACTED),
+    (re.compile(r"\bsk-[A-Za-z0-9_-]{20,}"), REDACTED),
+    (re.compile(r"\bAKIA[0-9A-Z]{16}\b"), REDACTED),
+    (re.compile(r"\bxox[abprs]-[A-Za-z0-9-]{10,}"), REDACTED),
+    (re.compile(r"\b(Bearer|Basic)\s+[A-Za-z0-9._~+/=-]{8,}", re.I), r"\1 " + REDACTED),
+    (re.compile(r"(://[^/\s:@]+:)[^/\s@]+@"), r"\1" + REDACTED + "@"),
+    (
+        re.compile(r"""(\b[\w.-]*(?:password|passwd|secret|token|api[_-]?key)[\w.-]*["']?\s*[:=]\s*)(["']?)[^\s"',;]+\2""", re.I),
+        r"\1\2" + REDACTED + r"\2",
+    ),
+]
+
+_state = {"path": None}
+_lock = threading.Lock()
+
+
+def start(path):
+    _state["path"] = path
+    return status()
+
+
+def stop():
+    _state["path"] = None
+    return status()
+
+
+def is_recording():
+    return _state["path"] is not None
+
+
+def status():
+    if _state["path"] is None:
+        return "MCP request recording is off"
+    return f"MCP request recording is on, writing to {_state['path']}"
+
+
+def redact(value):
+    if isinstance(value, dict):
+        return {
+            k: REDACTED if isinstance(k, str) and _SECRET_KEY.search(k) and isinstance(v, str) else redact(v)
+            for k, v in value.items()
+        }
+    if isinstance(value, list):
+        return [redact(v) for v in value]
+    if isinstance(value, str):
+        for pattern, replacement in _SECRET_TEXT:
+            value = pattern.sub(replacement, value)
+    return value
+
+
+def record(msg, response, duration, request_bytes, response_bytes, phases_ms=None):
+    # One line per request, with the redacted params so it can be replayed
+    # (see bench/replay.py).  "time" is when the request arrived.
+    path = _state["path"]
+    if path is None:
+        return
+    result = response.get("result") if response else None
+    params = msg.get("params")
+    entry = {
+        "time": round(time.time() - duration, 6),
+        "method": msg.get("method", ""),
+        "id": msg.get("id"),
+        "params": redact(params) if params is not None else None,
+        "duration_ms": round(duration * 1000, 3),
+        "request_bytes": request_bytes,
+        "response_bytes": response_bytes,
+        "error": bool(response) and ("error" in response or bool(isinstance(result, dict) and result.get("isError"))),
+    }
+    if phases_ms is not None:
+        entry["phases_ms"] = phases_ms
+    line = json.dumps(entry, sort_keys=True) + "\n"
+    with _lock:
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line)
+        except OSError:
+            pass
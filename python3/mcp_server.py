@@ -1,9 +1,13 @@
 import json
 import threading
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 
+import mcp_metrics
 import mcp_protocol
+import mcp_recorder
 import mcp_tools
+import mcp_trace
 
 
 _server = None
@@ -16,8 +20,10 @@ class McpRequestHandler(BaseHTTPRequestHandler):
         if self.path != "/mcp":
             self.send_error(404)
             return
+        received = time.monotonic()
         content_length = int(self.headers.get("Content-Length", 0))
         body = self.rfile.read(content_length)
+        mcp_metrics.inc("mcp_http_request_bytes_total", len(body))
         try:
             msg = json.loads(body)
         except json.JSONDecodeError:
@@ -30,24 +36,43 @@ class McpRequestHandler(BaseHTTPRequestHandler):
         req_id = msg.get("id")
         params = msg.get("params", {})
         is_notification = req_id is None
-        response, new_session_id = mcp_protocol.route_request(
-            method, req_id, params,
-            mcp_tools.TOOL_DEFINITIONS,
-            mcp_tools.call_tool,
-        )
-        global _session_id
-        if new_session_id is not None:
-            _session_id = new_session_id
-        if is_notification:
-            self.send_response(202)
-            self.send_header("Content-Length", "0")
-            if _session_id:
-                self.send_header("Mcp-Session-Id", _session_id)
-            self.end_headers()
-            return
-        self._send_json(response, 200)
+        trace = None
+        if method == "tools/call" and isinstance(params, dict) and not is_notification:
+            meta = params.get("_meta")
+            trace = mcp_trace.begin(isinstance(meta, dict) and meta.get(mcp_trace.META_KEY) is True)
+        try:
+            mcp_trace.add("http_parse", time.monotonic() - received)
+            started = time.monotonic()
+            response, new_session_id = mcp_protocol.route_request(
+                method, req_id, params,
+                mcp_tools.TOOL_DEFINITIONS,
+                mcp_tools.call_tool,
+            )
+            mcp_trace.add("handler", time.monotonic() - started)
+            global _session_id
+            if new_session_id is not None:
+                _session_id = new_session_id
+            if is_notification:
+                self.send_response(202)
+                self.send_header("Content-Length", "0")
+                if _session_id:
+                    self.send_header("Mcp-Session-Id", _session_id)
+                self.end_headers()
+                self._record(msg, None, trace, received, len(body), 0)
+                return
+            if trace is not None:
+                self._attach_timing(response, trace, received)
+            response_bytes = self._send_json(response, 200)
+            if trace is not None:
+                self._log_trace(msg, response, trace, received, len(body), response_bytes)
+            self._record(msg, response, trace, received, len(body), response_bytes)
+        finally:
+            mcp_trace.end()
 
     def do_GET(self):
+        if self.path == "/metrics":
+            self._send_metrics()
+            return
         if self.path != "/mcp":
             self.send_error(404)
             return
@@ -65,8 +90,41 @@ class McpRequestHandler(BaseHTTPRequestHandler):
         self.send_header("Content-Length", "0")
         self.end_headers()
 
+    def _attach_timing(self, response, trace, received):
+        # Serialising the response cannot be timed inside that same
+        # response, so "serialize" only shows up in the trace log.
+        result = response.get("result")
+        if isinstance(result, dict):
+            result.setdefault("_meta", {})[mcp_trace.META_KEY] = {
+                "phases_ms": mcp_trace.breakdown(trace),
+                "total_ms": round((time.monotonic() - received) * 1000, 3),
+            }
+
+    def _log_trace(self, msg, response, trace, received, request_bytes, response_bytes):
+        result = response.get("result")
+        mcp_trace.write({
+            "time": time.time(),
+            "id": msg.get("id"),
+            "tool": msg["params"].get("name"),
+            "phases_ms": mcp_trace.breakdown(trace),
+            "total_ms": round((time.monotonic() - received) * 1000, 3),
+            "error": "error" in response or bool(isinstance(result, dict) and result.get("isError")),
+            "request_bytes": request_bytes,
+            "response_bytes": response_bytes,
+        })
+
+    def _record(self, msg, response, trace, received, request_bytes, response_bytes):
+        if not mcp_recorder.is_recording():
+            return
+        mcp_recorder.record(
+            msg, response, time.monotonic() - received, request_bytes, response_bytes,
+            mcp_trace.breakdown(trace) if trace is not None else None,
+        )
+
     def _send_json(self, data, status_code):
+        started = time.monotonic()
         body = json.dumps(data).encode("utf-8")
+        mcp_trace.add("serialize", time.monotonic() - started)
         self.send_response(status_code)
         self.send_header("Content-Type", "application/json")
         self.send_header("Content-Length", str(len(body)))
@@ -74,6 +132,18 @@ class McpRequestHandler(BaseHTTPRequestHandler):
             self.send_header("Mcp-Session-Id", _session_id)
         self.end_headers()
         self.wfile.write(body)
+        mcp_metrics.inc("mcp_http_response_bytes_total", len(body))
+        return len(body)
+
+    def _send_metrics(self):
+        # Each request has its own thread, so neither a busy Vim nor a long
+        # worker tool on another connection delays this.
+        body = mcp_metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
 
     def log_message(self, format, *args):
         pass
@@ -83,7 +153,9 @@ def start(port=8765):
     global _server, _server_thread
     if _server is not None:
         return f"MCP server already running on port {port}"
-    _server = HTTPServer(("127.0.0.1", port), McpRequestHandler)
+    # One thread per request: a call waiting for Vim or running a worker
+    # tool must not hold up other clients or /metrics.
+    _server = ThreadingHTTPServer(("127.0.0.1", port), McpRequestHandler)
     _server_thread = threading.Thread(target=_server.serve_forever, daemon=True)
     _server_thread.start()
     return f"MCP server started on http://127.0.0.1:{port}/mcp"
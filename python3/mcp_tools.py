@@ -1,14 +1,42 @@
+import collections
+import functools
+import hashlib
 import json
 import os
 import posixpath
 import re
 import subprocess
+import threading
+import time
 import uuid
 
+import mcp_diff
+import mcp_file_search
+import mcp_git
+import mcp_git_objects
+import mcp_metrics
 import mcp_vim_bridge
 
 
 _MAX_GIT_OUTPUT_BYTES = 5 * 1024 * 1024
+_DEFAULT_MAX_DIFF_FILES = 50
+
+
+_POSITION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "line": {
+            "type": "integer",
+            "description": "Line number (0-based).",
+        },
+        "character": {
+            "type": "integer",
+            "description": "Character offset in the line (0-based), in position_encoding units.",
+        },
+    },
+    "required": ["line", "character"],
+    "additionalProperties": False,
+}
 
 
 TOOL_DEFINITIONS = {
@@ -97,6 +125,66 @@ TOOL_DEFINITIONS = {
             "additionalProperties": False,
         },
     },
+    "apply_text_edits": {
+        "description": (
+            "Apply LSP-style text edits to a buffer. Each edit replaces the "
+            "text between two (line, character) positions with new text, so "
+            "a change inside a long line does not require re-sending the "
+            "whole line. Lines and characters are 0-based as in the Language "
+            "Server Protocol; the end position is exclusive. Edits must not "
+            "overlap and are all interpreted against the buffer contents "
+            "before any of them is applied. Must be explicitly enabled via "
+            "g:mcp_server_allow_edit (disabled by default)."
+        ),
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "buffer_id": {
+                    "type": "integer",
+                    "description": "Buffer number. Omit to use the current buffer.",
+                },
+                "buffer_path": {
+                    "type": "string",
+                    "description": "File path of the buffer. Omit to use the current buffer.",
+                },
+                "edits": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "range": {
+                                "type": "object",
+                                "properties": {
+                                    "start": _POSITION_SCHEMA,
+                                    "end": _POSITION_SCHEMA,
+                                },
+                                "required": ["start", "end"],
+                                "additionalProperties": False,
+                            },
+                            "newText": {
+                                "type": "string",
+                                "description": "Replacement text. May contain newlines. Empty string deletes the range.",
+                            },
+                        },
+                        "required": ["range", "newText"],
+                        "additionalProperties": False,
+                    },
+                    "description": "List of text edits.",
+                },
+                "position_encoding": {
+                    "type": "string",
+                    "enum": ["utf-16", "utf-8", "utf-32"],
+                    "description": (
+                        "Unit of the character offsets: 'utf-16' code units "
+                        "(LSP default), 'utf-8' bytes, or 'utf-32' code points. "
+                        "Defaults to 'utf-16'."
+                    ),
+                },
+            },
+            "required": ["edits"],
+            "additionalProperties": False,
+        },
+    },
     "open_file": {
         "description": (
             "Open a file in Vim using :edit. If the file is already open, "
@@ -121,7 +209,8 @@ TOOL_DEFINITIONS = {
     },
     "save_buffer": {
         "description": (
-            "Save a buffer to disk using :write. "
+            "Save a buffer to disk using :write, without switching the current buffer. "
+            "Set buffer_ids or all_modified to save several buffers in one call. "
             "Must be explicitly enabled via g:mcp_server_allow_save (disabled by default)."
         ),
         "inputSchema": {
@@ -135,6 +224,15 @@ TOOL_DEFINITIONS = {
                     "type": "string",
                     "description": "File path of the buffer. Omit to use the current buffer.",
                 },
+                "buffer_ids": {
+                    "type": "array",
+                    "items": {"type": "integer"},
+                    "description": "Buffer numbers to save instead of a single buffer.",
+                },
+                "all_modified": {
+                    "type": "boolean",
+                    "description": "Save every modified buffer that has a file name. Defaults to false.",
+                },
             },
             "additionalProperties": False,
         },
@@ -218,17 +316,42 @@ TOOL_DEFINITIONS = {
         },
     },
     "get_quickfix_list": {
-        "description": "Get the current quickfix list entries.",
+        "description": (
+            "Get the current quickfix list entries. Returns the list's title, "
+            "size, id and changedtick along with the entries. Use offset and "
+            "limit to page through long lists."
+        ),
         "inputSchema": {
             "type": "object",
-            "properties": {},
+            "properties": {
+                "offset": {
+                    "type": "integer",
+                    "description": "Index of the first entry to return (0-based). Default 0.",
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "Maximum number of entries to return. Omit to return all entries from offset.",
+                },
+                "changedtick": {
+                    "type": "integer",
+                    "description": (
+                        "changedtick from a previous response. Together with id: if "
+                        "it is still the same list and it has not changed since, "
+                        "entries are omitted and unchanged is true."
+                    ),
+                },
+                "id": {
+                    "type": "integer",
+                    "description": "id from the same previous response as changedtick.",
+                },
+            },
             "additionalProperties": False,
         },
     },
     "set_quickfix_list": {
         "description": (
             "Set the quickfix list. Replaces the current quickfix list with "
-            "the given entries. Each entry has a filename, line number, and "
+            "the given entries, or appends them when append is true. Each entry has a filename, line number, and "
             "description text. Optionally opens the quickfix window. "
             "Prefer this over multiple open_file calls when presenting two "
             "or more file locations to the user. "
@@ -276,23 +399,58 @@ TOOL_DEFINITIONS = {
                     "type": "boolean",
                     "description": "Open the quickfix window after setting the list. Default false.",
                 },
+                "append": {
+                    "type": "boolean",
+                    "description": "Append the entries to the current quickfix list instead of replacing it. Default false.",
+                },
             },
             "required": ["entries"],
             "additionalProperties": False,
         },
     },
     "get_location_list": {
-        "description": "Get the location list entries for the current window.",
+        "description": (
+            "Get the location list entries for the current window. Returns "
+            "the list's title, size, id and changedtick, and the window's "
+            "winid, along with the entries. "
+            "Use offset and limit to page through long lists."
+        ),
         "inputSchema": {
             "type": "object",
-            "properties": {},
+            "properties": {
+                "offset": {
+                    "type": "integer",
+                    "description": "Index of the first entry to return (0-based). Default 0.",
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "Maximum number of entries to return. Omit to return all entries from offset.",
+                },
+                "changedtick": {
+                    "type": "integer",
+                    "description": (
+                        "changedtick from a previous response. Together with id: if "
+                        "it is still the same list and it has not changed since, "
+                        "entries are omitted and unchanged is true."
+                    ),
+                },
+                "id": {
+                    "type": "integer",
+                    "description": "id from the same previous response as changedtick.",
+                },
+                "winid": {
+                    "type": "integer",
+                    "description": "winid from the same previous response as changedtick.",
+                },
+            },
             "additionalProperties": False,
         },
     },
     "set_location_list": {
         "description": (
             "Set the location list for the current window. Replaces the "
-            "current location list with the given entries. Each entry has a "
+            "current location list with the given entries, or appends them "
+            "when append is true. Each entry has a "
             "filename, line number, and description text. Optionally opens "
             "the location window. "
             "Prefer this over multiple open_file calls when presenting two "
@@ -341,6 +499,10 @@ TOOL_DEFINITIONS = {
                     "type": "boolean",
                     "description": "Open the location window after setting the list. Default false.",
                 },
+                "append": {
+                    "type": "boolean",
+                    "description": "Append the entries to the current location list instead of replacing it. Default false.",
+                },
             },
             "required": ["entries"],
             "additionalProperties": False,
@@ -350,11 +512,109 @@ TOOL_DEFINITIONS = {
         "description": (
             "Get Vim's message history. Returns the messages that Vim has "
             "displayed, including errors, warnings, and informational "
-            "messages. This is the output of the :messages command."
+            "messages. Without arguments this is the output of the :messages "
+            "command. Pass since (0 on the first call, then the cursor from "
+            "the previous response) to get only messages added since then, "
+            "and severity to keep only errors and/or warnings."
         ),
         "inputSchema": {
             "type": "object",
-            "properties": {},
+            "properties": {
+                "since": {
+                    "type": "integer",
+                    "description": "Cursor from a previous response. Only messages after it are returned. Use 0 to get all retained messages.",
+                },
+                "severity": {
+                    "type": "array",
+                    "items": {"type": "string", "enum": ["error", "warning", "info"]},
+                    "description": "Only return messages with one of these severities.",
+                },
+            },
+            "additionalProperties": False,
+        },
+    },
+    "search_buffers": {
+        "description": (
+            "Search all loaded buffers for a regular expression (Python "
+            "syntax) and return the matching lines with optional context. "
+            "Prefer this over reading whole buffers with get_buffer just to "
+            "find something. Unsaved changes are searched. Help, quickfix, "
+            "terminal and other special buffers are skipped unless "
+            "include_special is set. Optionally fills the quickfix list "
+            "with the matches."
+        ),
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "pattern": {
+                    "type": "string",
+                    "description": "Regular expression to search for (Python re syntax).",
+                },
+                "ignore_case": {
+                    "type": "boolean",
+                    "description": "Match case-insensitively. Default false.",
+                },
+                "context_lines": {
+                    "type": "integer",
+                    "description": "Number of lines of context to return before and after each match. Default 0.",
+                },
+                "max_results": {
+                    "type": "integer",
+                    "description": "Maximum number of matches to return. Default 100.",
+                },
+                "quickfix": {
+                    "type": "boolean",
+                    "description": "Replace the quickfix list with the matches. Default false.",
+                },
+                "include_special": {
+                    "type": "boolean",
+                    "description": "Also search buffers with 'buftype' set (help, quickfix, terminal, scratch). Default false.",
+                },
+            },
+            "required": ["pattern"],
+            "additionalProperties": False,
+        },
+    },
+    "search_files": {
+        "description": (
+            "Search the files under a directory for a regular expression "
+            "(Python syntax) and load the matches into the quickfix list. "
+            "Respects .gitignore files and skips binary files. Use this "
+            "instead of building a quickfix list from external search "
+            "results when showing the user every place something occurs."
+        ),
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "pattern": {
+                    "type": "string",
+                    "description": "Regular expression to search for (Python re syntax, matched per line).",
+                },
+                "path": {
+                    "type": "string",
+                    "description": "Absolute path of the directory to search.",
+                },
+                "ignore_case": {
+                    "type": "boolean",
+                    "description": "Match case-insensitively (ASCII only). Default false.",
+                },
+                "max_results": {
+                    "type": "integer",
+                    "description": "Maximum number of matches. Default 1000.",
+                },
+                "quickfix": {
+                    "type": "boolean",
+                    "description": (
+                        "Replace the quickfix list with the matches. Default true. "
+                        "When false, the matches are returned instead."
+                    ),
+                },
+                "open": {
+                    "type": "boolean",
+                    "description": "Open the quickfix window afterwards. Default false.",
+                },
+            },
+            "required": ["pattern", "path"],
             "additionalProperties": False,
         },
     },
@@ -373,8 +633,12 @@ TOOL_DEFINITIONS = {
             "descriptions like 'before'/'after'), and filetype_a / "
             "filetype_b to set the Vim filetype for syntax highlighting "
             "(e.g. 'python', 'diff', 'markdown'). "
-            "Always opens in a new tab. "
-            "Call multiple times for multiple diffs."
+            "Opens a new tab, or in content mode with reuse_tab refills "
+            "the tab of an earlier reuse_tab diff. "
+            "Call multiple times for multiple diffs. "
+            "Set view to 'unified' for a single read-only diff buffer "
+            "with a quickfix list of its hunks, which is much cheaper "
+            "for very large inputs."
         ),
         "inputSchema": {
             "type": "object",
@@ -411,6 +675,20 @@ TOOL_DEFINITIONS = {
                     "type": "string",
                     "description": "Absolute path to the second file (right side). Only use when content is not already available.",
                 },
+                "reuse_tab": {
+                    "type": "boolean",
+                    "description": "Content mode only: show the diff in the tab opened by an earlier reuse_tab call, replacing its contents, instead of opening a new tab. Defaults to false.",
+                },
+                "view": {
+                    "type": "string",
+                    "enum": ["split", "unified"],
+                    "description": "'split' (default) shows the two sides next to each other with Vim's diff mode; 'unified' computes the diff in the server and shows it in one read-only buffer with filetype=diff, and sets the quickfix list to its hunks.",
+                },
+                "context": {
+                    "type": "integer",
+                    "description": "Lines of context around each change in the unified view. Default 3.",
+                    "minimum": 0,
+                },
             },
             "additionalProperties": False,
         },
@@ -426,8 +704,11 @@ TOOL_DEFINITIONS = {
             "Rename detection is enabled, so a renamed file is followed "
             "across the two sides. If a side does not contain the file "
             "(e.g. an added or deleted file), that buffer is shown empty. "
-            "Always opens in a new tab. Call multiple times for multiple "
-            "diffs."
+            "Opens a new tab, or with reuse_tab refills the tab of an "
+            "earlier reuse_tab diff. Set all_files to open every changed "
+            "file between the two sides at once, one tab per file; tabs are "
+            "filled when first visited. Set view to 'unified' for a single "
+            "read-only diff buffer with a quickfix list of its hunks."
         ),
         "inputSchema": {
             "type": "object",
@@ -448,11 +729,94 @@ TOOL_DEFINITIONS = {
                     "type": "boolean",
                     "description": "Convenience for diffing HEAD against the index. Mutually exclusive with explicit ref_a or ref_b. Defaults to false.",
                 },
+                "unstaged": {
+                    "type": "boolean",
+                    "description": "Convenience for diffing the index against the working tree. Mutually exclusive with staged and explicit ref_a or ref_b. Defaults to false.",
+                },
+                "all_files": {
+                    "type": "boolean",
+                    "description": "Diff every file changed between the two sides instead of only path. path may then be any file or directory inside the repository. Defaults to false.",
+                },
+                "max_files": {
+                    "type": "integer",
+                    "description": "Maximum number of tabs opened when all_files is set. Defaults to 50.",
+                    "minimum": 1,
+                },
+                "reuse_tab": {
+                    "type": "boolean",
+                    "description": "Show the diff in the tab opened by an earlier reuse_tab call, replacing its contents, instead of opening a new tab. Ignored with all_files. Defaults to false.",
+                },
+                "view": {
+                    "type": "string",
+                    "enum": ["split", "unified"],
+                    "description": "'split' (default) shows the two sides next to each other with Vim's diff mode; 'unified' computes the diff in the server and shows it in one read-only buffer with filetype=diff, and sets the quickfix list to its hunks. With all_files, every changed file goes into the one buffer.",
+                },
+                "context": {
+                    "type": "integer",
+                    "description": "Lines of context around each change in the unified view. Default 3.",
+                    "minimum": 0,
+                },
             },
             "required": ["path"],
             "additionalProperties": False,
         },
     },
+    "compute_diff": {
+        "description": (
+            "Compute the differences between two texts and return them as "
+            "unified diff text or structured hunks, without opening any "
+            "view in Vim. Each side can be given as content, an absolute "
+            "file path, or a loaded buffer number; alternatively give path "
+            "(and optionally ref_a, ref_b, staged or unstaged, as for "
+            "show_git_diff) to diff two git sides of a file. Prefer this "
+            "over show_diff/show_git_diff when the diff is only needed for "
+            "reasoning rather than for the user to look at."
+        ),
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "content_a": {"type": "string", "description": "Left-side text."},
+                "content_b": {"type": "string", "description": "Right-side text."},
+                "file_a": {"type": "string", "description": "Absolute path of the left-side file."},
+                "file_b": {"type": "string", "description": "Absolute path of the right-side file."},
+                "buffer_a": {"type": "integer", "description": "Number of a loaded buffer for the left side (unsaved changes included)."},
+                "buffer_b": {"type": "integer", "description": "Number of a loaded buffer for the right side (unsaved changes included)."},
+                "path": {
+                    "type": "string",
+                    "description": "Absolute path of a file inside a git repository. Diffs two git sides of it instead of the per-side arguments above.",
+                },
+                "ref_a": {
+                    "type": "string",
+                    "description": "With path: left-side revision. Empty string means working tree, ':0:' the index. Defaults to 'HEAD'.",
+                },
+                "ref_b": {
+                    "type": "string",
+                    "description": "With path: right-side revision. Defaults to '' (working tree).",
+                },
+                "staged": {
+                    "type": "boolean",
+                    "description": "With path: diff HEAD against the index. Defaults to false.",
+                },
+                "unstaged": {
+                    "type": "boolean",
+                    "description": "With path: diff the index against the working tree. Defaults to false.",
+                },
+                "label_a": {"type": "string", "description": "Name for the left side in the output."},
+                "label_b": {"type": "string", "description": "Name for the right side in the output."},
+                "context": {
+                    "type": "integer",
+                    "description": "Lines of context around each change. Default 3.",
+                    "minimum": 0,
+                },
+                "format": {
+                    "type": "string",
+                    "enum": ["unified", "hunks"],
+                    "description": "'unified' (default) returns diff -u style text; 'hunks' returns JSON with one object per hunk.",
+                },
+            },
+            "additionalProperties": False,
+        },
+    },
 }
 
 
@@ -479,13 +843,81 @@ def _resolve_buffer(vim, buffer_id=None, buffer_path=None):
     return vim.current.buffer
 
 
+# Window and buffer switches inside a multi-step tool are not something
+# the user sees, so the autocommands for them are skipped; the ones that
+# matter for the end result (BufRead, FileType, BufWritePre, ...) still
+# fire.  g:mcp_server_ignore_events overrides the events per tool.
+_SWITCH_EVENTS = "WinEnter,WinLeave,BufEnter,BufLeave,BufWinEnter,BufWinLeave,TabEnter,TabLeave"
+
+_TOOL_CONTEXTS = {
+    "edit_buffer": "",
+    "apply_text_edits": "",
+    "open_file": "",
+    "save_buffer": "",
+    "close_buffer": "",
+    "set_quickfix_list": "",
+    "set_location_list": "",
+    "_set_quickfix_items": "",
+    "_open_lazy_git_diffs": _SWITCH_EVENTS,
+    "_show_unified_diff": _SWITCH_EVENTS,
+    "show_diff": _SWITCH_EVENTS,
+    "show_git_diff": _SWITCH_EVENTS,
+}
+
+_EVENT_LIST_PATTERN = re.compile(r"^[A-Za-z]*(,[A-Za-z]+)*$")
+
+# Settling only replays the enter events; leave events belong to a window
+# that is gone or no longer current.
+_SETTLE_EVENTS = ("WinEnter", "BufEnter")
+
+
+def _tool_ignored_events(overrides, func_name):
+    events = _TOOL_CONTEXTS[func_name]
+    if isinstance(overrides, dict) and func_name.lstrip("_") in overrides:
+        wanted = overrides[func_name.lstrip("_")]
+        if isinstance(wanted, str) and _EVENT_LIST_PATTERN.match(wanted):
+            events = wanted
+    return events
+
+
+def _run_in_tool_context(vim, func_name, func, *args):
+    if func_name not in _TOOL_CONTEXTS:
+        return func(vim, *args)
+    prev_lazyredraw, prev_eventignore, window, overrides = vim.eval(
+        "[&lazyredraw, &eventignore, win_getid(), get(g:, 'mcp_server_ignore_events', {})]"
+    )
+    events = _tool_ignored_events(overrides, func_name)
+    vim.command("set lazyredraw")
+    if events:
+        vim.command("set eventignore+=" + events)
+
+    try:
+        return func(vim, *args)
+    finally:
+        vim.command("let &eventignore = '" + prev_eventignore.replace("'", "''") + "'")
+        if prev_lazyredraw == "0":
+            vim.command("set nolazyredraw")
+        if events and vim.eval("win_getid()") != window:
+            # Status lines and language clients track the current window
+            # through these events, so replay them once for where we ended.
+            for event in _SETTLE_EVENTS:
+                if event in events.split(","):
+                    vim.command("silent doautocmd <nomodeline> " + event)
+
+
 def execute_on_main_thread(vim, func_name, args):
+    return _run_in_tool_context(vim, func_name, _dispatch_main_thread, func_name, args)
+
+
+def _dispatch_main_thread(vim, func_name, args):
     if func_name == "list_buffers":
         return _exec_list_buffers(vim)
     if func_name == "get_buffer":
         return _exec_get_buffer(vim, args)
     if func_name == "edit_buffer":
         return _exec_edit_buffer(vim, args)
+    if func_name == "apply_text_edits":
+        return _exec_apply_text_edits(vim, args)
     if func_name == "open_file":
         return _exec_open_file(vim, args)
     if func_name == "save_buffer":
@@ -501,15 +933,25 @@ def execute_on_main_thread(vim, func_name, args):
     if func_name == "execute_command":
         return _exec_execute_command(vim, args)
     if func_name == "get_quickfix_list":
-        return _exec_get_quickfix_list(vim)
+        return _exec_get_quickfix_list(vim, args)
     if func_name == "set_quickfix_list":
         return _exec_set_quickfix_list(vim, args)
     if func_name == "get_location_list":
-        return _exec_get_location_list(vim)
+        return _exec_get_location_list(vim, args)
     if func_name == "set_location_list":
         return _exec_set_location_list(vim, args)
     if func_name == "get_messages":
-        return _exec_get_messages(vim)
+        return _exec_get_messages(vim, args)
+    if func_name == "_snapshot_buffers":
+        return _exec_snapshot_buffers(vim)
+    if func_name == "_set_quickfix_items":
+        return _exec_set_quickfix_items(vim, args)
+    if func_name == "_open_lazy_git_diffs":
+        return _exec_open_lazy_git_diffs(vim, args)
+    if func_name == "_buffer_lines":
+        return _exec_buffer_lines(vim, args)
+    if func_name == "_show_unified_diff":
+        return _exec_show_unified_diff(vim, args)
     if func_name == "show_diff":
         return _exec_show_diff(vim, args)
     if func_name == "show_git_diff":
@@ -584,6 +1026,136 @@ def _exec_edit_buffer(vim, args):
     return {"error": f"Unknown action: {action}"}
 
 
+_POSITION_ENCODINGS = {"utf-16", "utf-8", "utf-32"}
+
+_LINE_INDEX_CACHE = {}
+
+
+def _reset_line_index_cache():
+    _LINE_INDEX_CACHE.clear()
+
+
+def _line_index(vim, buf):
+    tick = int(vim.eval(f"getbufvar({buf.number}, 'changedtick')"))
+    entry = _LINE_INDEX_CACHE.get(buf.number)
+    if entry is None or entry["tick"] != tick:
+        entry = {"tick": tick, "line_count": len(buf), "lines": {}}
+        _LINE_INDEX_CACHE[buf.number] = entry
+
+    return entry
+
+
+def _unit_offsets(text, encoding):
+    if encoding == "utf-32" or text.isascii():
+        return None
+    if encoding == "utf-16":
+        if all(ord(ch) <= 0xFFFF for ch in text):
+            return None
+        widths = (2 if ord(ch) > 0xFFFF else 1 for ch in text)
+    else:
+        widths = (len(ch.encode("utf-8", errors="surrogatepass")) for ch in text)
+    offsets = [0]
+    for w in widths:
+        offsets.append(offsets[-1] + w)
+    return offsets
+
+
+def _line_entry(index, buf, line, encoding):
+    key = (line, encoding)
+    cached = index["lines"].get(key)
+    if cached is None:
+        text = buf[line]
+        cached = (text, _unit_offsets(text, encoding))
+        index["lines"][key] = cached
+
+    return cached
+
+
+def _character_to_index(offsets, text, character):
+    if offsets is None:
+        return min(character, len(text))
+    if character >= offsets[-1]:
+        return len(text)
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if offsets[mid] < character:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def _resolve_position(index, buf, position, encoding, name):
+    if not isinstance(position, dict):
+        return None, {"error": f"{name} must be an object with line and character"}
+    line = position.get("line")
+    character = position.get("character")
+    if not isinstance(line, int) or not isinstance(character, int):
+        return None, {"error": f"{name} must have integer line and character"}
+    if line < 0 or character < 0:
+        return None, {"error": f"{name} must not be negative"}
+    line_count = index["line_count"]
+    if line >= line_count:
+        if line == line_count and character == 0:
+            last = line_count - 1
+            text, _ = _line_entry(index, buf, last, encoding)
+            return (last, len(text)), None
+        return None, {"error": f"{name} line {line} is out of range (buffer has {line_count} lines)"}
+    text, offsets = _line_entry(index, buf, line, encoding)
+    return (line, _character_to_index(offsets, text, character)), None
+
+
+def _exec_apply_text_edits(vim, args):
+    allow = int(vim.eval("get(g:, 'mcp_server_allow_edit', 0)"))
+    if not allow:
+        return {"error": "apply_text_edits is disabled. Set g:mcp_server_allow_edit = 1 to enable."}
+    buf = _resolve_buffer(vim, args.get("buffer_id"), args.get("buffer_path"))
+    if buf is None:
+        return {"error": "Buffer not found"}
+    encoding = args.get("position_encoding", "utf-16")
+    if encoding not in _POSITION_ENCODINGS:
+        return {"error": f"Unknown position_encoding: {encoding}"}
+    edits = args.get("edits")
+    if not isinstance(edits, list):
+        return {"error": "edits must be a list"}
+
+    index = _line_index(vim, buf)
+    resolved = []
+    for i, edit in enumerate(edits):
+        rng = edit.get("range") if isinstance(edit, dict) else None
+        new_text = edit.get("newText") if isinstance(edit, dict) else None
+        if not isinstance(rng, dict) or not isinstance(new_text, str):
+            return {"error": f"edits[{i}] must have a range and newText"}
+        start, error = _resolve_position(index, buf, rng.get("start"), encoding, f"edits[{i}].range.start")
+        if error:
+            return error
+        end, error = _resolve_position(index, buf, rng.get("end"), encoding, f"edits[{i}].range.end")
+        if error:
+            return error
+        if end < start:
+            return {"error": f"edits[{i}].range end is before start"}
+        resolved.append((start, end, i, new_text.replace("\r\n", "\n")))
+
+    resolved.sort()
+    for prev, cur in zip(resolved, resolved[1:]):
+        if cur[0] < prev[1]:
+            return {"error": f"edits[{prev[2]}] and edits[{cur[2]}] overlap"}
+
+    for (start_line, start_col), (end_line, end_col), _, new_text in reversed(resolved):
+        first = buf[start_line]
+        last = first if end_line == start_line else buf[end_line]
+        replacement = (first[:start_col] + new_text + last[end_col:]).split("\n")
+        if end_line == start_line and len(replacement) == 1:
+            if replacement[0] != first:
+                buf[start_line] = replacement[0]
+        else:
+            buf[start_line:end_line + 1] = replacement
+
+    _LINE_INDEX_CACHE.pop(buf.number, None)
+    return f"Applied {len(resolved)} text edits to buffer {buf.number}"
+
+
 def _exec_open_file(vim, args):
     path = args.get("path", "")
 
@@ -599,17 +1171,76 @@ def _exec_save_buffer(vim, args):
     allow = int(vim.eval("get(g:, 'mcp_server_allow_save', 0)"))
     if not allow:
         return {"error": "save_buffer is disabled. Set g:mcp_server_allow_save = 1 to enable."}
+    if args.get("all_modified", False) or args.get("buffer_ids") is not None:
+        return _save_buffers(vim, args)
     buf = _resolve_buffer(vim, args.get("buffer_id"), args.get("buffer_path"))
     if buf is None:
         return {"error": "Buffer not found"}
-    prev = vim.current.buffer.number
-    vim.command(f"buffer {buf.number}")
-    vim.command("write")
-    if prev != buf.number:
-        vim.command(f"buffer {prev}")
+    _write_buffer(vim, buf.number)
     return f"Saved buffer {buf.number}: {buf.name}"
 
 
+def _has_feature(vim, feature):
+    return vim.eval(f"has('{feature}')") == "1"
+
+
+def _write_buffer(vim, number):
+    if number == vim.current.buffer.number:
+        vim.command("write")
+        return
+    # win_execute() makes a window current without any autocommands, so
+    # only the write events fire and the user's view never moves.
+    window = int(vim.eval(f"get(win_findbuf({number}), 0, -1)"))
+    if window != -1:
+        vim.command(f"call win_execute({window}, 'write')")
+        return
+    if _has_feature(vim, "popupwin"):
+        # A hidden buffer gets a hidden popup to write from.
+        popup = int(vim.eval(f"popup_create({number}, {{'hidden': 1}})"))
+        try:
+            vim.command(f"call win_execute({popup}, 'write')")
+        finally:
+            vim.command(f"call popup_close({popup})")
+        return
+    prev = vim.current.buffer.number
+    vim.command(f"noautocmd keepalt keepjumps hide buffer {number}")
+    try:
+        vim.command("write")
+    finally:
+        vim.command(f"noautocmd keepalt keepjumps hide buffer {prev}")
+
+
+def _save_buffers(vim, args):
+    if args.get("all_modified", False):
+        numbers = [int(n) for n in vim.eval(
+            "map(filter(getbufinfo({'bufmodified': 1}), "
+            "'v:val.name !=# \"\" && getbufvar(v:val.bufnr, \"&buftype\") ==# \"\"'), "
+            "'v:val.bufnr')"
+        )]
+    else:
+        numbers = [int(n) for n in args["buffer_ids"]]
+    if not numbers:
+        return "No buffers to save"
+
+    lines = []
+    saved = 0
+    for number in numbers:
+        buf = _resolve_buffer(vim, number)
+        if buf is None:
+            lines.append(f"Buffer {number} not found")
+            continue
+        try:
+            _write_buffer(vim, number)
+        except vim.error as e:
+            lines.append(f"Failed to save buffer {number}: {e}")
+            continue
+        saved += 1
+        lines.append(f"Saved buffer {number}: {buf.name}")
+    if not saved:
+        return {"error": "\n".join(lines)}
+    return f"Saved {saved} of {len(numbers)} buffers\n" + "\n".join(lines)
+
+
 def _exec_close_buffer(vim, args):
     buf = _resolve_buffer(vim, args.get("buffer_id"), args.get("buffer_path"))
     if buf is None:
@@ -679,28 +1310,63 @@ def _exec_execute_command(vim, args):
     return f"Executed: {cmd}"
 
 
+# bufname() is relative to the current directory, so the autoload
+# clears this on DirChanged as well as on BufFilePost.
+_BUFNAME_CACHE = {}
+
+
+def _reset_bufname_cache():
+    _BUFNAME_CACHE.clear()
+
+
+def _vim_str(value):
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return value
+
+
+def _resolve_bufnames(vim, bufnrs):
+    missing = sorted(n for n in set(bufnrs) if n not in _BUFNAME_CACHE)
+    if missing:
+        names = vim.eval(f"map({json.dumps(missing)}, 'bufname(v:val)')")
+        for number, name in zip(missing, names):
+            _BUFNAME_CACHE[number] = _vim_str(name)
+
+    return {n: _BUFNAME_CACHE.get(n, "") for n in bufnrs}
+
+
 def _format_list_entries(vim, raw_entries):
-    entries = []
+    rows = []
+    unnamed = []
     for e in raw_entries:
         bufnr = int(e.get("bufnr", 0))
-        filename = e.get("filename", "")
+        filename = _vim_str(e.get("filename", ""))
         if not filename and bufnr > 0:
-            filename = vim.eval(f"bufname({bufnr})")
+            unnamed.append(bufnr)
+        rows.append((bufnr, filename, e))
+    names = _resolve_bufnames(vim, unnamed) if unnamed else {}
+    entries = []
+    for bufnr, filename, e in rows:
         entries.append({
-            "filename": filename,
+            "filename": filename or names.get(bufnr, ""),
             "line": int(e.get("lnum", 0)),
             "column": int(e.get("col", 0)),
-            "text": e.get("text", ""),
-            "type": e.get("type", ""),
+            "text": _vim_str(e.get("text", "")),
+            "type": _vim_str(e.get("type", "")),
         })
     return entries
 
 
 def _validate_list_entries(entries):
+    checked = set()
     for i, e in enumerate(entries):
-        error = _require_absolute_path(e["filename"], f"entries[{i}].filename")
+        filename = e["filename"]
+        if filename in checked:
+            continue
+        error = _require_absolute_path(filename, f"entries[{i}].filename")
         if error:
             return error
+        checked.add(filename)
 
     return None
 
@@ -721,10 +1387,68 @@ def _build_setqflist_items(entries):
     return items
 
 
-def _exec_get_quickfix_list(vim):
-    raw = vim.eval("getqflist()")
-    title = vim.eval("getqflist({'title': 1})").get("title", "")
-    return json.dumps({"title": title, "entries": _format_list_entries(vim, raw)})
+def _get_list_what(vim, func_name, prefix_args, what):
+    if hasattr(vim, "Function"):
+        return vim.Function(func_name)(*prefix_args, what)
+    prefix = "".join(f"{a}, " for a in prefix_args)
+    return vim.eval(f"{func_name}({prefix}{json.dumps(what)})")
+
+
+def _get_list(vim, func_name, prefix_args, args, winid=None):
+    info = _get_list_what(vim, func_name, prefix_args, {
+        "title": 1,
+        "size": 1,
+        "id": 1,
+        "changedtick": 1,
+    })
+    size = int(info.get("size", 0))
+    tick = int(info.get("changedtick", 0))
+    result = {
+        "title": _vim_str(info.get("title", "")),
+        "size": size,
+        "id": int(info.get("id", 0)),
+        "changedtick": tick,
+    }
+    # A new list starts again at changedtick 1, so the tick alone does not
+    # say the client has these entries; the list (and for a location list,
+    # the window) has to be the same one too.
+    known = {"id": result["id"], "changedtick": tick}
+    if winid is not None:
+        result["winid"] = known["winid"] = winid
+    try:
+        unchanged = all(args.get(key) is not None and int(args[key]) == value for key, value in known.items())
+    except (TypeError, ValueError):
+        return {"error": "changedtick, id and winid must be integers"}
+    if unchanged:
+        result["unchanged"] = True
+        return json.dumps(result)
+
+    offset = max(0, int(args.get("offset", 0)))
+    limit = args.get("limit")
+    end = size if limit is None else min(size, offset + max(0, int(limit)))
+    raw = []
+    if offset < end:
+        items = _get_list_what(vim, func_name, prefix_args, {"items": 1})["items"]
+        raw = items[offset:end]
+    result["offset"] = offset
+    result["entries"] = _format_list_entries(vim, raw)
+    return json.dumps(result)
+
+
+def _exec_get_quickfix_list(vim, args):
+    return _get_list(vim, "getqflist", [], args)
+
+
+def _set_list(vim, func_name, prefix_args, items, action, title="", list_id=None):
+    what = {"items": items}
+    if title:
+        what["title"] = title
+    if list_id is not None:
+        what["id"] = list_id
+    if hasattr(vim, "Function"):
+        return vim.Function(func_name)(*prefix_args, [], action, what)
+    prefix = "".join(f"{a}, " for a in prefix_args)
+    return vim.eval(f"{func_name}({prefix}[], '{action}', {json.dumps(what)})")
 
 
 def _exec_set_quickfix_list(vim, args):
@@ -734,20 +1458,19 @@ def _exec_set_quickfix_list(vim, args):
     if error:
         return error
 
+    append = bool(args.get("append", False))
     title = args.get("title", "")
     items = _build_setqflist_items(entries)
-    vim.eval(f"setqflist({json.dumps(items)}, 'r')")
-    if title:
-        vim.eval(f"setqflist([], 'a', {json.dumps({'title': title})})")
+    _set_list(vim, "setqflist", [], items, "a" if append else "r", title)
     if args.get("open", False):
         vim.command("copen")
+    if append:
+        return f"Appended {len(entries)} quickfix entries"
     return f"Set {len(entries)} quickfix entries"
 
 
-def _exec_get_location_list(vim):
-    raw = vim.eval("getloclist(0)")
-    title = vim.eval("getloclist(0, {'title': 1})").get("title", "")
-    return json.dumps({"title": title, "entries": _format_list_entries(vim, raw)})
+def _exec_get_location_list(vim, args):
+    return _get_list(vim, "getloclist", [0], args, int(vim.eval("win_getid()")))
 
 
 def _exec_set_location_list(vim, args):
@@ -757,25 +1480,260 @@ def _exec_set_location_list(vim, args):
     if error:
         return error
 
+    append = bool(args.get("append", False))
     title = args.get("title", "")
     items = _build_setqflist_items(entries)
-    vim.eval(f"setloclist(0, {json.dumps(items)}, 'r')")
-    if title:
-        vim.eval(f"setloclist(0, [], 'a', {json.dumps({'title': title})})")
+    _set_list(vim, "setloclist", [0], items, "a" if append else "r", title)
     if args.get("open", False):
         vim.command("lopen")
+    if append:
+        return f"Appended {len(entries)} location list entries"
     return f"Set {len(entries)} location list entries"
 
 
-def _exec_get_messages(vim):
-    return vim.eval("execute('messages')")
+def _exec_set_quickfix_items(vim, args):
+    # A list filled in several steps is named by the id the first step
+    # returns: between steps other tools or the user may have made
+    # another list current.
+    items = args.get("items", [])
+    action = "a" if args.get("action") == "a" else "r"
+    list_id = args.get("id")
+    if _set_list(vim, "setqflist", [], items, action, args.get("title", ""), list_id) in (-1, "-1"):
+        return {"error": "The quickfix list being filled no longer exists"}
+    if args.get("open", False):
+        vim.command("copen")
+    if list_id is None:
+        list_id = int(vim.eval("getqflist({'id': 0}).id"))
+    return {"id": list_id}
+
+
+_LIST_CHUNK_SIZE = 5000
+
+
+def _run_set_quickfix_list(args):
+    entries = args.get("entries", [])
+    if len(entries) <= _LIST_CHUNK_SIZE:
+        return _submit_to_main_thread("set_quickfix_list", args)
+
+    error = _validate_list_entries(entries)
+    if error:
+        return error
+
+    append = bool(args.get("append", False))
+    title = args.get("title", "")
+    list_id = None
+    for start in range(0, len(entries), _LIST_CHUNK_SIZE):
+        first = start == 0
+        last = start + _LIST_CHUNK_SIZE >= len(entries)
+        chunk = {
+            "items": _build_setqflist_items(entries[start:start + _LIST_CHUNK_SIZE]),
+            "action": "a" if append or not first else "r",
+            "title": title if first else "",
+            "open": last and bool(args.get("open", False)),
+        }
+        if list_id is not None:
+            chunk["id"] = list_id
+        result = _submit_to_main_thread("_set_quickfix_items", chunk)
+        if isinstance(result, dict) and "error" in result:
+            return result
+        list_id = result["id"]
+    if append:
+        return f"Appended {len(entries)} quickfix entries"
+    return f"Set {len(entries)} quickfix entries"
+
+
+_MESSAGE_RING_SIZE = 1000
+_MESSAGE_RING = collections.deque(maxlen=_MESSAGE_RING_SIZE)
+_MESSAGE_STATE = {"lines": [], "seq": 0}
+
+_ERROR_MESSAGE = re.compile(r"^(E\d+:|Error detected while processing|Error )")
+_WARNING_MESSAGE = re.compile(r"^(W\d+:|Warning)")
+_MESSAGE_CONTINUATION = re.compile(r"^line\s+\d+:$")
+
+
+def _reset_message_ring():
+    _MESSAGE_RING.clear()
+    _MESSAGE_STATE["lines"] = []
+    _MESSAGE_STATE["seq"] = 0
+
+
+def _new_message_lines(previous, current):
+    n = len(previous)
+    if current[:n] == previous:
+        return current[n:]
+    # The history only shrinks when it is cleared; once it is full, Vim
+    # drops the oldest line for each new one and the length stays put.
+    if len(current) < n:
+        return current
+    last = previous[-1]
+    for i in range(min(len(current), n) - 1, -1, -1):
+        if current[i] == last and current[:i + 1] == previous[n - i - 1:]:
+            return current[i + 1:]
+    return current
+
+
+def _message_severity(line, previous_severity):
+    if _ERROR_MESSAGE.match(line):
+        return "error"
+    if _WARNING_MESSAGE.match(line):
+        return "warning"
+    if previous_severity == "error" and _MESSAGE_CONTINUATION.match(line):
+        return "error"
+    return "info"
+
+
+def _sync_messages(vim):
+    text = vim.eval("execute('messages')")
+    current = text[1:].split("\n") if text.startswith("\n") else text.split("\n")
+    if current == [""]:
+        current = []
+    severity = _MESSAGE_RING[-1]["severity"] if _MESSAGE_RING else "info"
+    for line in _new_message_lines(_MESSAGE_STATE["lines"], current):
+        severity = _message_severity(line, severity)
+        _MESSAGE_STATE["seq"] += 1
+        _MESSAGE_RING.append({
+            "id": _MESSAGE_STATE["seq"],
+            "severity": severity,
+            "text": line,
+        })
+    _MESSAGE_STATE["lines"] = current
+    return text
+
+
+def _exec_get_messages(vim, args):
+    since = args.get("since")
+    severities = args.get("severity")
+    if since is None and severities is None:
+        return _sync_messages(vim)
+
+    _sync_messages(vim)
+    since = max(0, int(since or 0))
+    wanted = set(severities) if severities else None
+    oldest = _MESSAGE_RING[0]["id"] if _MESSAGE_RING else _MESSAGE_STATE["seq"] + 1
+    messages = [
+        m for m in _MESSAGE_RING
+        if m["id"] > since and (wanted is None or m["severity"] in wanted)
+    ]
+    return json.dumps({
+        "cursor": _MESSAGE_STATE["seq"],
+        "messages": messages,
+        "dropped": since + 1 < oldest,
+    }, indent=2)
+
+
+_BUFFER_SNAPSHOTS = {}
+_BUFFER_SNAPSHOT_LOCK = threading.Lock()
+
+
+def _reset_buffer_snapshots():
+    with _BUFFER_SNAPSHOT_LOCK:
+        _BUFFER_SNAPSHOTS.clear()
+
+
+def _exec_snapshot_buffers(vim):
+    infos = vim.eval(
+        "map(getbufinfo({'bufloaded': 1}), "
+        "'[v:val.bufnr, v:val.name, v:val.changedtick, getbufvar(v:val.bufnr, \"&buftype\")]')"
+    )
+    with _BUFFER_SNAPSHOT_LOCK:
+        previous = dict(_BUFFER_SNAPSHOTS)
+    snapshots = {}
+    for number, name, tick, buftype in infos:
+        number = int(number)
+        tick = int(tick)
+        snap = previous.get(number)
+        if snap is None or snap["changedtick"] != tick:
+            snap = {
+                "number": number,
+                "name": name,
+                "changedtick": tick,
+                "buftype": buftype,
+                "lines": vim.buffers[number][:],
+            }
+        elif snap["name"] != name or snap.get("buftype") != buftype:
+            # Neither a rename nor 'buftype' changes changedtick.
+            snap = dict(snap, name=name, buftype=buftype)
+        snapshots[number] = snap
+    with _BUFFER_SNAPSHOT_LOCK:
+        _BUFFER_SNAPSHOTS.clear()
+        _BUFFER_SNAPSHOTS.update(snapshots)
+    return list(snapshots.values())
+
+
+@functools.lru_cache(maxsize=64)
+def _compile_pattern(pattern, ignore_case):
+    return re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+
+
+def _search_snapshots(snapshots, regex, context, max_results):
+    matches = []
+    for snap in snapshots:
+        lines = snap["lines"]
+        search = regex.search
+        for i, line in enumerate(lines):
+            m = search(line)
+            if m is None:
+                continue
+            if len(matches) >= max_results:
+                return matches, True
+            match = {
+                "buffer": snap["number"],
+                "filename": snap["name"] or "[No Name]",
+                "line": i + 1,
+                "column": len(line[:m.start()].encode("utf-8")) + 1,
+                "text": line,
+            }
+            if context > 0:
+                match["before"] = lines[max(0, i - context):i]
+                match["after"] = lines[i + 1:i + 1 + context]
+            matches.append(match)
+    return matches, False
+
+
+def _run_search_buffers(args):
+    pattern = args.get("pattern")
+    if not isinstance(pattern, str) or not pattern:
+        return {"error": "pattern is required"}
+    try:
+        regex = _compile_pattern(pattern, bool(args.get("ignore_case", False)))
+    except re.error as e:
+        return {"error": f"Invalid pattern: {e}"}
+    try:
+        context = max(0, int(args.get("context_lines", 0)))
+        max_results = max(1, int(args.get("max_results", 100)))
+    except (TypeError, ValueError):
+        return {"error": "context_lines and max_results must be integers"}
+
+    snapshots = _submit_to_main_thread("_snapshot_buffers", {})
+    if isinstance(snapshots, dict) and "error" in snapshots:
+        return snapshots
+    if not args.get("include_special", False):
+        snapshots = [snap for snap in snapshots if not snap["buftype"]]
+
+    matches, truncated = _search_snapshots(snapshots, regex, context, max_results)
+
+    if args.get("quickfix", False):
+        items = [
+            {"bufnr": m["buffer"], "lnum": m["line"], "col": m["column"], "text": m["text"]}
+            for m in matches
+        ]
+        result = _submit_to_main_thread("_set_quickfix_items", {
+            "items": items,
+            "title": f"search_buffers: {pattern}",
+        })
+        if isinstance(result, dict) and "error" in result:
+            return result
+
+    return json.dumps({"matches": matches, "truncated": truncated}, indent=2)
 
 
 _DIFFOPT_PATCH_CACHE = {}
+_DIFFOPT_STATE = {}
 
 
 def _reset_diffopt_patch_cache():
     _DIFFOPT_PATCH_CACHE.clear()
+    _DIFFOPT_STATE.clear()
 
 
 def _has_patch(vim, patch_id):
@@ -785,13 +1743,26 @@ def _has_patch(vim, patch_id):
     return _DIFFOPT_PATCH_CACHE[patch_id]
 
 
-def _enhance_diffopt(vim):
+def _enhance_diffopt(vim, large=False):
     current = vim.eval("&diffopt")
+    linematch = [item for item in current.split(",") if item.startswith("linematch")]
 
     additions = []
 
-    if "linematch" not in current:
-        if _has_patch(vim, "patch-9.1.1009"):
+    if large:
+        # linematch aligns every line of every hunk against the other side,
+        # which is what makes a huge diff crawl.  'diffopt' is global, so it
+        # is put back by the next diff that is not large, or once the last
+        # large diff tab is closed (restore_diffopt).
+        for item in linematch:
+            vim.command("set diffopt-=" + item)
+        if linematch:
+            _DIFFOPT_STATE["linematch"] = linematch[0]
+    elif not linematch:
+        removed = _DIFFOPT_STATE.pop("linematch", None)
+        if removed is not None:
+            additions.append(removed)
+        elif _has_patch(vim, "patch-9.1.1009"):
             additions.append("linematch:60")
 
     if "algorithm:" not in current:
@@ -802,6 +1773,59 @@ def _enhance_diffopt(vim):
         vim.command("set diffopt+=" + item)
 
 
+def restore_diffopt(vim):
+    # Called on TabClosed.  Large-content windows have w:mcp_diff_large.
+    removed = _DIFFOPT_STATE.get("linematch")
+    if removed is None:
+        return
+    if vim.eval("len(filter(getwininfo(), 'get(v:val.variables, \"mcp_diff_large\", 0)'))") != "0":
+        return
+    del _DIFFOPT_STATE["linematch"]
+    if not any(item.startswith("linematch") for item in vim.eval("&diffopt").split(",")):
+        vim.command("set diffopt+=" + removed)
+
+
+_DEFAULT_LARGE_DIFF_BYTES = 1024 * 1024
+_LARGE_DIFF_SYNMAXCOL = 200
+_LARGE_DIFF_SUFFIX = " (large-content mode)"
+
+
+def _large_diff_threshold(vim):
+    expr = f"get(g:, 'mcp_server_large_diff_bytes', {_DEFAULT_LARGE_DIFF_BYTES})"
+    try:
+        return int(vim.eval(expr))
+    except (TypeError, ValueError):
+        return _DEFAULT_LARGE_DIFF_BYTES
+
+
+def _lines_size(lines):
+    return sum(len(line) for line in lines) + len(lines)
+
+
+def _is_large_diff(vim, *sizes):
+    threshold = _large_diff_threshold(vim)
+    return threshold > 0 and max(sizes) > threshold
+
+
+def _with_eventignore(vim, func, *args):
+    prev_eventignore = vim.eval("&eventignore")
+    vim.command("set eventignore=all")
+
+    try:
+        return func(vim, *args)
+    finally:
+        vim.command("let &eventignore = '" + prev_eventignore.replace("'", "''") + "'")
+
+
+def _large_buffer_options():
+    return f"syntax=OFF synmaxcol={_LARGE_DIFF_SYNMAXCOL}"
+
+
+def _disable_diff_folding(vim):
+    # diffthis turns on diff folding, which has to walk the whole buffer.
+    vim.command("setlocal foldmethod=manual nofoldenable | let w:mcp_diff_large = 1")
+
+
 _FILETYPE_PATTERN = re.compile(r"^[A-Za-z0-9_.-]+$")
 
 
@@ -809,12 +1833,15 @@ def _is_valid_filetype(ft):
     return isinstance(ft, str) and bool(_FILETYPE_PATTERN.match(ft))
 
 
-def _setup_scratch_buffer(vim, content, label, filetype=None):
+def _setup_scratch_buffer(vim, content, label, filetype=None, large=False):
     vim.command("enew")
-    vim.command("setlocal buftype=nofile bufhidden=wipe noswapfile")
+    if large:
+        vim.command("setlocal buftype=nofile bufhidden=wipe noswapfile " + _large_buffer_options())
+    else:
+        vim.command("setlocal buftype=nofile bufhidden=wipe noswapfile")
     escaped_label = vim.eval("fnameescape('" + label.replace("'", "''") + "')")
     vim.command("file " + escaped_label)
-    if filetype is not None and _is_valid_filetype(filetype):
+    if not large and filetype is not None and _is_valid_filetype(filetype):
         vim.command("setlocal filetype=" + filetype)
     lines = content.split("\n")
     vim.current.buffer[:] = lines
@@ -843,63 +1870,254 @@ def _exec_show_diff(vim, args):
             if error:
                 return error
 
-    vim.command("tabnew")
-    _enhance_diffopt(vim)
-
     if has_files:
-        escaped_a = vim.eval("fnameescape('" + file_a.replace("'", "''") + "')")
-        escaped_b = vim.eval("fnameescape('" + file_b.replace("'", "''") + "')")
-        vim.command("edit " + escaped_a)
-        vim.command("setlocal nomodifiable")
-        vim.command("diffthis")
-        vim.command("vert diffsplit " + escaped_b)
-        vim.command("setlocal nomodifiable")
-        return f"Showing diff in new tab: {file_a} vs {file_b}"
+        vim.command("tabnew")
+        _enhance_diffopt(vim)
+        file_sides = args.get("file_sides")
+        if file_sides is None:
+            escaped_a = vim.eval("fnameescape('" + file_a.replace("'", "''") + "')")
+            escaped_b = vim.eval("fnameescape('" + file_b.replace("'", "''") + "')")
+            vim.command("edit " + escaped_a)
+            vim.command("setlocal nomodifiable")
+            vim.command("diffthis")
+            vim.command("vert diffsplit " + escaped_b)
+            vim.command("setlocal nomodifiable")
+            return f"Showing diff in new tab: {file_a} vs {file_b}"
+        # Binary files are summarized rather than loaded, so both sides
+        # become scratch buffers, read by _run_show_diff.  The scratch
+        # names must not be the file's own, which is taken while the file
+        # is loaded or an earlier diff of it is still open.
+        tag = uuid.uuid4().hex[:8]
+        for index, (path, side) in enumerate(zip((file_a, file_b), file_sides)):
+            if index:
+                vim.command("vnew")
+            kind = "binary, " if side["binary"] else ""
+            _setup_scratch_buffer(vim, "\n".join(side["lines"]), f"{path} ({kind}diff {tag})")
+            vim.command("setlocal nomodifiable")
+            vim.command("diffthis")
+        return f"Showing diff in new tab: {file_a} vs {file_b} (binary content summarized)"
 
     label_a = args.get("label_a", "a")
     label_b = args.get("label_b", "b")
     filetype_a = args.get("filetype_a")
     filetype_b = args.get("filetype_b")
 
-    _setup_scratch_buffer(vim, content_a, label_a, filetype_a)
-    vim.command("setlocal nomodifiable")
-    vim.command("diffthis")
+    binary = False
+    if "\0" in content_a[:_BINARY_SNIFF_BYTES]:
+        data = content_a.encode("utf-8", errors="surrogatepass")
+        content_a = "\n".join(_binary_summary_lines(label_a, len(data), hashlib.sha1(data).hexdigest()))
+        filetype_a = None
+        binary = True
+    if "\0" in content_b[:_BINARY_SNIFF_BYTES]:
+        data = content_b.encode("utf-8", errors="surrogatepass")
+        content_b = "\n".join(_binary_summary_lines(label_b, len(data), hashlib.sha1(data).hexdigest()))
+        filetype_b = None
+        binary = True
+
+    suffix = " (binary content summarized)" if binary else ""
+    large = _is_large_diff(vim, len(content_a), len(content_b))
+    if large:
+        suffix += _LARGE_DIFF_SUFFIX
+    sides = [(content_a, label_a, filetype_a), (content_b, label_b, filetype_b)]
+
+    if args.get("reuse_tab", False):
+        numbers = _reusable_diff_buffers(vim)
+        if numbers is not None:
+            _enhance_diffopt(vim, large)
+            _while_loading(vim, large, _refill_content_diff_tab, numbers, sides, large)
+            return f"Showing diff in reused tab: {label_a} vs {label_b}{suffix}"
 
-    vim.command("vnew")
-    _setup_scratch_buffer(vim, content_b, label_b, filetype_b)
+    vim.command("tabnew")
+    _enhance_diffopt(vim, large)
+    numbers = _while_loading(vim, large, _fill_content_diff_tab, sides, large)
+
+    if args.get("reuse_tab", False):
+        _mark_reusable_diff_tab(vim, numbers)
+    return f"Showing diff in new tab: {label_a} vs {label_b}{suffix}"
+
+
+def _while_loading(vim, large, func, *args):
+    # Large sides are loaded with autocommands off, so no plugin gets to
+    # run over the text before the window is shown.
+    if large:
+        return _with_eventignore(vim, func, *args)
+    return func(vim, *args)
+
+
+def _fill_content_diff_tab(vim, sides, large):
+    numbers = []
+    for index, (content, label, filetype) in enumerate(sides):
+        if index:
+            vim.command("vnew")
+        _setup_scratch_buffer(vim, content, label, filetype, large)
+        vim.command("setlocal nomodifiable")
+        vim.command("diffthis")
+        if large:
+            _disable_diff_folding(vim)
+        numbers.append(vim.current.buffer.number)
+    return numbers
+
+
+def _refill_content_diff_tab(vim, numbers, sides, large):
+    for number, (content, label, filetype) in zip(numbers, sides):
+        _refill_diff_buffer(vim, number, content.split("\n"), label, filetype=filetype, large=large)
+    vim.command("diffupdate")
+
+
+def _reusable_diff_buffers(vim):
+    tabs = vim.eval("filter(range(1, tabpagenr('$')), 'gettabvar(v:val, \"mcp_diff_reuse\", 0)')")
+    if not tabs:
+        return None
+    vim.command(f"tabnext {int(tabs[0])}")
+    numbers = [int(n) for n in vim.eval("get(t:, 'mcp_diff_bufs', [])")]
+    if len(numbers) == 2 and all(int(vim.eval(f"bufwinnr({n})")) > 0 for n in numbers):
+        return numbers
+    # The tab was rearranged by the user; leave it alone and start over.
+    vim.command("unlet! t:mcp_diff_reuse t:mcp_diff_bufs")
+    return None
+
+
+def _mark_reusable_diff_tab(vim, numbers, bare_names=None):
+    vim.command(f"let t:mcp_diff_reuse = 1 | let t:mcp_diff_bufs = [{numbers[0]}, {numbers[1]}]")
+    for number, bare in zip(numbers, bare_names or []):
+        key = bare.replace("'", "''")
+        vim.command(f"call setbufvar({number}, 'mcp_diff_detect_key', '{key}')")
+
+
+def _refill_diff_buffer(vim, number, lines, label, bare=None, filetype=None, large=False):
+    vim.command(f"execute bufwinnr({number}) . 'wincmd w'")
+    vim.command("setlocal modifiable")
+    vim.buffers[number][:] = lines
+    renamed = False
+    if large:
+        # With events ignored the Syntax autocommand that would clear the
+        # old highlighting never runs, so clear it directly.
+        vim.command("setlocal filetype= " + _large_buffer_options() + " | syntax clear")
+        vim.command("unlet! b:mcp_diff_detect_key")
+    elif bare is not None:
+        # Detection only depends on the name, so a side with the same
+        # bare name keeps its filetype and loaded syntax.  Not just the
+        # extension: notes.txt and CMakeLists.txt differ.
+        key = bare
+        if vim.eval("get(b:, 'mcp_diff_detect_key', '')") != key:
+            filetype = _cached_filetype(bare)
+            if filetype is None:
+                vim.command("keepalt file " + _vim_escape_filename(bare) + " | filetype detect")
+                _remember_filetype(vim, bare)
+                renamed = True
+            elif vim.eval("&filetype") != filetype:
+                vim.command("setlocal filetype=" + filetype)
+            vim.command("let b:mcp_diff_detect_key = '" + key.replace("'", "''") + "'")
+    else:
+        wanted = filetype if filetype is not None and _is_valid_filetype(filetype) else ""
+        if vim.eval("&filetype") != wanted:
+            vim.command("setlocal filetype=" + wanted)
+    if renamed or vim.eval("bufname('%')") != label:
+        vim.command("keepalt file " + _vim_escape_filename(label))
     vim.command("setlocal nomodifiable")
-    vim.command("diffthis")
+    if large:
+        _disable_diff_folding(vim)
+    else:
+        vim.command(
+            "if get(w:, 'mcp_diff_large', 0) | "
+            "setlocal foldmethod=diff foldenable synmaxcol< | "
+            "unlet w:mcp_diff_large | "
+            "endif"
+        )
+
+
+def _binary_file_summary(path):
+    try:
+        with open(path, "rb") as f:
+            head = f.read(_BINARY_SNIFF_BYTES)
+            if not _looks_binary(head):
+                return None
+            digest = hashlib.sha1(head)
+            size = len(head)
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+                size += len(chunk)
+    except OSError:
+        return None
+    return _binary_summary_lines(path, size, digest.hexdigest())
+
+
+def _binary_file_sides(file_a, file_b):
+    # Both sides of a split file diff when either is binary, or None.
+    # Run off the main thread: hashing a large binary file takes seconds.
+    summaries = [_binary_file_summary(file_a), _binary_file_summary(file_b)]
+    if summaries == [None, None]:
+        return None
+    return [
+        {"lines": summary or _read_text_file(path), "binary": summary is not None}
+        for path, summary in zip((file_a, file_b), summaries)
+    ]
+
+
+def _read_text_file(path):
+    try:
+        with open(path, "rb") as f:
+            data = f.read(_MAX_GIT_OUTPUT_BYTES + 1)
+    except OSError:
+        return [""]
+    if len(data) > _MAX_GIT_OUTPUT_BYTES:
+        return [f"File too large to show: {path}"]
+    return _git_text_lines(data.decode("utf-8", errors="replace"))
+
+
+_GIT_READ_CHUNK = 64 * 1024
+_MAX_GIT_STDERR_BYTES = 64 * 1024
 
-    return f"Showing diff in new tab: {label_a} vs {label_b}"
+
+class _GitOutputTooLarge(Exception):
+    pass
+
+
+def _drain_stderr(stream, sink):
+    while True:
+        chunk = stream.read(_GIT_READ_CHUNK)
+        if not chunk:
+            break
+        if len(sink) < _MAX_GIT_STDERR_BYTES:
+            sink.extend(chunk[:_MAX_GIT_STDERR_BYTES - len(sink)])
 
 
 def _run_git(repo_root, args):
-    return subprocess.run(
-        ["git"] + list(args),
+    # Output is read incrementally so an oversized blob kills git as soon
+    # as it crosses the cap instead of being buffered in full first.
+    cmd = ["git"] + list(args)
+    proc = subprocess.Popen(
+        cmd,
         cwd=repo_root,
-        capture_output=True,
-        check=False,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
     )
+    stderr = bytearray()
+    stderr_thread = threading.Thread(target=_drain_stderr, args=(proc.stderr, stderr), daemon=True)
+    stderr_thread.start()
+    stdout = bytearray()
+    try:
+        while True:
+            chunk = proc.stdout.read1(_GIT_READ_CHUNK)
+            if not chunk:
+                break
+            stdout.extend(chunk)
+            if len(stdout) > _MAX_GIT_OUTPUT_BYTES:
+                raise _GitOutputTooLarge(" ".join(cmd))
+    except BaseException:
+        proc.kill()
+        raise
+    finally:
+        proc.stdout.close()
+        returncode = proc.wait()
+        stderr_thread.join()
+        proc.stderr.close()
+    return subprocess.CompletedProcess(cmd, returncode, bytes(stdout), bytes(stderr))
 
 
 def _git_repo_root(path):
-    start_dir = path if os.path.isdir(path) else os.path.dirname(path)
-    if not start_dir:
-        return None
-    try:
-        result = subprocess.run(
-            ["git", "-C", start_dir, "rev-parse", "--show-toplevel"],
-            capture_output=True,
-            check=False,
-        )
-    except FileNotFoundError:
-        return None
-    if result.returncode != 0:
-        return None
-    root = result.stdout.decode("utf-8", errors="replace").strip()
-    if not root:
-        return None
-    return root
+    return mcp_git.repo_root(path)
 
 
 _FILENAME_ESCAPE_CHARS = set(" \t\n\r%#|\\\"'<>$&*?[]{}();`!")
@@ -921,32 +2139,67 @@ def _is_ref_safe(ref):
 
 def _read_worktree(repo_root, rel_path):
     full = os.path.join(repo_root, rel_path)
-    if not os.path.isfile(full):
-        return "", True
-    try:
-        size = os.path.getsize(full)
-    except OSError:
-        return "", True
-    if size > _MAX_GIT_OUTPUT_BYTES:
-        return None, False
     try:
         with open(full, "rb") as f:
-            data = f.read()
+            if os.fstat(f.fileno()).st_size > _MAX_GIT_OUTPUT_BYTES:
+                return None, False
+            # The file may grow between fstat and read; never read past the cap.
+            data = f.read(_MAX_GIT_OUTPUT_BYTES + 1)
     except OSError:
-        return "", True
-    return data.decode("utf-8", errors="replace"), False
+        return b"", True
+    if len(data) > _MAX_GIT_OUTPUT_BYTES:
+        return None, False
+    return data, False
+
+
+def _git_spec(ref, rel_path):
+    if ref == ":0:":
+        return ":" + rel_path
+    return ref + ":" + rel_path
+
+
+def _git_show_batch(repo_root, spec):
+    info = mcp_git.object_info(repo_root, spec)
+    if info is None or info[1] != "blob":
+        return b"", True
+    if info[2] > _MAX_GIT_OUTPUT_BYTES:
+        return None, False
+    contents = mcp_git.object_contents(repo_root, spec)
+    if contents is None:
+        return b"", True
+    return contents[3], False
+
+
+def _git_show_native(repo_root, ref, rel_path):
+    info = mcp_git_objects.path_info(repo_root, ref, rel_path)
+    if info is None or info[1] != "blob":
+        return b"", True
+    if info[2] > _MAX_GIT_OUTPUT_BYTES:
+        return None, False
+    return mcp_git_objects.read_object(repo_root, info[0])[1], False
 
 
 def _git_show(repo_root, ref, rel_path):
     if ref == "":
         return _read_worktree(repo_root, rel_path)
 
-    if ref == ":0:":
-        spec = ":" + rel_path
-    else:
-        spec = ref + ":" + rel_path
+    if ref != ":0:":
+        try:
+            return _git_show_native(repo_root, ref, rel_path)
+        except mcp_git_objects.Unsupported:
+            pass
+
+    spec = _git_spec(ref, rel_path)
 
-    result = _run_git(repo_root, ["show", spec])
+    try:
+        return _git_show_batch(repo_root, spec)
+    except mcp_git.GitBatchError:
+        pass
+
+    try:
+        result = _run_git(repo_root, ["show", spec])
+    except _GitOutputTooLarge:
+        return None, False
     if result.returncode != 0:
         stderr = result.stderr.decode("utf-8", errors="replace")
         if (
@@ -955,13 +2208,50 @@ def _git_show(repo_root, ref, rel_path):
             or "Path '" in stderr
             or "bad object" in stderr
         ):
-            return "", True
+            return b"", True
         return None, False
 
-    if len(result.stdout) > _MAX_GIT_OUTPUT_BYTES:
-        return None, False
+    return result.stdout, False
 
-    return result.stdout.decode("utf-8", errors="replace"), False
+
+_BINARY_SNIFF_BYTES = 8000
+
+
+def _looks_binary(data):
+    # Same heuristic git uses: a NUL byte in the first 8000 bytes.
+    return b"\0" in data[:_BINARY_SNIFF_BYTES]
+
+
+def _is_binary_blob(repo_root, rel_path, data):
+    try:
+        by_attributes = mcp_git.is_binary_by_attributes(repo_root, rel_path)
+    except mcp_git.GitBatchError:
+        by_attributes = None
+    if by_attributes is not None:
+        return by_attributes
+    return _looks_binary(data)
+
+
+def _binary_summary_lines(name, size, digest, digest_name="SHA-1"):
+    return [
+        f"Binary file not shown: {name}",
+        f"Size: {size} bytes",
+        f"{digest_name}: {digest}",
+    ]
+
+
+def _git_path_exists(repo_root, ref, rel_path):
+    if ref != ":0:":
+        try:
+            return mcp_git_objects.path_info(repo_root, ref, rel_path) is not None
+        except mcp_git_objects.Unsupported:
+            pass
+    spec = _git_spec(ref, rel_path)
+    try:
+        return mcp_git.object_info(repo_root, spec) is not None
+    except mcp_git.GitBatchError:
+        pass
+    return _run_git(repo_root, ["cat-file", "-e", spec]).returncode == 0
 
 
 def _resolve_path_at_ref(repo_root, ref, rel_path):
@@ -969,38 +2259,79 @@ def _resolve_path_at_ref(repo_root, ref, rel_path):
         full = os.path.join(repo_root, rel_path)
         return rel_path if os.path.isfile(full) else None
 
-    if ref == ":0:":
-        spec = ":" + rel_path
-    else:
-        spec = ref + ":" + rel_path
-
-    exists = _run_git(repo_root, ["cat-file", "-e", spec])
-    if exists.returncode == 0:
+    if _git_path_exists(repo_root, ref, rel_path):
         return rel_path
 
+    renames = _rename_map(repo_root, ref)
+    if renames is None:
+        return None
+    return renames.get(rel_path)
+
+
+_RENAME_MAPS = {}
+_RENAME_MAPS_LOCK = threading.Lock()
+
+
+def _reset_rename_maps():
+    with _RENAME_MAPS_LOCK:
+        _RENAME_MAPS.clear()
+
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _rename_state(repo_root, ref):
+    git_dir = mcp_git.git_dir(repo_root)
+    if git_dir is None:
+        return None
+    try:
+        target = mcp_git_objects.resolve_ref(repo_root, "HEAD" if ref == ":0:" else ref)
+    except mcp_git_objects.Unsupported:
+        target = None
+    return (
+        _stat_key(os.path.join(git_dir, "HEAD")),
+        _stat_key(os.path.join(git_dir, "index")),
+        target,
+    )
+
+
+def _rename_map(repo_root, ref):
+    # One whole-tree rename detection per (ref, HEAD/index state); a
+    # pathspec would hide the other half of every rename anyway.
+    state = _rename_state(repo_root, ref)
+    key = (repo_root, ref)
+    with _RENAME_MAPS_LOCK:
+        cached = _RENAME_MAPS.get(key)
+    if cached is not None and state is not None and cached[0] == state:
+        return cached[1]
+
     if ref == ":0:":
-        diff_args = ["diff", "-M", "--name-status", "--cached", "--", rel_path]
+        diff_args = ["diff", "-M", "--name-status", "-z", "--diff-filter=R", "--cached", "--"]
     else:
-        diff_args = ["diff", "-M", "--name-status", ref, "--", rel_path]
+        diff_args = ["diff", "-M", "--name-status", "-z", "--diff-filter=R", ref, "--"]
 
-    result = _run_git(repo_root, diff_args)
+    try:
+        result = _run_git(repo_root, diff_args)
+    except _GitOutputTooLarge:
+        return None
     if result.returncode != 0:
         return None
 
-    text = result.stdout.decode("utf-8", errors="replace")
-    for line in text.splitlines():
-        parts = line.split("\t")
-        if not parts:
-            continue
-        status = parts[0]
-        if status.startswith("R") and len(parts) >= 3:
-            old_name, new_name = parts[1], parts[2]
-            if new_name == rel_path:
-                return old_name
-            if old_name == rel_path:
-                return new_name
+    renames = {}
+    for status, old_name, new_name in _parse_name_status_z(result.stdout):
+        if status == "R":
+            renames.setdefault(new_name, old_name)
+            renames.setdefault(old_name, new_name)
 
-    return None
+    if state is not None:
+        with _RENAME_MAPS_LOCK:
+            _RENAME_MAPS[key] = (state, renames)
+    return renames
 
 
 def _ref_label(ref):
@@ -1017,49 +2348,270 @@ def _build_side_label(rel_path_input, resolved_path, ref):
     return f"{name}@{_ref_label(ref)}{missing_marker}"
 
 
-def _setup_git_diff_buffer(vim, lines, label, bare_name):
+def _setup_git_diff_buffer(vim, lines, label, bare_name, large=False):
     escaped_label = _vim_escape_filename(label)
     escaped_bare = _vim_escape_filename(bare_name)
 
-    vim.command(
-        "enew | "
-        "setlocal buftype=nofile bufhidden=wipe noswapfile | "
-        "file " + escaped_bare + " | "
-        "filetype detect | "
-        "file " + escaped_label
-    )
+    if large:
+        vim.command(
+            "enew | "
+            "setlocal buftype=nofile bufhidden=wipe noswapfile " + _large_buffer_options() + " | "
+            "file " + escaped_label
+        )
+        vim.current.buffer[:] = lines
+        vim.command("setlocal nomodifiable | diffthis")
+        _disable_diff_folding(vim)
+        return
+
+    filetype = _cached_filetype(bare_name)
+    if filetype is None:
+        vim.command(
+            "enew | "
+            "setlocal buftype=nofile bufhidden=wipe noswapfile | "
+            "file " + escaped_bare + " | "
+            "filetype detect | "
+            "file " + escaped_label
+        )
+        _remember_filetype(vim, bare_name)
+    else:
+        vim.command(
+            "enew | "
+            "setlocal buftype=nofile bufhidden=wipe noswapfile | "
+            "file " + escaped_label
+            + (" | setlocal filetype=" + filetype if filetype else "")
+        )
     vim.current.buffer[:] = lines
     vim.command("setlocal nomodifiable | diffthis")
 
 
-def _exec_show_git_diff(vim, args):
-    path = args.get("path")
-    if not isinstance(path, str) or not path:
-        return {"error": "path is required"}
+_FILETYPE_CACHE = collections.OrderedDict()
+_FILETYPE_CACHE_ENTRIES = 512
+
+
+def _reset_filetype_cache():
+    _FILETYPE_CACHE.clear()
+
+
+def _cached_filetype(bare_name):
+    # Detection runs before the lines are loaded and sees only the bare
+    # name, so the same name always detects the same filetype.
+    filetype = _FILETYPE_CACHE.get(bare_name)
+    if filetype is not None:
+        _FILETYPE_CACHE.move_to_end(bare_name)
+    return filetype
+
+
+def _remember_filetype(vim, bare_name):
+    filetype = vim.eval("&filetype")
+    if filetype and not _is_valid_filetype(filetype):
+        return
+    _FILETYPE_CACHE[bare_name] = filetype
+    while len(_FILETYPE_CACHE) > _FILETYPE_CACHE_ENTRIES:
+        _FILETYPE_CACHE.popitem(last=False)
 
-    error = _require_absolute_path(path, "path")
-    if error:
-        return error
 
+def _git_diff_refs(args):
     staged = bool(args.get("staged", False))
+    unstaged = bool(args.get("unstaged", False))
     ref_a_arg = args.get("ref_a")
     ref_b_arg = args.get("ref_b")
 
+    if staged and unstaged:
+        return None, None, {"error": "staged cannot be combined with unstaged"}
+
     if staged and (ref_a_arg is not None or ref_b_arg is not None):
-        return {"error": "staged cannot be combined with explicit ref_a or ref_b"}
+        return None, None, {"error": "staged cannot be combined with explicit ref_a or ref_b"}
+
+    if unstaged and (ref_a_arg is not None or ref_b_arg is not None):
+        return None, None, {"error": "unstaged cannot be combined with explicit ref_a or ref_b"}
 
     if staged:
         ref_a = "HEAD"
         ref_b = ":0:"
+    elif unstaged:
+        ref_a = ":0:"
+        ref_b = ""
     else:
         ref_a = ref_a_arg if ref_a_arg is not None else "HEAD"
         ref_b = ref_b_arg if ref_b_arg is not None else ""
 
     if not _is_ref_safe(ref_a):
-        return {"error": f"ref_a is not a valid revision: {ref_a}"}
+        return None, None, {"error": f"ref_a is not a valid revision: {ref_a}"}
 
     if not _is_ref_safe(ref_b):
-        return {"error": f"ref_b is not a valid revision: {ref_b}"}
+        return None, None, {"error": f"ref_b is not a valid revision: {ref_b}"}
+
+    return ref_a, ref_b, None
+
+
+def _git_text_lines(text):
+    lines = text.split("\n") if text else [""]
+    if text.endswith("\n") and len(lines) > 1:
+        lines = lines[:-1]
+    return lines
+
+
+def _load_git_diff_side(repo_root, ref, rel_path_input, resolved_path, side_name):
+    data = b""
+    oversized = None
+    if resolved_path is not None:
+        data, missing = _git_show(repo_root, ref, resolved_path)
+        if data is None:
+            # Too large to load, but a binary blob only needs its first
+            # bytes to be summarized.
+            oversized = _oversized_binary_blob(repo_root, ref, resolved_path)
+            if oversized is None:
+                return None, {"error": f"git output for {side_name} too large or git failed for {resolved_path}@{_ref_label(ref)}"}
+        elif missing:
+            resolved_path = None
+
+    label = _build_side_label(rel_path_input, resolved_path, ref)
+    bare = posixpath.basename(resolved_path if resolved_path is not None else rel_path_input)
+    if oversized is not None:
+        size, blob_id = oversized
+    elif data and _is_binary_blob(repo_root, resolved_path, data):
+        size, blob_id = len(data), _git_blob_id(data)
+    else:
+        return (_git_text_lines(data.decode("utf-8", errors="replace")), label, bare), None
+    label += " (binary)"
+    return (_binary_summary_lines(label, size, blob_id, "Blob"), label, bare), None
+
+
+def _git_blob_id(data):
+    # What git names the blob: the SHA-1 of a "blob <size>" header and the
+    # contents, the same id git rev-parse and git hash-object give.
+    digest = hashlib.sha1(b"blob %d\0" % len(data))
+    digest.update(data)
+    return digest.hexdigest()
+
+
+def _git_blob_info(repo_root, ref, rel_path):
+    # (blob id, size) without reading the blob.
+    if ref != ":0:":
+        try:
+            info = mcp_git_objects.path_info(repo_root, ref, rel_path)
+            return (info[0], info[2]) if info is not None and info[1] == "blob" else None
+        except mcp_git_objects.Unsupported:
+            pass
+    try:
+        info = mcp_git.object_info(repo_root, _git_spec(ref, rel_path))
+    except mcp_git.GitBatchError:
+        return None
+    return (info[0], info[2]) if info is not None and info[1] == "blob" else None
+
+
+def _git_blob_head(repo_root, blob_id):
+    try:
+        proc = subprocess.Popen(
+            ["git", "cat-file", "blob", blob_id],
+            cwd=repo_root,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+    except OSError:
+        return None
+    try:
+        head = proc.stdout.read(_BINARY_SNIFF_BYTES)
+    finally:
+        proc.kill()
+        proc.stdout.close()
+        proc.wait()
+    return head or None
+
+
+def _oversized_binary_blob(repo_root, ref, rel_path):
+    # (size, blob id) of a side over _MAX_GIT_OUTPUT_BYTES when it is
+    # binary, from its first _BINARY_SNIFF_BYTES; None otherwise.
+    if ref == "":
+        try:
+            with open(os.path.join(repo_root, rel_path), "rb") as f:
+                head = f.read(_BINARY_SNIFF_BYTES)
+                if not _is_binary_blob(repo_root, rel_path, head):
+                    return None
+                size = os.fstat(f.fileno()).st_size
+                digest = hashlib.sha1(b"blob %d\0" % size)
+                digest.update(head)
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+        except OSError:
+            return None
+        return size, digest.hexdigest()
+    info = _git_blob_info(repo_root, ref, rel_path)
+    if info is None:
+        return None
+    blob_id, size = info
+    head = _git_blob_head(repo_root, blob_id)
+    if head is None or not _is_binary_blob(repo_root, rel_path, head):
+        return None
+    return size, blob_id
+
+
+def _is_large_git_diff(vim, side_a, side_b):
+    return _is_large_diff(vim, _lines_size(side_a[0]), _lines_size(side_b[0]))
+
+
+def _fill_git_diff_tab(vim, side_a, side_b, large=False):
+    _enhance_diffopt(vim, large)
+    return _while_loading(vim, large, _fill_git_diff_windows, side_a, side_b, large)
+
+
+def _fill_git_diff_windows(vim, side_a, side_b, large):
+    _setup_git_diff_buffer(vim, *side_a, large)
+    number_a = vim.current.buffer.number
+    vim.command("vnew")
+    _setup_git_diff_buffer(vim, *side_b, large)
+    return [number_a, vim.current.buffer.number]
+
+
+def _with_lazyredraw(vim, func, *args):
+    prev_lazyredraw = vim.eval("&lazyredraw")
+    vim.command("set lazyredraw")
+
+    try:
+        return func(vim, *args)
+    finally:
+        if prev_lazyredraw == "0":
+            vim.command("set nolazyredraw")
+        else:
+            vim.command("set lazyredraw")
+
+
+def _open_git_diff_tab(vim, side_a, side_b, large=False):
+    vim.command("tabnew")
+    _fill_git_diff_tab(vim, side_a, side_b, large)
+
+
+def _reuse_git_diff_tab(vim, side_a, side_b, large=False):
+    numbers = _reusable_diff_buffers(vim)
+    if numbers is None:
+        vim.command("tabnew")
+        numbers = _fill_git_diff_tab(vim, side_a, side_b, large)
+        _mark_reusable_diff_tab(vim, numbers, [side_a[2], side_b[2]])
+        return "new"
+    _enhance_diffopt(vim, large)
+    _while_loading(vim, large, _refill_git_diff_tab, numbers, side_a, side_b, large)
+    return "reused"
+
+
+def _refill_git_diff_tab(vim, numbers, side_a, side_b, large):
+    for number, (lines, label, bare) in zip(numbers, (side_a, side_b)):
+        _refill_diff_buffer(vim, number, lines, label, bare=bare, large=large)
+    vim.command("diffupdate")
+
+
+def _exec_show_git_diff(vim, args):
+    path = args.get("path")
+    if not isinstance(path, str) or not path:
+        return {"error": "path is required"}
+
+    error = _require_absolute_path(path, "path")
+    if error:
+        return error
+
+    ref_a, ref_b, error = _git_diff_refs(args)
+    if error:
+        return error
 
     repo_root = _git_repo_root(path)
     if repo_root is None:
@@ -1073,60 +2625,617 @@ def _exec_show_git_diff(vim, args):
     path_a = _resolve_path_at_ref(repo_root, ref_a, rel_path_input)
     path_b = _resolve_path_at_ref(repo_root, ref_b, rel_path_input)
 
-    if path_a is None:
-        text_a, _ = "", True
-    else:
-        text_a, missing_a = _git_show(repo_root, ref_a, path_a)
-        if text_a is None:
-            return {"error": f"git output for ref_a too large or git failed for {path_a}@{_ref_label(ref_a)}"}
-        if missing_a:
-            path_a = None
-
-    if path_b is None:
-        text_b, _ = "", True
-    else:
-        text_b, missing_b = _git_show(repo_root, ref_b, path_b)
-        if text_b is None:
-            return {"error": f"git output for ref_b too large or git failed for {path_b}@{_ref_label(ref_b)}"}
-        if missing_b:
-            path_b = None
+    side_a, error = _load_git_diff_side(repo_root, ref_a, rel_path_input, path_a, "ref_a")
+    if error:
+        return error
 
-    label_a = _build_side_label(rel_path_input, path_a, ref_a)
-    label_b = _build_side_label(rel_path_input, path_b, ref_b)
+    side_b, error = _load_git_diff_side(repo_root, ref_b, rel_path_input, path_b, "ref_b")
+    if error:
+        return error
 
-    bare_a = posixpath.basename(path_a if path_a is not None else rel_path_input)
-    bare_b = posixpath.basename(path_b if path_b is not None else rel_path_input)
+    large = _is_large_git_diff(vim, side_a, side_b)
+    suffix = _LARGE_DIFF_SUFFIX if large else ""
+
+    if args.get("reuse_tab", False):
+        tab = _reuse_git_diff_tab(vim, side_a, side_b, large)
+        return f"Showing git diff in {tab} tab: {side_a[1]} vs {side_b[1]}{suffix}"
+
+    _open_git_diff_tab(vim, side_a, side_b, large)
+
+    return f"Showing git diff in new tab: {side_a[1]} vs {side_b[1]}{suffix}"
+
+
+# Sides of all_files tabs not entered yet, by diff id: [side_a, side_b,
+# bytes, opened].  Bounded by the bytes held, oldest dropped first; an
+# entry also goes when its tab is closed.
+_LAZY_DIFFS = collections.OrderedDict()
+_LAZY_DIFFS_LOCK = threading.Lock()
+_MAX_LAZY_DIFF_BYTES = 128 * 1024 * 1024
+_LAZY_DIFF_GONE = (
+    "This diff is no longer available: it was dropped to bound memory. "
+    "Run show_git_diff again to see it."
+)
+
+
+def _reset_lazy_diffs():
+    with _LAZY_DIFFS_LOCK:
+        _LAZY_DIFFS.clear()
+
+
+def _store_lazy_diff(side_a, side_b):
+    diff_id = uuid.uuid4().hex
+    size = _lines_size(side_a[0]) + _lines_size(side_b[0])
+    with _LAZY_DIFFS_LOCK:
+        _LAZY_DIFFS[diff_id] = [side_a, side_b, size, False]
+        total = sum(entry[2] for entry in _LAZY_DIFFS.values())
+        while total > _MAX_LAZY_DIFF_BYTES and len(_LAZY_DIFFS) > 1:
+            total -= _LAZY_DIFFS.popitem(last=False)[1][2]
+    return diff_id
+
+
+def _drop_lazy_diffs(diff_ids):
+    with _LAZY_DIFFS_LOCK:
+        for diff_id in diff_ids:
+            _LAZY_DIFFS.pop(diff_id, None)
+
+
+def drop_closed_lazy_diffs(vim):
+    # Called on TabClosed.  Entries whose tab has not been opened yet are
+    # kept: the worker stores them before Vim opens the tabs.
+    with _LAZY_DIFFS_LOCK:
+        if not any(entry[3] for entry in _LAZY_DIFFS.values()):
+            return
+    open_ids = set(vim.eval("map(range(1, tabpagenr('$')), \"gettabvar(v:val, 'mcp_diff_id', '')\")"))
+    with _LAZY_DIFFS_LOCK:
+        for diff_id in [d for d, entry in _LAZY_DIFFS.items() if entry[3] and d not in open_ids]:
+            del _LAZY_DIFFS[diff_id]
+
+
+def fill_lazy_diff_tab(vim):
+    diff_id = vim.eval("get(t:, 'mcp_diff_id', '')")
+    if not diff_id:
+        return
+    vim.command("unlet t:mcp_diff_id")
+    with _LAZY_DIFFS_LOCK:
+        entry = _LAZY_DIFFS.pop(diff_id, None)
+    if entry is None:
+        vim.command("setlocal modifiable")
+        vim.current.buffer[:] = [_LAZY_DIFF_GONE]
+        vim.command("setlocal nomodifiable")
+        return
+    sides = entry[:2]
+    _with_lazyredraw(vim, _fill_git_diff_tab, *sides, _is_large_git_diff(vim, *sides))
 
-    prev_lazyredraw = vim.eval("&lazyredraw")
-    vim.command("set lazyredraw")
 
-    try:
+def _open_lazy_git_diff_tabs(vim, diffs):
+    first_tab = int(vim.eval("tabpagenr()")) + 1
+    for diff in diffs:
         vim.command("tabnew")
-        _enhance_diffopt(vim)
+        vim.command(
+            "setlocal buftype=nofile bufhidden=wipe noswapfile | "
+            "file " + _vim_escape_filename(f"{diff['label']} (diff {diff['id'][:8]})")
+        )
+        vim.current.buffer[:] = [f"Diff of {diff['label']} is loaded when this tab is entered."]
+        vim.command("setlocal nomodifiable")
+        vim.command(f"let t:mcp_diff_id = '{diff['id']}'")
+        with _LAZY_DIFFS_LOCK:
+            if diff["id"] in _LAZY_DIFFS:
+                _LAZY_DIFFS[diff["id"]][3] = True
+    vim.command(f"tabnext {first_tab}")
+
+
+def _exec_open_lazy_git_diffs(vim, args):
+    diffs = args.get("diffs", [])
+    threshold = _large_diff_threshold(vim)
+    large = [d["id"] for d in diffs if threshold > 0 and max(d["sizes"]) > threshold]
+    _open_lazy_git_diff_tabs(vim, diffs)
+    fill_lazy_diff_tab(vim)
+    return {"large": large}
+
+
+def _git_diff_name_args(ref_a, ref_b):
+    if ref_b == "":
+        if ref_a == ":0:":
+            return ["diff"]
+        if ref_a == "":
+            return None
+        return ["diff", ref_a]
+    if ref_b == ":0:":
+        if ref_a in ("", ":0:"):
+            return None
+        return ["diff", "--cached", ref_a]
+    if ref_a in ("", ":0:"):
+        return None
+    return ["diff", ref_a, ref_b]
+
+
+def _parse_name_status_z(data):
+    tokens = data.decode("utf-8", errors="replace").split("\0")
+    changes = []
+    i = 0
+    while i < len(tokens) and tokens[i]:
+        status = tokens[i]
+        if status[0] in "RC" and i + 2 < len(tokens):
+            changes.append((status[0], tokens[i + 1], tokens[i + 2]))
+            i += 3
+        elif i + 1 < len(tokens):
+            changes.append((status[0], tokens[i + 1], tokens[i + 1]))
+            i += 2
+        else:
+            break
+    return changes
+
+
+def _git_changed_files(repo_root, ref_a, ref_b):
+    between = f"{_ref_label(ref_a)} and {_ref_label(ref_b)}"
+    diff_args = _git_diff_name_args(ref_a, ref_b)
+    if diff_args is None:
+        return None, {"error": (
+            f"Cannot list changes between {between}: ref_a must not come after ref_b "
+            "in the order commit, index, working tree"
+        )}
+    try:
+        result = _run_git(repo_root, diff_args[:1] + ["--name-status", "-z", "-M"] + diff_args[1:] + ["--"])
+    except _GitOutputTooLarge:
+        return None, {"error": f"git output too large listing changes between {between}"}
+    if result.returncode != 0:
+        for ref, side_name in ((ref_a, "ref_a"), (ref_b, "ref_b")):
+            if ref in ("", ":0:"):
+                continue
+            if _run_git(repo_root, ["rev-parse", "--verify", "--quiet", ref + "^{commit}"]).returncode != 0:
+                return None, {"error": f"{side_name} could not be resolved: {ref}"}
+        return None, {"error": f"Could not list changes between {between}"}
+    return _parse_name_status_z(result.stdout), None
+
+
+def _load_change_sides(repo_root, ref_a, ref_b, change):
+    status, old_path, new_path = change
+    path_a = None if status == "A" else old_path
+    path_b = None if status == "D" else new_path
+    side_a, error = _load_git_diff_side(repo_root, ref_a, old_path, path_a, "ref_a")
+    if error:
+        side_a = ([""], f"{old_path}@{_ref_label(ref_a)} (too large)", posixpath.basename(old_path))
+    side_b, error = _load_git_diff_side(repo_root, ref_b, new_path, path_b, "ref_b")
+    if error:
+        side_b = ([""], f"{new_path}@{_ref_label(ref_b)} (too large)", posixpath.basename(new_path))
+    return side_a, side_b
+
+
+def _run_show_git_diff(args):
+    view = args.get("view", "split")
+    if view not in _DIFF_VIEWS:
+        return {"error": f"Unknown view: {view}"}
+    if not args.get("all_files", False):
+        if view == "split":
+            return _submit_to_main_thread("show_git_diff", args)
+        sides, error = _load_git_sides(args)
+        if error:
+            return error
+        return _show_unified_sides(args, sides)
+
+    path = args.get("path")
+    if not isinstance(path, str) or not path:
+        return {"error": "path is required"}
 
-        lines_a = text_a.split("\n") if text_a else [""]
-        if text_a.endswith("\n") and len(lines_a) > 1:
-            lines_a = lines_a[:-1]
-        _setup_git_diff_buffer(vim, lines_a, label_a, bare_a)
+    error = _require_absolute_path(path, "path")
+    if error:
+        return error
 
-        vim.command("vnew")
+    ref_a, ref_b, error = _git_diff_refs(args)
+    if error:
+        return error
 
-        lines_b = text_b.split("\n") if text_b else [""]
-        if text_b.endswith("\n") and len(lines_b) > 1:
-            lines_b = lines_b[:-1]
-        _setup_git_diff_buffer(vim, lines_b, label_b, bare_b)
-    finally:
-        if prev_lazyredraw == "0":
-            vim.command("set nolazyredraw")
+    repo_root = _git_repo_root(path)
+    if repo_root is None:
+        return {"error": f"{path} is not inside a git repository"}
+
+    changes, error = _git_changed_files(repo_root, ref_a, ref_b)
+    if error:
+        return error
+    if not changes:
+        return f"No changes between {_ref_label(ref_a)} and {_ref_label(ref_b)}"
+
+    max_files = max(1, int(args.get("max_files", _DEFAULT_MAX_DIFF_FILES)))
+    shown = changes[:max_files]
+    pool = mcp_vim_bridge.worker_pool()
+    loaded = list(pool.map(lambda c: _load_change_sides(repo_root, ref_a, ref_b, c), shown))
+
+    if view == "unified":
+        files = [(side_a[1], side_b[1], side_a[0], side_b[0]) for side_a, side_b in loaded]
+        title = f"{_ref_label(ref_a)} vs {_ref_label(ref_b)}"
+        result = _show_unified_view(title, files, args)
+        if isinstance(result, dict) or len(changes) == len(shown):
+            return result
+        return result + f"\n{len(changes) - len(shown)} more changed files not shown (max_files={max_files})"
+
+    diffs = []
+    for change, (side_a, side_b) in zip(shown, loaded):
+        diffs.append({
+            "id": _store_lazy_diff(side_a, side_b),
+            "label": change[2] if change[1] == change[2] else f"{change[1]} -> {change[2]}",
+            "sizes": [_lines_size(side_a[0]), _lines_size(side_b[0])],
+        })
+
+    result = _submit_to_main_thread("_open_lazy_git_diffs", {"diffs": diffs})
+    if isinstance(result, dict) and "error" in result:
+        _drop_lazy_diffs(d["id"] for d in diffs)
+        return result
+    large = set(result.get("large", [])) if isinstance(result, dict) else set()
+
+    lines = [f"Showing git diff of {len(shown)} files in new tabs ({_ref_label(ref_a)} vs {_ref_label(ref_b)}):"]
+    lines.extend(
+        f"  {status} {d['label']}{_LARGE_DIFF_SUFFIX if d['id'] in large else ''}"
+        for (status, _, _), d in zip(shown, diffs)
+    )
+    if len(changes) > len(shown):
+        lines.append(f"{len(changes) - len(shown)} more changed files not shown (max_files={max_files})")
+    return "\n".join(lines)
+
+
+_SEARCH_FILES_CHUNK = 2000
+
+
+def _run_search_files(args):
+    pattern = args.get("pattern")
+    if not isinstance(pattern, str) or not pattern:
+        return {"error": "pattern is required"}
+    path = args.get("path", "")
+    error = _require_absolute_path(path, "path")
+    if error:
+        return error
+    if not os.path.isdir(path):
+        return {"error": f"{path} is not a directory"}
+    try:
+        regex = _compile_pattern(
+            b"(?m)" + pattern.encode("utf-8"),
+            bool(args.get("ignore_case", False)),
+        )
+    except re.error as e:
+        return {"error": f"Invalid pattern: {e}"}
+    try:
+        max_results = max(1, int(args.get("max_results", 1000)))
+    except (TypeError, ValueError):
+        return {"error": "max_results must be an integer"}
+    use_quickfix = args.get("quickfix", True)
+    title = f"search_files: {pattern}"
+    sent = {"count": 0, "error": None, "id": None}
+
+    def send_chunk(entries):
+        if sent["error"] is not None:
+            return
+        chunk = {
+            "items": _build_setqflist_items(entries),
+            "action": "a" if sent["count"] else "r",
+            "title": "" if sent["count"] else title,
+        }
+        if sent["id"] is not None:
+            chunk["id"] = sent["id"]
+        result = _submit_to_main_thread("_set_quickfix_items", chunk)
+        if isinstance(result, dict) and "error" in result:
+            sent["error"] = result
         else:
-            vim.command("set lazyredraw")
+            sent["id"] = result["id"]
+        sent["count"] += len(entries)
+
+    matches, files_searched, truncated = mcp_file_search.search_files(
+        path,
+        regex,
+        max_results,
+        on_chunk=send_chunk if use_quickfix else None,
+        chunk_size=_SEARCH_FILES_CHUNK,
+    )
+
+    summary = {
+        "files_searched": files_searched,
+        "match_count": len(matches),
+        "truncated": truncated,
+    }
+    if not use_quickfix:
+        summary["matches"] = matches
+        return json.dumps(summary, indent=2)
+
+    if sent["error"] is not None:
+        return sent["error"]
+    if sent["count"] == 0 or args.get("open", False):
+        chunk = {
+            "items": [],
+            "action": "a" if sent["count"] else "r",
+            "title": "" if sent["count"] else title,
+            "open": args.get("open", False),
+        }
+        if sent["id"] is not None:
+            chunk["id"] = sent["id"]
+        result = _submit_to_main_thread("_set_quickfix_items", chunk)
+        if isinstance(result, dict) and "error" in result:
+            return result
+    return json.dumps(summary, indent=2)
+
+
+def _exec_buffer_lines(vim, args):
+    numbers = [int(n) for n in args.get("buffers", [])]
+    infos = vim.eval(
+        "map(" + json.dumps(numbers) + ", "
+        "'[bufloaded(v:val), bufname(v:val), getbufvar(v:val, \"changedtick\")]')"
+    )
+    with _BUFFER_SNAPSHOT_LOCK:
+        previous = {n: _BUFFER_SNAPSHOTS.get(n) for n in numbers}
+    result = {}
+    for number, (loaded, name, tick) in zip(numbers, infos):
+        if loaded in ("0", 0):
+            return {"error": f"Buffer {number} is not loaded"}
+        tick = int(tick)
+        snap = previous.get(number)
+        if snap is None or snap["changedtick"] != tick:
+            snap = {
+                "number": number,
+                "name": name,
+                "changedtick": tick,
+                "lines": vim.buffers[number][:],
+            }
+            with _BUFFER_SNAPSHOT_LOCK:
+                _BUFFER_SNAPSHOTS[number] = snap
+        result[number] = {"name": name or f"buffer {number}", "lines": snap["lines"]}
+    return result
+
+
+_DIFF_CACHE = collections.OrderedDict()
+_DIFF_CACHE_LOCK = threading.Lock()
+_DIFF_CACHE_ENTRIES = 64
+
+
+def _reset_diff_cache():
+    with _DIFF_CACHE_LOCK:
+        _DIFF_CACHE.clear()
+
+
+def _lines_digest(lines):
+    digest = hashlib.sha1()
+    for line in lines:
+        digest.update(line.encode("utf-8", errors="surrogatepass"))
+        digest.update(b"\n")
+    return digest.digest()
+
+
+def _cached_opcodes(lines_a, lines_b):
+    key = (_lines_digest(lines_a), _lines_digest(lines_b))
+    with _DIFF_CACHE_LOCK:
+        codes = _DIFF_CACHE.get(key)
+        if codes is not None:
+            _DIFF_CACHE.move_to_end(key)
+            return codes
+    codes = mcp_diff.opcodes(lines_a, lines_b)
+    with _DIFF_CACHE_LOCK:
+        _DIFF_CACHE[key] = codes
+        while len(_DIFF_CACHE) > _DIFF_CACHE_ENTRIES:
+            _DIFF_CACHE.popitem(last=False)
+    return codes
 
-    return f"Showing git diff in new tab: {label_a} vs {label_b}"
+
+def _load_file_side(path):
+    try:
+        with open(path, "rb") as f:
+            data = f.read(_MAX_GIT_OUTPUT_BYTES + 1)
+    except OSError as e:
+        return None, {"error": f"Cannot read {path}: {e.strerror or e}"}
+    # Sniffed before the size check: a binary file of any size has a
+    # summary.
+    if _looks_binary(data):
+        summary = _binary_file_summary(path)
+        if summary is not None:
+            return summary, None
+    if len(data) > _MAX_GIT_OUTPUT_BYTES:
+        return None, {"error": f"{path} is too large to diff"}
+    return _git_text_lines(data.decode("utf-8", errors="replace")), None
+
+
+def _load_git_sides(args):
+    path = args.get("path")
+    error = _require_absolute_path(path, "path")
+    if error:
+        return None, error
+    ref_a, ref_b, error = _git_diff_refs(args)
+    if error:
+        return None, error
+    repo_root = _git_repo_root(path)
+    if repo_root is None:
+        return None, {"error": f"{path} is not inside a git repository"}
+    rel_path = os.path.relpath(path, repo_root).replace("\\", "/")
+    if rel_path.startswith("../"):
+        return None, {"error": f"{path} is not inside repo {repo_root}"}
+
+    def load(ref, side_name):
+        resolved = _resolve_path_at_ref(repo_root, ref, rel_path)
+        return _load_git_diff_side(repo_root, ref, rel_path, resolved, side_name)
+
+    pool = mcp_vim_bridge.worker_pool()
+    future_a = pool.submit(load, ref_a, "ref_a")
+    side_b, error_b = load(ref_b, "ref_b")
+    side_a, error_a = future_a.result()
+    if error_a or error_b:
+        return None, error_a or error_b
+    return [(side_a[0], side_a[1]), (side_b[0], side_b[1])], None
+
+
+def _load_compute_diff_sides(args):
+    if args.get("path") is not None:
+        for side in ("a", "b"):
+            for kind in ("content", "file", "buffer"):
+                if args.get(f"{kind}_{side}") is not None:
+                    return None, {"error": f"path cannot be combined with {kind}_{side}"}
+        return _load_git_sides(args)
+
+    sides = [None, None]
+    files = {}
+    buffers = {}
+    for index, side in enumerate(("a", "b")):
+        if args.get(f"content_{side}") is not None:
+            sides[index] = (_git_text_lines(args[f"content_{side}"]), side)
+        elif args.get(f"file_{side}") is not None:
+            error = _require_absolute_path(args[f"file_{side}"], f"file_{side}")
+            if error:
+                return None, error
+            files[index] = args[f"file_{side}"]
+        elif args.get(f"buffer_{side}") is not None:
+            buffers[index] = int(args[f"buffer_{side}"])
+        else:
+            return None, {"error": f"Provide content_{side}, file_{side} or buffer_{side}, or path for a git diff"}
+
+    if buffers:
+        # Only buffer sides need Vim; files are read here.
+        result = _submit_to_main_thread("_buffer_lines", {"buffers": sorted(set(buffers.values()))})
+        if isinstance(result, dict) and "error" in result:
+            return None, result
+        for index, number in buffers.items():
+            entry = result.get(number) or result.get(str(number))
+            sides[index] = (entry["lines"], entry["name"])
+
+    for index, path in files.items():
+        lines, error = _load_file_side(path)
+        if error:
+            return None, error
+        sides[index] = (lines, path)
+    return sides, None
+
+
+def _run_compute_diff(args):
+    diff_format = args.get("format", "unified")
+    if diff_format not in ("unified", "hunks"):
+        return {"error": f"Unknown format: {diff_format}"}
+    context = max(0, int(args.get("context", 3)))
+
+    sides, error = _load_compute_diff_sides(args)
+    if error:
+        return error
+    (lines_a, label_a), (lines_b, label_b) = sides
+    label_a = args.get("label_a") or label_a
+    label_b = args.get("label_b") or label_b
+
+    codes = _cached_opcodes(lines_a, lines_b)
+    hunk_list = mcp_diff.hunks(lines_a, lines_b, codes, context)
+
+    if diff_format == "hunks":
+        return json.dumps({"label_a": label_a, "label_b": label_b, "hunks": hunk_list}, indent=2)
+    if not hunk_list:
+        return f"No differences between {label_a} and {label_b}"
+    return mcp_diff.unified(label_a, label_b, hunk_list)
+
+
+_DIFF_VIEWS = ("split", "unified")
+
+
+def _run_show_diff(args):
+    view = args.get("view", "split")
+    if view not in _DIFF_VIEWS:
+        return {"error": f"Unknown view: {view}"}
+    has_files = args.get("file_a") is not None and args.get("file_b") is not None
+    if view == "split":
+        args = {k: v for k, v in args.items() if k != "file_sides"}
+        if has_files and all(isinstance(args[k], str) and os.path.isabs(args[k]) for k in ("file_a", "file_b")):
+            file_sides = _binary_file_sides(args["file_a"], args["file_b"])
+            if file_sides is not None:
+                args["file_sides"] = file_sides
+        return _submit_to_main_thread("show_diff", args)
+    has_content = args.get("content_a") is not None and args.get("content_b") is not None
+    if not has_files and not has_content:
+        return {
+            "error": (
+                "Provide either file_a and file_b (file mode) "
+                "or content_a and content_b (content mode)."
+            )
+        }
+    # Same precedence as the split view: files win over content.
+    keys = ("file_a", "file_b") if has_files else ("content_a", "content_b")
+    sides, error = _load_compute_diff_sides({k: args[k] for k in keys})
+    if error:
+        return error
+    return _show_unified_sides(args, sides)
+
+
+def _show_unified_sides(args, sides):
+    (lines_a, label_a), (lines_b, label_b) = sides
+    label_a = args.get("label_a") or label_a
+    label_b = args.get("label_b") or label_b
+    return _show_unified_view(f"{label_a} vs {label_b}", [(label_a, label_b, lines_a, lines_b)], args)
+
+
+def _unified_view_lines(files, context):
+    lines = []
+    hunk_entries = []
+    for label_a, label_b, lines_a, lines_b in files:
+        hunk_list = mcp_diff.hunks(lines_a, lines_b, _cached_opcodes(lines_a, lines_b), context)
+        if not hunk_list:
+            continue
+        lines.append(f"--- {label_a}")
+        lines.append(f"+++ {label_b}")
+        for hunk in hunk_list:
+            header = mcp_diff.hunk_header(hunk)
+            lines.append(header)
+            hunk_entries.append({"lnum": len(lines), "text": f"{label_b} {header}"})
+            lines.extend(hunk["lines"])
+    return lines, hunk_entries
+
+
+def _show_unified_view(title, files, args):
+    context = max(0, int(args.get("context", 3)))
+    lines, hunk_entries = _unified_view_lines(files, context)
+    if not hunk_entries:
+        return f"No differences between {title}"
+    result = _submit_to_main_thread("_show_unified_diff", {
+        "title": title,
+        "lines": lines,
+        "hunks": hunk_entries,
+    })
+    if isinstance(result, dict) and "error" in result:
+        return result
+    return f"Showing unified diff in new tab: {title} ({len(hunk_entries)} hunks in the quickfix list)"
+
+
+def _exec_show_unified_diff(vim, args):
+    vim.command("tabnew")
+    # The buffer is hidden rather than wiped when its tab is closed, so the
+    # quickfix entries keep pointing at it.
+    vim.command(
+        "setlocal buftype=nofile bufhidden=hide nobuflisted noswapfile | "
+        "file " + _vim_escape_filename(f"{args['title']} (diff {uuid.uuid4().hex[:8]})")
+    )
+    vim.current.buffer[:] = args["lines"]
+    vim.command("setlocal filetype=diff nomodifiable")
+    number = vim.current.buffer.number
+    items = [{"bufnr": number, "lnum": h["lnum"], "text": h["text"]} for h in args["hunks"]]
+    _set_list(vim, "setqflist", [], items, "r", "diff: " + args["title"])
+    return f"Showing unified diff of {args['title']}"
+
+
+_WORKER_TOOLS = {
+    "compute_diff": _run_compute_diff,
+    "set_quickfix_list": _run_set_quickfix_list,
+    "show_diff": _run_show_diff,
+    "show_git_diff": _run_show_git_diff,
+    "search_buffers": _run_search_buffers,
+    "search_files": _run_search_files,
+}
+
+
+def _submit_to_main_thread(func_name, args):
+    request_id = str(uuid.uuid4())
+    return mcp_vim_bridge.submit_request(request_id, func_name, args)
 
 
 def call_tool(name, arguments):
     if name not in TOOL_DEFINITIONS:
         return {"error": f"Unknown tool: {name}"}
-    request_id = str(uuid.uuid4())
-    result = mcp_vim_bridge.submit_request(request_id, name, arguments)
-    return result
+    start = time.monotonic()
+    failed = True
+    try:
+        worker = _WORKER_TOOLS.get(name)
+        if worker is not None:
+            result = worker(arguments)
+        else:
+            result = _submit_to_main_thread(name, arguments)
+        failed = isinstance(result, dict) and "error" in result
+        return result
+    finally:
+        mcp_metrics.inc("mcp_tool_calls_total", tool=name)
+        if failed:
+            mcp_metrics.inc("mcp_tool_errors_total", tool=name)
+        mcp_metrics.observe("mcp_tool_duration_seconds", time.monotonic() - start, tool=name)
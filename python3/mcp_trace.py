@@ -0,0 +1,76 @@
+import json
+import os
+import threading
+
+
+META_KEY = "vim-mcp-server/timing"
+
+_local = threading.local()
+_state = {"enabled": False, "log_path": None}
+_log_lock = threading.Lock()
+
+
+def enable(log_path=None):
+    _state["enabled"] = True
+    _state["log_path"] = log_path or None
+    return status()
+
+
+def disable():
+    _state["enabled"] = False
+    _state["log_path"] = None
+    return status()
+
+
+def is_enabled():
+    return _state["enabled"]
+
+
+def status():
+    if not _state["enabled"]:
+        return "MCP request tracing is off"
+    if _state["log_path"]:
+        return f"MCP request tracing is on, logging to {_state['log_path']}"
+    return "MCP request tracing is on"
+
+
+def begin(wanted=False):
+    # Traces live on the HTTP thread that handles the request; phases
+    # measured further down (the bridge) find it through the thread-local.
+    trace = None
+    if _state["enabled"] or wanted:
+        trace = {"phases": {}}
+    _local.trace = trace
+    return trace
+
+
+def end():
+    _local.trace = None
+
+
+def current():
+    return getattr(_local, "trace", None)
+
+
+def add(phase, seconds):
+    trace = current()
+    if trace is not None:
+        trace["phases"][phase] = trace["phases"].get(phase, 0.0) + seconds
+
+
+def breakdown(trace):
+    return {phase: round(seconds * 1000, 3) for phase, seconds in trace["phases"].items()}
+
+
+def write(record):
+    path = _state["log_path"]
+    if not _state["enabled"] or not path:
+        return
+    line = json.dumps(record, sort_keys=True) + "\n"
+    with _log_lock:
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line)
+        except OSError:
+            pass
@@ -1,29 +1,76 @@
+import os
 import queue
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import mcp_metrics
+import mcp_trace
 
 
 _request_queue = queue.Queue()
 _result_slots = {}
 _result_lock = threading.Lock()
 _result_events = {}
+# request id -> [func_name, queued, drained, started, posted]
+_request_times = {}
+_last_tick = {"time": None, "cursor": None}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def worker_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=min(32, (os.cpu_count() or 1) + 4),
+                thread_name_prefix="mcp-worker",
+            )
+        return _pool
 
 
 def submit_request(request_id, func_name, args):
     event = threading.Event()
     with _result_lock:
         _result_events[request_id] = event
+        _request_times[request_id] = [func_name, time.monotonic(), None, None, None]
     _request_queue.put((request_id, func_name, args))
     event.wait(timeout=30)
+    woken = time.monotonic()
     with _result_lock:
         _result_events.pop(request_id, None)
         result = _result_slots.pop(request_id, None)
+        times = _request_times.pop(request_id, None)
     if result is None:
+        mcp_metrics.inc("mcp_main_thread_timeouts_total", function=func_name)
         return {"error": "Timeout waiting for Vim to process request"}
+    if times is not None and times[4] is not None:
+        _record_times(times, woken)
     return result
 
 
+def _record_times(times, woken):
+    func_name, queued, drained, started, posted = times
+    mcp_metrics.observe("mcp_main_thread_queue_wait_seconds", started - queued, function=func_name)
+    mcp_metrics.observe("mcp_main_thread_execution_seconds", posted - started, function=func_name)
+    mcp_trace.add("tick_wait", drained - queued)
+    mcp_trace.add("queue_wait", started - drained)
+    mcp_trace.add("execute", posted - started)
+    mcp_trace.add("wakeup", woken - posted)
+
+
 def post_result(request_id, result):
+    now = time.monotonic()
     with _result_lock:
+        times = _request_times.get(request_id)
+        if times is not None and times[2] is not None:
+            # The timer runs a drained batch one request at a time, so a
+            # request starts when the previous one of its batch was posted.
+            times[3] = max(times[2], _last_tick["cursor"] or times[2])
+            times[4] = now
+        _last_tick["cursor"] = now
         _result_slots[request_id] = result
         event = _result_events.get(request_id)
         if event:
@@ -31,6 +78,9 @@ def post_result(request_id, result):
 
 
 def drain_requests():
+    now = time.monotonic()
+    _last_tick["time"] = now
+    _last_tick["cursor"] = now
     requests = []
     while True:
         try:
@@ -38,4 +88,34 @@ def drain_requests():
             requests.append(req)
         except queue.Empty:
             break
+    if requests:
+        with _result_lock:
+            for request_id, _, _ in requests:
+                times = _request_times.get(request_id)
+                if times is not None:
+                    times[2] = now
     return requests
+
+
+def _orphaned_results():
+    # Results posted after their caller timed out are never collected.
+    with _result_lock:
+        return sum(1 for request_id in _result_slots if request_id not in _result_events)
+
+
+def _last_tick_age():
+    last = _last_tick["time"]
+    if last is None:
+        return None
+    return time.monotonic() - last
+
+
+mcp_metrics.register_gauge(
+    "mcp_request_queue_depth", "Requests waiting for the Vim timer.", _request_queue.qsize,
+)
+mcp_metrics.register_gauge(
+    "mcp_orphaned_results", "Results posted after their caller stopped waiting.", _orphaned_results,
+)
+mcp_metrics.register_gauge(
+    "mcp_last_tick_age_seconds", "Seconds since the Vim timer last drained the queue.", _last_tick_age,
+)
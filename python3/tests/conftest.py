@@ -5,11 +5,69 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
 import pytest
 
+import mcp_git
+import mcp_git_objects
+import mcp_metrics
+import mcp_recorder
 import mcp_tools
+import mcp_trace
+
+
+class _MainThread:
+    # Stands in for Vim's main thread: records each step a worker tool
+    # submits and answers it with `reply` (a value, or a function of the
+    # step's name and args), or runs it against `vim` when that is set.
+    def __init__(self):
+        self.calls = []
+        self.reply = "ok"
+        self.vim = None
+
+    def __call__(self, func_name, args):
+        self.calls.append((func_name, args))
+        if self.vim is not None:
+            return mcp_tools.execute_on_main_thread(self.vim, func_name, args)
+        if callable(self.reply):
+            return self.reply(func_name, args)
+        return self.reply
+
+
+@pytest.fixture
+def main_thread(monkeypatch):
+    fake = _MainThread()
+    monkeypatch.setattr(mcp_tools, "_submit_to_main_thread", fake)
+    return fake
 
 
 @pytest.fixture(autouse=True)
 def _reset_module_caches():
     mcp_tools._reset_diffopt_patch_cache()
+    mcp_tools._reset_line_index_cache()
+    mcp_tools._reset_buffer_snapshots()
+    mcp_tools._reset_bufname_cache()
+    mcp_tools._reset_message_ring()
+    mcp_tools._reset_lazy_diffs()
+    mcp_tools._reset_rename_maps()
+    mcp_tools._reset_diff_cache()
+    mcp_tools._reset_filetype_cache()
+    mcp_git.reset_repo_root_cache()
+    mcp_metrics.reset()
+    mcp_trace.disable()
+    mcp_trace.end()
+    mcp_recorder.stop()
+    mcp_git_objects.reset_cache()
     yield
+    mcp_git.close_all()
+    mcp_git_objects.reset_cache()
     mcp_tools._reset_diffopt_patch_cache()
+    mcp_tools._reset_line_index_cache()
+    mcp_tools._reset_buffer_snapshots()
+    mcp_tools._reset_bufname_cache()
+    mcp_tools._reset_message_ring()
+    mcp_tools._reset_lazy_diffs()
+    mcp_tools._reset_rename_maps()
+    mcp_tools._reset_diff_cache()
+    mcp_tools._reset_filetype_cache()
+    mcp_metrics.reset()
+    mcp_trace.disable()
+    mcp_trace.end()
+    mcp_recorder.stop()
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from bench import load
+
+
+class TestLoad:
+    def test_clients_get_answers_through_the_server(self):
+        report = load.run(clients=2, duration=0.5, tick=0.005, scale=0.001)
+        overall = report["overall"]
+        assert overall["requests"] > 0
+        assert overall["errors"] == 0
+        assert overall["p50_ms"] <= overall["p95_ms"] <= overall["p99_ms"] <= overall["max_ms"]
+        assert sum(s["requests"] for s in report["tools"].values()) == overall["requests"]
+
+    def test_main_writes_json(self, tmp_path):
+        output = tmp_path / "load.json"
+        argv = ["--clients", "1", "--duration", "0.2", "--tick", "0.005", "--scale", "0.001",
+                "--mix", "get_cursor", "--output", str(output)]
+        assert load.main(argv) == 0
+        report = json.loads(output.read_text())
+        assert list(report["tools"]) == ["get_cursor"]
+
+
+class TestMix:
+    def test_parse(self):
+        assert load.parse_mix("get_buffer=3,get_cursor") == {"get_buffer": 3.0, "get_cursor": 1.0}
+
+    def test_every_default_tool_has_arguments(self):
+        assert load.parse_mix(",".join(load.DEFAULT_MIX)) == dict.fromkeys(load.DEFAULT_MIX, 1.0)
+
+    @pytest.mark.parametrize("text", ["no_such_tool=1", "get_cursor=-1", "get_cursor=0"])
+    def test_rejects(self, text):
+        with pytest.raises(ValueError):
+            load.parse_mix(text)
+
+
+class TestPercentile:
+    def test_nearest_rank(self):
+        values = list(range(1, 101))
+        assert load.percentile(values, 50) == 50
+        assert load.percentile(values, 99) == 99
+        assert load.percentile([7], 95) == 7
+        assert load.percentile([], 50) is None
@@ -0,0 +1,65 @@
+import json
+
+from bench import replay
+
+
+def _entry(time, method, params=None, id=None, duration_ms=5.0):
+    entry = {"time": time, "method": method, "id": id, "duration_ms": duration_ms, "error": False}
+    if params is not None:
+        entry["params"] = params
+    return entry
+
+
+def _call(time, id, name, **arguments):
+    return _entry(time, "tools/call", {"name": name, "arguments": arguments}, id)
+
+
+def _trace():
+    return [
+        _entry(100.0, "initialize", {}, 1),
+        _entry(100.01, "notifications/initialized"),
+        _call(100.02, 2, "get_buffer", buffer_id=3, start_line=1, end_line=50),
+        _call(100.03, 3, "get_buffer", buffer_path="/home/me/project/app.py"),
+        _call(100.04, 4, "open_file", path="/home/me/project/lib/util.py"),
+        _call(100.05, 5, "search_files", pattern="rows", path="/home/me/project/src", max_results=10),
+        _call(100.06, 6, "compute_diff", path="/home/me/project/app.py", format="hunks"),
+        _call(100.07, 7, "compute_diff", buffer_a=1, buffer_b=3, format="hunks"),
+        _call(100.08, 8, "set_cursor", line=20, column=1),
+        _call(100.09, 9, "get_quickfix_list", offset=10, limit=5),
+        _call(100.10, 10, "list_buffers"),
+    ]
+
+
+class TestReplay:
+    def test_recorded_references_resolve_against_stand_ins(self):
+        report = replay.replay(_trace(), speed=0, tick=0.002, lines=100, quickfix_entries=50)
+        assert report["requests"] == 11
+        assert report["new_errors"] == 0
+        assert report["overall"]["replayed"]["requests"] == 11
+        assert report["tools"]["get_buffer"]["replayed"]["requests"] == 2
+        assert report["tools"]["initialize"]["recorded"]["p50_ms"] == 5.0
+
+    def test_speed_scales_the_recorded_gaps(self):
+        trace = [_call(50.0, 1, "get_cursor"), _call(51.0, 2, "get_cursor")]
+        report = replay.replay(trace, speed=10, tick=0.002, lines=10, quickfix_entries=0)
+        assert report["new_errors"] == 0
+        assert 0.1 <= report["duration_s"] < 0.8
+        assert report["recorded_duration_s"] == 1.005
+
+    def test_failures_that_were_recorded_are_not_new(self):
+        trace = [dict(_call(1.0, 1, "get_buffer", buffer_path="/gone.py", start_line=0), error=True),
+                 _call(1.1, 2, "no_such_tool")]
+        report = replay.replay(trace, speed=0, tick=0.002, lines=10, quickfix_entries=0)
+        assert report["overall"]["replayed"]["errors"] == 1
+        assert report["new_errors"] == 1
+
+
+class TestMain:
+    def test_reads_the_trace_and_writes_json(self, tmp_path):
+        trace = tmp_path / "record.jsonl"
+        trace.write_text("".join(json.dumps(e) + "\n" for e in reversed(_trace()[:3])))
+        output = tmp_path / "replay.json"
+        argv = [str(trace), "--speed", "0", "--tick", "0.002", "--lines", "10", "--output", str(output)]
+        assert replay.main(argv) == 0
+        report = json.loads(output.read_text())
+        assert set(report["tools"]) == {"initialize", "notifications/initialized", "get_buffer"}
@@ -0,0 +1,36 @@
+import json
+
+import mcp_tools
+from bench import tools
+
+
+class TestScenarios:
+    def test_every_tool_has_a_scenario(self):
+        assert set(mcp_tools.TOOL_DEFINITIONS) <= {tool for tool, _, _ in tools.SCENARIOS}
+
+    def test_all_scenarios_run_at_small_scale(self):
+        results = tools.run(scale=0.001, repeat=1)
+        assert len(results) == len(tools.SCENARIOS)
+        errors = {name: r["error"] for name, r in results.items() if "error" in r}
+        assert errors == {}
+        result = results["get_buffer: 100k lines"]
+        assert result["runs"] == 1
+        assert result["min_ms"] <= result["median_ms"] <= result["max_ms"]
+        assert result["result_bytes"] > 0
+
+
+class TestReport:
+    def test_main_writes_json(self, tmp_path):
+        output = tmp_path / "out.json"
+        assert tools.main(["--scale", "0.001", "--repeat", "1", "--only", "get_cursor", "--output", str(output)]) == 0
+        report = json.loads(output.read_text())
+        assert report["scale"] == 0.001
+        assert list(report["results"]) == ["get_cursor: 100k lines"]
+
+    def test_compare_flags_regressions(self):
+        old = {"results": {"a": {"median_ms": 10.0}, "b": {"median_ms": 10.0}, "c": {"error": "x"}}}
+        new = {"results": {"a": {"median_ms": 20.0}, "b": {"median_ms": 5.0}, "c": {"median_ms": 1.0}}}
+        lines, regressions = tools.compare(old, new, 1.25)
+        assert regressions == ["a"]
+        assert len(lines) == 2
+        assert lines[1].endswith("faster")
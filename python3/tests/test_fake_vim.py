@@ -0,0 +1,151 @@
+import os
+
+import pytest
+
+import mcp_tools
+from bench.fake_vim import FakeVim, error, inline
+
+
+class TestEval:
+    def test_numbers_come_back_as_strings(self):
+        vim = FakeVim()
+        assert vim.eval("win_getid()") == "1000"
+        assert vim.eval("[&lazyredraw, &eventignore, win_getid(), get(g:, 'mcp_server_ignore_events', {})]") == [
+            "0", "", "1000", {},
+        ]
+
+    def test_unknown_expression_raises(self):
+        with pytest.raises(error):
+            FakeVim().eval("strftime('%Y')")
+
+    def test_fnameescape(self):
+        assert FakeVim().eval("fnameescape('a b''c')") == "a\\ b\\'c"
+
+
+class TestBuffers:
+    def test_changes_bump_changedtick_and_modified(self):
+        vim = FakeVim()
+        buf = vim.add_buffer("/tmp/a.txt", ["one", "two"])
+        buf[0:1] = ["uno", "eins"]
+        del buf[:]
+        assert buf[:] == [""]
+        assert vim.eval(f"getbufvar({buf.number}, 'changedtick')") == "3"
+        assert vim.eval(f"getbufvar({buf.number}, '&modified')") == "1"
+
+    def test_nomodifiable_buffer_rejects_changes(self):
+        vim = FakeVim()
+        vim.command("setlocal nomodifiable")
+        with pytest.raises(error):
+            vim.current.buffer[:] = ["x"]
+
+    def test_edit_refuses_to_abandon_modified_buffer(self, tmp_path):
+        vim = FakeVim()
+        vim.current.buffer[:] = ["changed"]
+        with pytest.raises(error, match="E37"):
+            vim.command(f"edit {tmp_path / 'other.txt'}")
+
+    def test_scratch_buffers_are_wiped_when_left(self):
+        vim = FakeVim()
+        vim.command("tabnew")
+        vim.command("enew | setlocal buftype=nofile bufhidden=wipe | file scratch")
+        scratch = vim.current.buffer.number
+        vim.command("enew")
+        assert scratch not in [b.number for b in vim.buffers]
+
+
+class TestCommands:
+    def test_file_refuses_a_name_another_buffer_has(self):
+        vim = FakeVim()
+        vim.add_buffer("/tmp/taken.py", ["x"], listed=False)
+        with pytest.raises(error, match="E95"):
+            vim.command("file /tmp/taken.py")
+        vim.command("file /tmp/free.py")
+        vim.command("file /tmp/free.py")
+        assert vim.current.buffer.name == "/tmp/free.py"
+
+    def test_pipes_and_if(self):
+        vim = FakeVim()
+        vim.command("let w:flag = 1 | if get(w:, 'flag', 0) | setlocal foldmethod=manual | unlet w:flag | endif")
+        vim.command("if get(w:, 'flag', 0) | setlocal foldmethod=diff | endif")
+        assert vim.eval("&foldmethod") == "manual"
+        assert vim.current.window.vars == {}
+
+    def test_unknown_command_raises_unless_silent(self):
+        vim = FakeVim()
+        with pytest.raises(error, match="E492"):
+            vim.command("frobnicate")
+        vim.command("silent! frobnicate")
+
+    def test_tabs_and_windows(self):
+        vim = FakeVim()
+        vim.command("tabnew")
+        first = vim.current.buffer.number
+        vim.command("vnew")
+        assert vim.eval("tabpagenr()") == "2"
+        assert vim.eval(f"bufwinnr({first})") == "2"
+        vim.command(f"execute bufwinnr({first}) . 'wincmd w'")
+        assert vim.current.buffer.number == first
+
+    def test_popup_write_keeps_the_current_buffer(self, tmp_path):
+        vim = FakeVim()
+        path = str(tmp_path / "hidden.txt")
+        hidden = vim.add_buffer(path, ["text"])
+        current = vim.current.buffer
+        popup = vim.eval(f"popup_create({hidden.number}, {{'hidden': 1}})")
+        vim.command(f"call win_execute({popup}, 'write')")
+        vim.command(f"call popup_close({popup})")
+        assert vim.current.buffer is current
+        assert len(vim.current.tabpage.windows) == 1
+        with open(path) as f:
+            assert f.read() == "text\n"
+
+
+class TestQuickfix:
+    def test_filenames_become_buffers(self):
+        vim = FakeVim()
+        vim.Function("setqflist")([], "r", {"items": [{"filename": "/tmp/x.py", "lnum": 3, "text": "t"}], "title": "T"})
+        info = vim.Function("getqflist")({"title": 1, "size": 1, "changedtick": 1, "items": 1})
+        assert info["title"] == "T"
+        assert info["size"] == 1
+        assert vim.eval(f"bufname({info['items'][0]['bufnr']})") == "/tmp/x.py"
+        assert vim.eval(f"buflisted({info['items'][0]['bufnr']})") == "0"
+
+    def test_new_lists_get_new_ids_and_restart_changedtick(self):
+        vim = FakeVim()
+        getqflist, setqflist = vim.Function("getqflist"), vim.Function("setqflist")
+        assert getqflist({"id": 1, "changedtick": 1}) == {"id": 0, "changedtick": 0}
+        setqflist([], "r", {"items": []})
+        setqflist([], "r", {"items": []})
+        assert getqflist({"id": 1, "changedtick": 1}) == {"id": 1, "changedtick": 2}
+        setqflist([], " ", {"items": []})
+        assert getqflist({"id": 1, "changedtick": 1}) == {"id": 2, "changedtick": 1}
+        vim.Function("setloclist")(0, [], "r", {"items": []})
+        assert vim.Function("getloclist")(0, {"id": 1})["id"] == 3
+
+
+class TestInline:
+    def test_worker_tools_reach_the_fake(self):
+        vim = FakeVim()
+        original = mcp_tools._submit_to_main_thread
+        with inline(vim):
+            result = mcp_tools.call_tool("show_diff", {"content_a": "a\nb", "content_b": "a\nc", "view": "unified"})
+        assert mcp_tools._submit_to_main_thread is original
+        assert result.startswith("Showing unified diff in new tab")
+        assert vim.eval("&filetype") == "diff"
+        assert vim.Function("getqflist")({"size": 1})["size"] == 1
+
+    def test_errors_are_returned_like_the_timer_does(self, tmp_path):
+        vim = FakeVim()
+        vim.globals["mcp_server_allow_execute"] = 1
+        with inline(vim):
+            result = mcp_tools.call_tool("execute_command", {"command": "frobnicate"})
+        assert "E492" in result["error"]
+
+    def test_open_file_reads_from_disk(self, tmp_path):
+        path = tmp_path / "f.txt"
+        path.write_text("one\ntwo\n")
+        vim = FakeVim()
+        with inline(vim):
+            mcp_tools.call_tool("open_file", {"path": str(path)})
+        assert vim.current.buffer.name == os.path.abspath(str(path))
+        assert vim.current.buffer[:] == ["one", "two"]
@@ -0,0 +1,95 @@
+import difflib
+import random
+import time
+
+import mcp_diff
+
+
+class TestOpcodes:
+    def test_reconstructs_both_sides(self):
+        rng = random.Random(7)
+        for _ in range(500):
+            a = [rng.choice("abcdefg") for _ in range(rng.randint(0, 40))]
+            b = list(a)
+            for _ in range(rng.randint(0, 6)):
+                if b and rng.random() < 0.4:
+                    del b[rng.randrange(len(b))]
+                else:
+                    b.insert(rng.randint(0, len(b)), rng.choice("abxyz"))
+            rebuilt_a, rebuilt_b = [], []
+            for tag, i1, i2, j1, j2 in mcp_diff.opcodes(a, b):
+                if tag == "equal":
+                    assert a[i1:i2] == b[j1:j2]
+                rebuilt_a.extend(a[i1:i2])
+                rebuilt_b.extend(b[j1:j2])
+            assert rebuilt_a == a
+            assert rebuilt_b == b
+
+    def test_anchors_on_unique_lines(self):
+        a = ["{", "x = 1", "}", "{", "y = 2", "}"]
+        b = ["{", "y = 2", "}"]
+        codes = mcp_diff.opcodes(a, b)
+        assert ("equal", 4, 6, 1, 3) in codes
+        assert [c for c in codes if c[0] != "equal"] == [("delete", 1, 4, 1, 1)]
+
+    def test_scattered_changes_in_100k_lines_stay_fast(self):
+        # Used to split off one changed line per pass over the rest of the
+        # file, which took about 30s here.
+        a = [f"    total_{i % 977} = compute(rows[{i}], {i % 13})" for i in range(100_000)]
+        b = [line + " # changed" if i % 100 == 50 else line for i, line in enumerate(a)]
+        started = time.perf_counter()
+        codes = mcp_diff.opcodes(a, b)
+        assert time.perf_counter() - started < 1.0
+        assert [c for c in codes if c[0] != "equal"] == [("replace", i, i + 1, i, i + 1) for i in range(50, 100_000, 100)]
+
+    def test_inputs_without_unique_lines_stay_fast(self):
+        # No line occurs once on each side, so there is nothing to anchor
+        # on; SequenceMatcher alone took minutes on these.
+        rng = random.Random(3)
+        cases = [
+            (["x", "y"] * 20_000, ["y", "y", "x"] * 13_000),
+            ([str(rng.randrange(51)) for _ in range(20_000)], [str(rng.randrange(51)) for _ in range(20_000)]),
+        ]
+        for a, b in cases:
+            started = time.perf_counter()
+            codes = mcp_diff.opcodes(a, b)
+            assert time.perf_counter() - started < 1.0
+            assert sum(i2 - i1 for _, i1, i2, _, _ in codes) == len(a)
+            assert sum(j2 - j1 for _, _, _, j1, j2 in codes) == len(b)
+            for tag, i1, i2, j1, j2 in codes:
+                if tag == "equal":
+                    assert a[i1:i2] == b[j1:j2]
+
+    def test_identical_and_empty(self):
+        assert mcp_diff.opcodes(["a"], ["a"]) == [("equal", 0, 1, 0, 1)]
+        assert mcp_diff.opcodes([], ["a"]) == [("insert", 0, 0, 0, 1)]
+        assert mcp_diff.opcodes([], []) == []
+
+
+class TestHunks:
+    def test_unified_matches_difflib_format(self):
+        rng = random.Random(3)
+        for _ in range(300):
+            a = [rng.choice("abcdefg") for _ in range(rng.randint(0, 30))]
+            b = [line if rng.random() < 0.8 else "z" for line in a]
+            context = rng.randint(0, 4)
+            codes = difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes()
+            mine = mcp_diff.unified("a", "b", mcp_diff.hunks(a, b, codes, context))
+            expected = list(difflib.unified_diff(a, b, "a", "b", n=context, lineterm=""))
+            assert mine.split("\n") == (expected or ["--- a", "+++ b"])
+
+    def test_structured_hunk(self):
+        a = ["1", "2", "3", "4", "5", "6", "7", "8"]
+        b = ["1", "2", "3", "4", "five", "6", "7", "8"]
+        hunks = mcp_diff.hunks(a, b, mcp_diff.opcodes(a, b), 1)
+        assert hunks == [{
+            "old_start": 4, "old_lines": 3, "new_start": 4, "new_lines": 3,
+            "lines": [" 4", "-5", "+five", " 6"],
+        }]
+
+    def test_no_changes(self):
+        assert mcp_diff.hunks(["a"], ["a"], mcp_diff.opcodes(["a"], ["a"]), 3) == []
+
+    def test_hunk_header(self):
+        hunk = {"old_start": 4, "old_lines": 3, "new_start": 4, "new_lines": 1, "lines": []}
+        assert mcp_diff.hunk_header(hunk) == "@@ -4,3 +4 @@"
@@ -0,0 +1,103 @@
+import re
+
+import mcp_file_search
+
+
+def _write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    path.write_bytes(data)
+
+
+def _rel_files(root):
+    return sorted(
+        p[len(str(root)) + 1:].replace("\\", "/")
+        for p in mcp_file_search.iter_files(str(root))
+    )
+
+
+class TestParseGitignore:
+    def _ignored(self, text, rel_path, is_dir=False):
+        rules = mcp_file_search.parse_gitignore(text)
+        return mcp_file_search.is_ignored([("", rules)], rel_path, is_dir)
+
+    def test_basename_pattern_matches_at_any_depth(self):
+        assert self._ignored("*.log\n", "a/b/c.log")
+        assert not self._ignored("*.log\n", "a/b/c.py")
+
+    def test_anchored_pattern(self):
+        assert self._ignored("/build\n", "build", is_dir=True)
+        assert not self._ignored("/build\n", "src/build", is_dir=True)
+
+    def test_dir_only_pattern(self):
+        assert self._ignored("out/\n", "out", is_dir=True)
+        assert not self._ignored("out/\n", "out", is_dir=False)
+
+    def test_negation(self):
+        assert not self._ignored("*.log\n!keep.log\n", "keep.log")
+
+    def test_double_star(self):
+        assert self._ignored("docs/**/*.tmp\n", "docs/a/b/x.tmp")
+        assert self._ignored("docs/**/*.tmp\n", "docs/x.tmp")
+
+    def test_comments_and_blank_lines_ignored(self):
+        assert mcp_file_search.parse_gitignore("# comment\n\n") == []
+
+
+class TestIterFiles:
+    def test_respects_nested_gitignore_and_skips_git_dir(self, tmp_path):
+        _write(tmp_path / ".gitignore", "*.log\nbuild/\n")
+        _write(tmp_path / "a.py", "x")
+        _write(tmp_path / "debug.log", "x")
+        _write(tmp_path / "build" / "out.py", "x")
+        _write(tmp_path / "sub" / ".gitignore", "secret.txt\n")
+        _write(tmp_path / "sub" / "secret.txt", "x")
+        _write(tmp_path / "sub" / "b.py", "x")
+        _write(tmp_path / ".git" / "HEAD", "x")
+        assert _rel_files(tmp_path) == [".gitignore", "a.py", "sub/.gitignore", "sub/b.py"]
+
+    def test_respects_info_exclude(self, tmp_path):
+        _write(tmp_path / ".git" / "info" / "exclude", "local.txt\n")
+        _write(tmp_path / "local.txt", "x")
+        _write(tmp_path / "kept.txt", "x")
+        assert _rel_files(tmp_path) == ["kept.txt"]
+
+
+class TestSearchFiles:
+    def test_reports_line_and_column(self, tmp_path):
+        _write(tmp_path / "a.txt", "one\ntwo foo\nthree\nfoo\n")
+        regex = re.compile(rb"(?m)foo")
+        matches, files, truncated = mcp_file_search.search_files(str(tmp_path), regex, 100)
+        assert files == 1
+        assert truncated is False
+        assert [(m["line"], m["column"], m["text"]) for m in matches] == [
+            (2, 5, "two foo"),
+            (4, 1, "foo"),
+        ]
+
+    def test_skips_binary_and_empty_files(self, tmp_path):
+        _write(tmp_path / "bin.dat", b"foo\0bar")
+        _write(tmp_path / "empty.txt", b"")
+        _write(tmp_path / "text.txt", "foo\n")
+        regex = re.compile(rb"(?m)foo")
+        matches, files, _ = mcp_file_search.search_files(str(tmp_path), regex, 100)
+        assert [m["filename"] for m in matches] == [str(tmp_path / "text.txt")]
+        assert files == 2
+
+    def test_caps_results(self, tmp_path):
+        for i in range(5):
+            _write(tmp_path / f"f{i}.txt", "foo\nfoo\n")
+        regex = re.compile(rb"(?m)foo")
+        matches, _, truncated = mcp_file_search.search_files(str(tmp_path), regex, 3)
+        assert len(matches) == 3
+        assert truncated is True
+
+    def test_streams_chunks(self, tmp_path):
+        _write(tmp_path / "a.txt", "foo\n" * 5)
+        chunks = []
+        regex = re.compile(rb"(?m)foo")
+        mcp_file_search.search_files(
+            str(tmp_path), regex, 100, on_chunk=chunks.append, chunk_size=2,
+        )
+        assert [len(c) for c in chunks] == [2, 2, 1]
@@ -0,0 +1,156 @@
+import os
+import subprocess
+
+import pytest
+
+import mcp_git
+
+
+def _git(repo, *args):
+    subprocess.run(
+        ["git", "-c", "user.name=t", "-c", "user.email=t@example.com"] + list(args),
+        cwd=repo,
+        check=True,
+        capture_output=True,
+    )
+
+
+@pytest.fixture
+def repo(tmp_path):
+    _git(tmp_path, "init", "-q")
+    (tmp_path / "a.txt").write_text("committed\n", encoding="utf-8")
+    _git(tmp_path, "add", "a.txt")
+    _git(tmp_path, "commit", "-q", "-m", "init")
+    return str(tmp_path)
+
+
+class TestCatFileBatch:
+    def test_object_info_and_contents(self, repo):
+        info = mcp_git.object_info(repo, "HEAD:a.txt")
+        assert info[1:] == ("blob", 10)
+        contents = mcp_git.object_contents(repo, "HEAD:a.txt")
+        assert contents[3] == b"committed\n"
+
+    def test_missing_object(self, repo):
+        assert mcp_git.object_info(repo, "HEAD:nope.txt") is None
+        assert mcp_git.object_contents(repo, "HEAD:nope.txt") is None
+
+    def test_process_is_reused(self, repo):
+        mcp_git.object_info(repo, "HEAD:a.txt")
+        proc = mcp_git._processes[(repo, "--batch-check")].proc
+        mcp_git.object_info(repo, "HEAD:a.txt")
+        assert mcp_git._processes[(repo, "--batch-check")].proc is proc
+
+    def test_restarts_dead_process(self, repo):
+        mcp_git.object_info(repo, "HEAD:a.txt")
+        entry = mcp_git._processes[(repo, "--batch-check")]
+        entry.proc.kill()
+        entry.proc.wait()
+        assert mcp_git.object_info(repo, "HEAD:a.txt") is not None
+
+    def test_index_change_is_seen(self, repo):
+        assert mcp_git.object_contents(repo, ":a.txt")[3] == b"committed\n"
+        with open(os.path.join(repo, "a.txt"), "w", encoding="utf-8") as f:
+            f.write("staged change\n")
+        _git(repo, "add", "a.txt")
+        assert mcp_git.object_contents(repo, ":a.txt")[3] == b"staged change\n"
+
+    def test_reap_idle_closes_process(self, repo, monkeypatch):
+        mcp_git.object_info(repo, "HEAD:a.txt")
+        entry = mcp_git._processes[(repo, "--batch-check")]
+        mcp_git.reap_idle(now=entry.last_used + mcp_git._IDLE_TIMEOUT + 1)
+        assert entry.proc is None
+        assert mcp_git.object_info(repo, "HEAD:a.txt") is not None
+
+    def test_not_a_repository_raises(self, tmp_path):
+        with pytest.raises(mcp_git.GitBatchError):
+            mcp_git.object_info(str(tmp_path), "HEAD:a.txt")
+
+    def test_newline_in_spec_raises(self, repo):
+        with pytest.raises(mcp_git.GitBatchError):
+            mcp_git.object_info(repo, "HEAD:a\nb")
+
+
+class TestRepoRoot:
+    def test_finds_root_from_file_and_subdirectory(self, tmp_path):
+        (tmp_path / ".git").mkdir()
+        (tmp_path / ".git" / "HEAD").write_text("ref: refs/heads/main\n", encoding="utf-8")
+        sub = tmp_path / "a" / "b"
+        sub.mkdir(parents=True)
+        (sub / "f.py").write_text("x", encoding="utf-8")
+        assert mcp_git.repo_root(str(sub / "f.py")) == str(tmp_path)
+        assert mcp_git.repo_root(str(sub)) == str(tmp_path)
+
+    def test_gitfile_marks_worktree_or_submodule_root(self, tmp_path):
+        (tmp_path / ".git").mkdir()
+        (tmp_path / ".git" / "HEAD").write_text("ref: refs/heads/main\n", encoding="utf-8")
+        sub = tmp_path / "vendor" / "lib"
+        sub.mkdir(parents=True)
+        (sub / ".git").write_text("gitdir: ../../.git/modules/lib\n", encoding="utf-8")
+        assert mcp_git.repo_root(str(sub / "x.c")) == str(sub)
+
+    def test_directory_without_head_is_not_a_repo(self, tmp_path):
+        (tmp_path / ".git").mkdir()
+        assert mcp_git.repo_root(str(tmp_path / "f.py")) != str(tmp_path)
+
+    def test_matches_git_rev_parse(self, repo):
+        sub = os.path.join(repo, "d")
+        os.mkdir(sub)
+        expected = subprocess.run(
+            ["git", "rev-parse", "--show-toplevel"],
+            cwd=sub, capture_output=True, check=True,
+        ).stdout.decode().strip()
+        assert os.path.realpath(mcp_git.repo_root(os.path.join(sub, "f"))) == os.path.realpath(expected)
+
+    def test_cached_lookup_does_not_walk(self, tmp_path, monkeypatch):
+        (tmp_path / ".git").mkdir()
+        (tmp_path / ".git" / "HEAD").write_text("x", encoding="utf-8")
+        calls = []
+        original = mcp_git._is_git_entry
+        monkeypatch.setattr(mcp_git, "_is_git_entry", lambda p: calls.append(p) or original(p))
+        mcp_git.repo_root(str(tmp_path / "f.py"))
+        mcp_git.repo_root(str(tmp_path / "g.py"))
+        assert len(calls) == 1
+
+    def test_cache_invalidated_by_git_entry_mtime(self, tmp_path):
+        (tmp_path / ".git").mkdir()
+        (tmp_path / ".git" / "HEAD").write_text("x", encoding="utf-8")
+        assert mcp_git.repo_root(str(tmp_path / "f.py")) == str(tmp_path)
+        (tmp_path / ".git" / "HEAD").unlink()
+        os.utime(tmp_path / ".git", ns=(1, 1))
+        assert mcp_git.repo_root(str(tmp_path / "f.py")) != str(tmp_path)
+
+    def test_cache_notices_nested_repo_created_later(self, tmp_path):
+        (tmp_path / ".git").mkdir()
+        (tmp_path / ".git" / "HEAD").write_text("x", encoding="utf-8")
+        sub = tmp_path / "vendor" / "lib"
+        sub.mkdir(parents=True)
+        assert mcp_git.repo_root(str(sub / "f.py")) == str(tmp_path)
+        (sub / ".git").mkdir()
+        (sub / ".git" / "HEAD").write_text("x", encoding="utf-8")
+        assert mcp_git.repo_root(str(sub / "f.py")) == str(sub)
+
+    def test_does_not_spawn_git(self, tmp_path, monkeypatch):
+        (tmp_path / ".git").write_text("gitdir: /elsewhere\n", encoding="utf-8")
+        monkeypatch.setattr(subprocess, "run", lambda *a, **k: pytest.fail("spawned git"))
+        monkeypatch.setattr(subprocess, "Popen", lambda *a, **k: pytest.fail("spawned git"))
+        assert mcp_git.repo_root(str(tmp_path / "f.py")) == str(tmp_path)
+
+
+class TestAttributes:
+    def test_binary_attributes(self, repo):
+        with open(os.path.join(repo, ".gitattributes"), "w", encoding="utf-8") as f:
+            f.write("*.png binary\n*.min.js -diff\n*.dat -text\n*.bin diff\n")
+        assert mcp_git.is_binary_by_attributes(repo, "logo.png") is True
+        assert mcp_git.is_binary_by_attributes(repo, "app.min.js") is True
+        assert mcp_git.is_binary_by_attributes(repo, "blob.dat") is True
+        assert mcp_git.is_binary_by_attributes(repo, "forced.bin") is False
+        assert mcp_git.is_binary_by_attributes(repo, "a.txt") is None
+
+    def test_restarts_when_gitattributes_changes(self, repo):
+        path = os.path.join(repo, ".gitattributes")
+        assert mcp_git.is_binary_by_attributes(repo, "a.txt") is None
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("*.txt binary\n")
+        os.utime(path, ns=(1, 1))
+        assert mcp_git.is_binary_by_attributes(repo, "a.txt") is True
@@ -0,0 +1,162 @@
+import os
+import subprocess
+
+import pytest
+
+import mcp_git_objects
+import mcp_tools
+
+
+def _git(repo, *args):
+    return subprocess.run(
+        ["git", "-c", "user.name=t", "-c", "user.email=t@example.com"] + list(args),
+        cwd=repo,
+        check=True,
+        capture_output=True,
+    ).stdout
+
+
+def _commit(repo, files, message):
+    for name, content in files.items():
+        path = os.path.join(repo, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(content)
+    _git(repo, "add", "-A")
+    _git(repo, "commit", "-q", "-m", message)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    repo = str(tmp_path)
+    _git(repo, "init", "-q")
+    base = b"".join(b"line %d of a long enough file to delta against\n" % i for i in range(400))
+    _commit(repo, {"src/a.txt": base, "b.bin": b"\0\1\2"}, "one")
+    _git(repo, "tag", "-a", "v1", "-m", "annotated")
+    _commit(repo, {"src/a.txt": base.replace(b"line 7 ", b"LINE 7 ")}, "two")
+    _commit(repo, {"src/a.txt": base + b"tail\n"}, "three")
+    return repo
+
+
+def _expected(repo, spec):
+    return _git(repo, "cat-file", "blob", spec)
+
+
+class TestPathInfo:
+    def test_loose_objects(self, repo):
+        oid, obj_type, size = mcp_git_objects.path_info(repo, "HEAD", "src/a.txt")
+        assert obj_type == "blob"
+        assert size == len(_expected(repo, "HEAD:src/a.txt"))
+        assert mcp_git_objects.read_object(repo, oid) == ("blob", _expected(repo, "HEAD:src/a.txt"))
+
+    def test_packed_objects_with_deltas(self, repo):
+        _git(repo, "gc", "-q", "--aggressive")
+        assert not os.path.exists(os.path.join(repo, ".git", "refs", "tags", "v1"))
+        branch = _git(repo, "symbolic-ref", "--short", "HEAD").decode().strip()
+        for ref in ("HEAD", branch, "v1", "HEAD"):
+            oid, _, size = mcp_git_objects.path_info(repo, ref, "src/a.txt")
+            data = mcp_git_objects.read_object(repo, oid)[1]
+            assert data == _expected(repo, f"{ref}:src/a.txt")
+            assert size == len(data)
+
+    def test_full_object_id(self, repo):
+        head = _git(repo, "rev-parse", "HEAD~1").decode().strip()
+        oid, _, _ = mcp_git_objects.path_info(repo, head, "src/a.txt")
+        assert mcp_git_objects.read_object(repo, oid)[1] == _expected(repo, "HEAD~1:src/a.txt")
+
+    def test_missing_path_and_kinds(self, repo):
+        assert mcp_git_objects.path_info(repo, "HEAD", "nope.txt") is None
+        assert mcp_git_objects.path_info(repo, "HEAD", "b.bin/x") is None
+        assert mcp_git_objects.path_info(repo, "HEAD", "src")[1] == "tree"
+
+    def test_new_pack_is_picked_up(self, repo):
+        mcp_git_objects.path_info(repo, "HEAD", "src/a.txt")
+        _commit(repo, {"c.txt": b"new\n"}, "four")
+        _git(repo, "gc", "-q")
+        oid, _, _ = mcp_git_objects.path_info(repo, "HEAD", "c.txt")
+        assert mcp_git_objects.read_object(repo, oid)[1] == b"new\n"
+
+    def test_reap_idle_unmaps_packs(self, repo):
+        _git(repo, "gc", "-q")
+        mcp_git_objects.path_info(repo, "HEAD", "src/a.txt")
+        cached = mcp_git_objects._repos[repo]
+        packs = list(cached.packs.values())
+        assert packs
+        mcp_git_objects.reap_idle(now=cached.last_used + 1)
+        assert cached.packs
+        mcp_git_objects.reap_idle(now=cached.last_used + mcp_git_objects.mcp_git._IDLE_TIMEOUT + 1)
+        assert not cached.packs
+        assert all(p.idx.closed and p.pack.closed for p in packs)
+        oid, _, _ = mcp_git_objects.path_info(repo, "HEAD", "src/a.txt")
+        assert mcp_git_objects.read_object(repo, oid)[1] == _expected(repo, "HEAD:src/a.txt")
+
+    def test_replaced_pack_is_reopened(self, repo):
+        _git(repo, "gc", "-q")
+        mcp_git_objects.path_info(repo, "HEAD", "src/a.txt")
+        cached = mcp_git_objects._repos[repo]
+        (path, old), = cached.packs.items()
+        copy = path + ".tmp"
+        with open(path, "rb") as src, open(copy, "wb") as dst:
+            dst.write(src.read())
+        os.replace(copy, path)
+        assert cached._pack_list(rescan=True) != [old]
+        assert old.idx.closed
+        oid, _, _ = mcp_git_objects.path_info(repo, "HEAD", "src/a.txt")
+        assert mcp_git_objects.read_object(repo, oid)[1] == _expected(repo, "HEAD:src/a.txt")
+
+    @pytest.mark.parametrize("ref", ["HEAD~1", "HEAD^", "abc123", "no-such-branch", "@{u}"])
+    def test_unsupported_revisions(self, repo, ref):
+        with pytest.raises(mcp_git_objects.Unsupported):
+            mcp_git_objects.path_info(repo, ref, "src/a.txt")
+
+    def test_not_a_repository(self, tmp_path):
+        with pytest.raises(mcp_git_objects.Unsupported):
+            mcp_git_objects.path_info(str(tmp_path), "HEAD", "a.txt")
+
+
+class TestApplyDelta:
+    def test_copy_and_insert(self):
+        base = b"0123456789"
+        # src size 10, dst size 7, copy 4 bytes from offset 2, insert "xyz"
+        delta = bytes([10, 7, 0x80 | 0x01 | 0x10, 2, 4, 3]) + b"xyz"
+        assert mcp_git_objects._apply_delta(base, delta) == b"2345xyz"
+
+    def test_base_size_mismatch(self):
+        with pytest.raises(mcp_git_objects.Unsupported):
+            mcp_git_objects._apply_delta(b"abc", bytes([5, 0]))
+
+
+class TestGitShowUsesNativeReader:
+    def test_no_subprocess_for_committed_blobs(self, repo, monkeypatch):
+        _git(repo, "gc", "-q")
+        expected = _expected(repo, "HEAD:src/a.txt")
+        monkeypatch.setattr(subprocess, "Popen", lambda *a, **k: pytest.fail("spawned git"))
+        assert mcp_tools._git_show(repo, "HEAD", "src/a.txt") == (expected, False)
+        assert mcp_tools._git_show(repo, "HEAD", "missing.txt") == (b"", True)
+        assert mcp_tools._resolve_path_at_ref(repo, "HEAD", "src/a.txt") == "src/a.txt"
+
+    def test_falls_back_for_revision_expressions(self, repo):
+        assert mcp_tools._git_show(repo, "HEAD~2", "src/a.txt") == (_expected(repo, "HEAD~2:src/a.txt"), False)
+
+
+class TestRenameMap:
+    def test_whole_tree_map_is_cached_until_index_changes(self, repo, monkeypatch):
+        _git(repo, "mv", "src/a.txt", "src/moved.txt")
+        _git(repo, "mv", "b.bin", "c.bin")
+        calls = []
+        real_run = mcp_tools._run_git
+        monkeypatch.setattr(mcp_tools, "_run_git", lambda r, args: calls.append(args) or real_run(r, args))
+
+        assert mcp_tools._resolve_path_at_ref(repo, "HEAD", "src/moved.txt") == "src/a.txt"
+        assert mcp_tools._resolve_path_at_ref(repo, "HEAD", "c.bin") == "b.bin"
+        assert len([c for c in calls if c[0] == "diff"]) == 1
+
+        _git(repo, "mv", "c.bin", "d.bin")
+        assert mcp_tools._resolve_path_at_ref(repo, "HEAD", "d.bin") == "b.bin"
+        assert len([c for c in calls if c[0] == "diff"]) == 2
+
+    def test_map_follows_new_commits(self, repo):
+        _git(repo, "mv", "src/a.txt", "src/moved.txt")
+        assert mcp_tools._rename_map(repo, "HEAD") == {"src/moved.txt": "src/a.txt", "src/a.txt": "src/moved.txt"}
+        _git(repo, "commit", "-q", "-m", "mv")
+        assert mcp_tools._rename_map(repo, "HEAD") == {}
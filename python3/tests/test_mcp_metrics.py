@@ -0,0 +1,154 @@
+import threading
+import time
+import urllib.request
+
+import mcp_metrics
+import mcp_server
+import mcp_tools
+import mcp_vim_bridge
+
+
+def _samples(text):
+    return [line for line in text.splitlines() if line and not line.startswith("#")]
+
+
+class TestRender:
+    def test_counter_with_labels(self):
+        mcp_metrics.inc("mcp_tool_calls_total", tool="get_buffer")
+        mcp_metrics.inc("mcp_tool_calls_total", tool="get_buffer")
+        mcp_metrics.inc("mcp_tool_calls_total", tool='we"ird')
+        text = mcp_metrics.render()
+        assert "# TYPE mcp_tool_calls_total counter" in text
+        assert 'mcp_tool_calls_total{tool="get_buffer"} 2' in text
+        assert 'mcp_tool_calls_total{tool="we\\"ird"} 1' in text
+
+    def test_histogram_buckets_are_cumulative(self):
+        mcp_metrics.observe("mcp_tool_duration_seconds", 0.003, tool="x")
+        mcp_metrics.observe("mcp_tool_duration_seconds", 0.2, tool="x")
+        mcp_metrics.observe("mcp_tool_duration_seconds", 100.0, tool="x")
+        samples = _samples(mcp_metrics.render())
+        assert 'mcp_tool_duration_seconds_bucket{tool="x",le="0.001"} 0' in samples
+        assert 'mcp_tool_duration_seconds_bucket{tool="x",le="0.005"} 1' in samples
+        assert 'mcp_tool_duration_seconds_bucket{tool="x",le="0.25"} 2' in samples
+        assert 'mcp_tool_duration_seconds_bucket{tool="x",le="30.0"} 2' in samples
+        assert 'mcp_tool_duration_seconds_bucket{tool="x",le="+Inf"} 3' in samples
+        assert 'mcp_tool_duration_seconds_count{tool="x"} 3' in samples
+        assert any(s.startswith('mcp_tool_duration_seconds_sum{tool="x"} 100.2') for s in samples)
+
+    def test_unknown_metric_is_rejected(self):
+        try:
+            mcp_metrics.inc("nope_total")
+        except KeyError:
+            return
+        raise AssertionError("expected KeyError")
+
+    def test_bridge_gauges_are_exposed(self):
+        text = mcp_metrics.render()
+        assert "# TYPE mcp_request_queue_depth gauge" in text
+        assert "mcp_request_queue_depth 0" in text
+        assert "mcp_orphaned_results 0" in text
+
+
+class TestToolMetrics:
+    def test_call_tool_counts_calls_and_errors(self, monkeypatch):
+        results = iter(["ok", {"error": "nope"}])
+        monkeypatch.setattr(mcp_tools, "_submit_to_main_thread", lambda name, args: next(results))
+        mcp_tools.call_tool("get_cursor", {})
+        mcp_tools.call_tool("get_cursor", {})
+        samples = _samples(mcp_metrics.render())
+        assert 'mcp_tool_calls_total{tool="get_cursor"} 2' in samples
+        assert 'mcp_tool_errors_total{tool="get_cursor"} 1' in samples
+        assert 'mcp_tool_duration_seconds_count{tool="get_cursor"} 2' in samples
+
+    def test_exceptions_count_as_errors(self, monkeypatch):
+        def boom(name, args):
+            raise RuntimeError("boom")
+
+        monkeypatch.setattr(mcp_tools, "_submit_to_main_thread", boom)
+        try:
+            mcp_tools.call_tool("get_cursor", {})
+        except RuntimeError:
+            pass
+        assert 'mcp_tool_errors_total{tool="get_cursor"} 1' in mcp_metrics.render()
+
+
+class TestBridgeMetrics:
+    def test_queue_wait_and_execution_are_split(self):
+        holder = {}
+        thread = threading.Thread(
+            target=lambda: holder.setdefault("r", mcp_vim_bridge.submit_request("m-1", "get_cursor", {}))
+        )
+        thread.start()
+        while mcp_vim_bridge._request_queue.qsize() == 0:
+            time.sleep(0.001)
+        time.sleep(0.02)
+        assert mcp_vim_bridge.drain_requests()[0][0] == "m-1"
+        mcp_vim_bridge.post_result("m-1", "ok")
+        thread.join(timeout=2)
+
+        samples = _samples(mcp_metrics.render())
+        assert 'mcp_main_thread_queue_wait_seconds_count{function="get_cursor"} 1' in samples
+        assert 'mcp_main_thread_queue_wait_seconds_bucket{function="get_cursor",le="0.01"} 0' in samples
+        assert 'mcp_main_thread_execution_seconds_count{function="get_cursor"} 1' in samples
+        assert any(s.startswith("mcp_last_tick_age_seconds ") for s in samples)
+
+    def test_orphaned_results_are_counted(self):
+        mcp_vim_bridge.post_result("nobody-waits", "late")
+        try:
+            assert "mcp_orphaned_results 1" in mcp_metrics.render()
+        finally:
+            with mcp_vim_bridge._result_lock:
+                mcp_vim_bridge._result_slots.pop("nobody-waits", None)
+
+
+class TestMetricsEndpoint:
+    def test_get_metrics_without_vim(self):
+        mcp_server.start(0)
+        try:
+            port = mcp_server._server.server_address[1]
+            request = urllib.request.Request(
+                f"http://127.0.0.1:{port}/mcp",
+                data=b'{"jsonrpc": "2.0", "id": 1, "method": "ping"}',
+                headers={"Content-Type": "application/json"},
+            )
+            urllib.request.urlopen(request, timeout=5).read()
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+                content_type = response.headers["Content-Type"]
+                text = response.read().decode("utf-8")
+        finally:
+            mcp_server.stop()
+        assert content_type.startswith("text/plain; version=0.0.4")
+        assert "mcp_http_request_bytes_total 45" in text
+        assert "mcp_http_response_bytes_total " in text
+
+    def test_metrics_answer_while_a_call_waits_for_vim(self):
+        mcp_server.start(0)
+        port = mcp_server._server.server_address[1]
+        responses = []
+
+        def call():
+            request = urllib.request.Request(
+                f"http://127.0.0.1:{port}/mcp",
+                data=b'{"jsonrpc": "2.0", "id": 1, "method": "tools/call", '
+                     b'"params": {"name": "get_cursor", "arguments": {}}}',
+                headers={"Content-Type": "application/json"},
+            )
+            responses.append(urllib.request.urlopen(request, timeout=10).read())
+
+        caller = threading.Thread(target=call)
+        caller.start()
+        try:
+            deadline = time.monotonic() + 5
+            while mcp_vim_bridge._request_queue.qsize() == 0 and time.monotonic() < deadline:
+                time.sleep(0.001)
+            assert mcp_vim_bridge._request_queue.qsize() == 1
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=2) as response:
+                text = response.read().decode("utf-8")
+            assert "mcp_request_queue_depth 1" in text
+            assert not responses
+        finally:
+            for req_id, func_name, args in mcp_vim_bridge.drain_requests():
+                mcp_vim_bridge.post_result(req_id, "line 1, column 1")
+            caller.join(timeout=5)
+            mcp_server.stop()
+        assert len(responses) == 1
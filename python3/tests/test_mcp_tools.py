@@ -1,7 +1,10 @@
 import json
+import subprocess
 import sys
 from unittest.mock import MagicMock, patch, PropertyMock
 
+import pytest
+
 import mcp_tools
 
 
@@ -29,7 +32,7 @@ class TestToolDefinitions:
                 )
 
     def test_expected_tool_count(self):
-        assert len(mcp_tools.TOOL_DEFINITIONS) == 17
+        assert len(mcp_tools.TOOL_DEFINITIONS) == 21
 
 
 class TestBuildSetqflistItems:
@@ -451,6 +454,135 @@ class TestExecEditBuffer:
         assert result["error"].startswith("edit_buffer is disabled")
 
 
+class _ListBuffer(list):
+    def __init__(self, number, name, lines):
+        super().__init__(lines)
+        self.number = number
+        self.name = name
+
+
+def _make_vim_for_text_edits(lines, changedtick=1):
+    buf = _ListBuffer(1, "/tmp/test.py", lines)
+    vim = MagicMock()
+    vim.buffers = {1: buf}
+    vim.current.buffer = buf
+    state = {"changedtick": changedtick}
+
+    def eval_(expr):
+        if expr == "getbufvar(1, 'changedtick')":
+            return str(state["changedtick"])
+        return "1"
+
+    vim.eval = eval_
+    vim._state = state
+    return vim, buf
+
+
+def _text_edit(start_line, start_char, end_line, end_char, new_text):
+    return {
+        "range": {
+            "start": {"line": start_line, "character": start_char},
+            "end": {"line": end_line, "character": end_char},
+        },
+        "newText": new_text,
+    }
+
+
+class TestExecApplyTextEdits:
+    def test_replaces_within_single_line(self):
+        vim, buf = _make_vim_for_text_edits(["foo = bar(baz)", "x"])
+        result = mcp_tools._exec_apply_text_edits(vim, {
+            "edits": [_text_edit(0, 6, 0, 9, "qux")],
+        })
+        assert "Applied 1 text edits" in result
+        assert list(buf) == ["foo = qux(baz)", "x"]
+
+    def test_multiple_edits_use_original_positions(self):
+        vim, buf = _make_vim_for_text_edits(["a b c"])
+        mcp_tools._exec_apply_text_edits(vim, {
+            "edits": [
+                _text_edit(0, 0, 0, 1, "AAA"),
+                _text_edit(0, 4, 0, 5, "CCC"),
+            ],
+        })
+        assert list(buf) == ["AAA b CCC"]
+
+    def test_multiline_replacement_and_join(self):
+        vim, buf = _make_vim_for_text_edits(["one", "two", "three"])
+        mcp_tools._exec_apply_text_edits(vim, {
+            "edits": [_text_edit(0, 2, 2, 2, "X\nY")],
+        })
+        assert list(buf) == ["onX", "Yree"]
+
+    def test_insert_newline_splits_line(self):
+        vim, buf = _make_vim_for_text_edits(["abcd"])
+        mcp_tools._exec_apply_text_edits(vim, {
+            "edits": [_text_edit(0, 2, 0, 2, "\n")],
+        })
+        assert list(buf) == ["ab", "cd"]
+
+    def test_utf16_offsets_count_surrogate_pairs(self):
+        vim, buf = _make_vim_for_text_edits(["\U0001F600x = 1"])
+        mcp_tools._exec_apply_text_edits(vim, {
+            "edits": [_text_edit(0, 2, 0, 3, "y")],
+        })
+        assert list(buf) == ["\U0001F600y = 1"]
+
+    def test_utf8_offsets_count_bytes(self):
+        vim, buf = _make_vim_for_text_edits(["\u00e9x"])
+        mcp_tools._exec_apply_text_edits(vim, {
+            "edits": [_text_edit(0, 2, 0, 3, "y")],
+            "position_encoding": "utf-8",
+        })
+        assert list(buf) == ["\u00e9y"]
+
+    def test_end_of_document_position(self):
+        vim, buf = _make_vim_for_text_edits(["a", "b"])
+        mcp_tools._exec_apply_text_edits(vim, {
+            "edits": [_text_edit(2, 0, 2, 0, "\nc")],
+        })
+        assert list(buf) == ["a", "b", "c"]
+
+    def test_character_past_end_of_line_is_clamped(self):
+        vim, buf = _make_vim_for_text_edits(["abc"])
+        mcp_tools._exec_apply_text_edits(vim, {
+            "edits": [_text_edit(0, 1, 0, 99, "")],
+        })
+        assert list(buf) == ["a"]
+
+    def test_line_out_of_range(self):
+        vim, buf = _make_vim_for_text_edits(["abc"])
+        result = mcp_tools._exec_apply_text_edits(vim, {
+            "edits": [_text_edit(5, 0, 5, 1, "x")],
+        })
+        assert "out of range" in result["error"]
+        assert list(buf) == ["abc"]
+
+    def test_overlapping_edits_rejected(self):
+        vim, buf = _make_vim_for_text_edits(["abcdef"])
+        result = mcp_tools._exec_apply_text_edits(vim, {
+            "edits": [
+                _text_edit(0, 0, 0, 3, "x"),
+                _text_edit(0, 2, 0, 4, "y"),
+            ],
+        })
+        assert "overlap" in result["error"]
+        assert list(buf) == ["abcdef"]
+
+    def test_line_index_cached_until_changedtick_changes(self):
+        vim, buf = _make_vim_for_text_edits(["abc"])
+        first = mcp_tools._line_index(vim, buf)
+        assert mcp_tools._line_index(vim, buf) is first
+        vim._state["changedtick"] = 2
+        assert mcp_tools._line_index(vim, buf) is not first
+
+    def test_disabled_by_default(self):
+        vim = MagicMock()
+        vim.eval = lambda expr: "0"
+        result = mcp_tools._exec_apply_text_edits(vim, {"edits": []})
+        assert result["error"].startswith("apply_text_edits is disabled")
+
+
 class TestExecExecuteCommand:
     def test_disabled_by_default(self):
         vim = MagicMock()
@@ -466,6 +598,272 @@ class TestExecExecuteCommand:
         vim.command.assert_called_once_with("%s/foo/bar/g")
 
 
+_TOOL_CONTEXT_EXPR = "[&lazyredraw, &eventignore, win_getid(), get(g:, 'mcp_server_ignore_events', {})]"
+
+
+def _make_vim_for_snapshots(buffers, buftypes=None):
+    vim = MagicMock()
+    vim.buffers = {b.number: b for b in buffers}
+    ticks = {b.number: 1 for b in buffers}
+    buftypes = {} if buftypes is None else buftypes
+
+    def eval_(expr):
+        if expr.startswith("map(getbufinfo("):
+            return [[str(b.number), b.name, str(ticks[b.number]), buftypes.get(b.number, "")] for b in buffers]
+        if expr == _TOOL_CONTEXT_EXPR:
+            return ["0", "", "1000", {}]
+        return "0"
+
+    vim.eval = MagicMock(side_effect=eval_)
+    vim._ticks = ticks
+    return vim
+
+
+class TestExecSnapshotBuffers:
+    def test_reuses_snapshot_while_changedtick_unchanged(self):
+        buf = _ListBuffer(1, "/tmp/a.py", ["x", "y"])
+        vim = _make_vim_for_snapshots([buf])
+        first = mcp_tools._exec_snapshot_buffers(vim)
+        second = mcp_tools._exec_snapshot_buffers(vim)
+        assert first[0]["lines"] == ["x", "y"]
+        assert second[0] is first[0]
+
+    def test_refreshes_snapshot_when_changedtick_changes(self):
+        buf = _ListBuffer(1, "/tmp/a.py", ["x"])
+        vim = _make_vim_for_snapshots([buf])
+        first = mcp_tools._exec_snapshot_buffers(vim)
+        buf.append("z")
+        vim._ticks[1] = 2
+        second = mcp_tools._exec_snapshot_buffers(vim)
+        assert second[0] is not first[0]
+        assert second[0]["lines"] == ["x", "z"]
+
+
+class TestRunSearchBuffers:
+    def test_returns_matches_with_context(self, main_thread):
+        buf = _ListBuffer(1, "/tmp/a.py", ["one", "two foo", "three"])
+        vim = _make_vim_for_snapshots([buf])
+        main_thread.vim = vim
+        result = json.loads(mcp_tools._run_search_buffers({
+            "pattern": "fo+",
+            "context_lines": 1,
+        }))
+        assert result["truncated"] is False
+        assert result["matches"] == [{
+            "buffer": 1,
+            "filename": "/tmp/a.py",
+            "line": 2,
+            "column": 5,
+            "text": "two foo",
+            "before": ["one"],
+            "after": ["three"],
+        }]
+
+    def test_max_results_truncates(self, main_thread):
+        buf = _ListBuffer(1, "/tmp/a.py", ["x"] * 10)
+        vim = _make_vim_for_snapshots([buf])
+        main_thread.vim = vim
+        result = json.loads(mcp_tools._run_search_buffers({
+            "pattern": "x",
+            "max_results": 3,
+        }))
+        assert len(result["matches"]) == 3
+        assert result["truncated"] is True
+
+    def test_ignore_case(self, main_thread):
+        buf = _ListBuffer(1, "/tmp/a.py", ["FOO"])
+        vim = _make_vim_for_snapshots([buf])
+        main_thread.vim = vim
+        result = json.loads(mcp_tools._run_search_buffers({
+            "pattern": "foo",
+            "ignore_case": True,
+        }))
+        assert len(result["matches"]) == 1
+
+    def test_invalid_pattern(self, main_thread):
+        main_thread.vim = MagicMock()
+        result = mcp_tools._run_search_buffers({"pattern": "("})
+        assert "Invalid pattern" in result["error"]
+        assert main_thread.calls == []
+
+    @pytest.mark.parametrize("args", [{"max_results": "many"}, {"context_lines": None}, {"max_results": [3]}])
+    def test_non_integer_counts_are_a_tool_error(self, args, main_thread):
+        main_thread.vim = MagicMock()
+        result = mcp_tools.call_tool("search_buffers", dict(args, pattern="x"))
+        assert result == {"error": "context_lines and max_results must be integers"}
+        assert main_thread.calls == []
+
+    def test_skips_special_buffers_unless_asked(self, main_thread):
+        buffers = [
+            _ListBuffer(1, "/tmp/a.py", ["foo"]),
+            _ListBuffer(2, "/usr/share/vim/doc/help.txt", ["foo"]),
+            _ListBuffer(3, "", ["a.py|1| foo"]),
+        ]
+        vim = _make_vim_for_snapshots(buffers, {2: "help", 3: "quickfix"})
+        main_thread.vim = vim
+        result = json.loads(mcp_tools._run_search_buffers({"pattern": "foo"}))
+        assert [m["buffer"] for m in result["matches"]] == [1]
+        result = json.loads(mcp_tools._run_search_buffers({"pattern": "foo", "include_special": True}))
+        assert [m["buffer"] for m in result["matches"]] == [1, 2, 3]
+
+    def test_buftype_change_refreshes_snapshot(self):
+        buf = _ListBuffer(1, "", ["x"])
+        buftypes = {}
+        vim = _make_vim_for_snapshots([buf], buftypes)
+        assert mcp_tools._exec_snapshot_buffers(vim)[0]["buftype"] == ""
+        buftypes[1] = "nofile"
+        assert mcp_tools._exec_snapshot_buffers(vim)[0]["buftype"] == "nofile"
+
+    def test_quickfix_option_sets_list(self, main_thread):
+        buf = _ListBuffer(3, "/tmp/a.py", ["foo"])
+        vim = _make_vim_for_snapshots([buf])
+        main_thread.vim = vim
+        mcp_tools._run_search_buffers({"pattern": "foo", "quickfix": True})
+        assert [c[0] for c in main_thread.calls] == ["_snapshot_buffers", "_set_quickfix_items"]
+        assert main_thread.calls[1][1]["items"] == [{"bufnr": 3, "lnum": 1, "col": 1, "text": "foo"}]
+
+    def test_call_tool_runs_off_main_thread(self, main_thread):
+        buf = _ListBuffer(1, "/tmp/a.py", ["foo"])
+        vim = _make_vim_for_snapshots([buf])
+        main_thread.vim = vim
+        result = json.loads(mcp_tools.call_tool("search_buffers", {"pattern": "foo"}))
+        assert len(result["matches"]) == 1
+        assert [c[0] for c in main_thread.calls] == ["_snapshot_buffers"]
+
+
+class TestRunSearchFiles:
+    def test_fills_quickfix_in_chunks(self, monkeypatch, tmp_path, main_thread):
+        (tmp_path / "a.py").write_text("foo\nfoo\nfoo\n", encoding="utf-8")
+        monkeypatch.setattr(mcp_tools, "_SEARCH_FILES_CHUNK", 2)
+        main_thread.reply = {"id": 7}
+        result = json.loads(mcp_tools._run_search_files({
+            "pattern": "foo",
+            "path": str(tmp_path),
+        }))
+        assert result["match_count"] == 3
+        assert "matches" not in result
+        actions = [c[1]["action"] for c in main_thread.calls]
+        assert actions == ["r", "a"]
+        assert [c[1].get("id") for c in main_thread.calls] == [None, 7]
+        assert main_thread.calls[0][1]["title"] == "search_files: foo"
+        assert main_thread.calls[0][1]["items"][0] == {
+            "filename": str(tmp_path / "a.py"),
+            "lnum": 1,
+            "text": "foo",
+            "col": 1,
+        }
+
+    def test_no_matches_clears_quickfix(self, tmp_path, main_thread):
+        (tmp_path / "a.py").write_text("bar\n", encoding="utf-8")
+        main_thread.reply = {"id": 7}
+        mcp_tools._run_search_files({"pattern": "foo", "path": str(tmp_path)})
+        assert len(main_thread.calls) == 1
+        assert main_thread.calls[0][1]["items"] == []
+        assert main_thread.calls[0][1]["action"] == "r"
+
+    def test_quickfix_false_returns_matches(self, tmp_path, main_thread):
+        (tmp_path / "a.py").write_text("foo\n", encoding="utf-8")
+        result = json.loads(mcp_tools._run_search_files({
+            "pattern": "foo",
+            "path": str(tmp_path),
+            "quickfix": False,
+        }))
+        assert main_thread.calls == []
+        assert result["matches"][0]["line"] == 1
+
+    def test_open_targets_the_filled_list(self, tmp_path, main_thread):
+        (tmp_path / "a.py").write_text("foo\n", encoding="utf-8")
+        main_thread.reply = {"id": 7}
+        mcp_tools._run_search_files({"pattern": "foo", "path": str(tmp_path), "open": True})
+        assert [(c[1]["action"], c[1].get("id"), c[1].get("open")) for c in main_thread.calls] == [
+            ("r", None, None), ("a", 7, True),
+        ]
+
+    @pytest.mark.parametrize("max_results", ["lots", None, [1]])
+    def test_non_integer_max_results_is_a_tool_error(self, tmp_path, max_results, main_thread):
+        result = mcp_tools.call_tool("search_files", {
+            "pattern": "foo", "path": str(tmp_path), "max_results": max_results,
+        })
+        assert result == {"error": "max_results must be an integer"}
+        assert main_thread.calls == []
+
+    def test_relative_path_rejected(self):
+        result = mcp_tools._run_search_files({"pattern": "x", "path": "rel"})
+        assert "absolute" in result["error"]
+
+
+class TestExecGetMessages:
+    def _make_vim(self, history):
+        vim = MagicMock()
+        vim.eval = lambda expr: "\n" + "\n".join(history) if history else ""
+        return vim
+
+    def test_without_arguments_returns_raw_history(self):
+        vim = self._make_vim(["hello", "world"])
+        assert mcp_tools._exec_get_messages(vim, {}) == "\nhello\nworld"
+
+    def test_cursor_returns_only_new_messages(self):
+        history = ["one", "two"]
+        vim = self._make_vim(history)
+        first = json.loads(mcp_tools._exec_get_messages(vim, {"since": 0}))
+        assert [m["text"] for m in first["messages"]] == ["one", "two"]
+        history.append("three")
+        second = json.loads(mcp_tools._exec_get_messages(vim, {"since": first["cursor"]}))
+        assert [m["text"] for m in second["messages"]] == ["three"]
+        third = json.loads(mcp_tools._exec_get_messages(vim, {"since": second["cursor"]}))
+        assert third["messages"] == []
+        assert third["cursor"] == second["cursor"]
+
+    def test_history_rollover_is_aligned(self):
+        history = ["a", "b", "b"]
+        vim = self._make_vim(history)
+        first = json.loads(mcp_tools._exec_get_messages(vim, {"since": 0}))
+        history[:] = ["b", "b", "c"]
+        second = json.loads(mcp_tools._exec_get_messages(vim, {"since": first["cursor"]}))
+        assert [m["text"] for m in second["messages"]] == ["c"]
+
+    def test_messages_after_clear_are_new(self):
+        history = ["one", "E492: Not an editor command: foo"]
+        vim = self._make_vim(history)
+        first = json.loads(mcp_tools._exec_get_messages(vim, {"since": 0}))
+        # :messages clear, then the same error again.
+        history[:] = ["E492: Not an editor command: foo"]
+        second = json.loads(mcp_tools._exec_get_messages(vim, {"since": first["cursor"]}))
+        assert [m["text"] for m in second["messages"]] == ["E492: Not an editor command: foo"]
+
+    def test_repeated_message_is_new(self):
+        history = ["E492: Not an editor command: foo"]
+        vim = self._make_vim(history)
+        first = json.loads(mcp_tools._exec_get_messages(vim, {"since": 0}))
+        history.append("E492: Not an editor command: foo")
+        second = json.loads(mcp_tools._exec_get_messages(vim, {"since": first["cursor"]}))
+        assert len(second["messages"]) == 1
+
+    def test_severity_filter(self):
+        vim = self._make_vim([
+            "info",
+            "Error detected while processing function Foo:",
+            "line    3:",
+            "E121: Undefined variable: x",
+            "W10: Warning: Changing a readonly file",
+        ])
+        result = json.loads(mcp_tools._exec_get_messages(vim, {"severity": ["error"]}))
+        assert [m["text"] for m in result["messages"]] == [
+            "Error detected while processing function Foo:",
+            "line    3:",
+            "E121: Undefined variable: x",
+        ]
+        result = json.loads(mcp_tools._exec_get_messages(vim, {"severity": ["warning"]}))
+        assert [m["severity"] for m in result["messages"]] == ["warning"]
+
+    def test_dropped_when_cursor_older_than_ring(self, monkeypatch):
+        monkeypatch.setattr(mcp_tools, "_MESSAGE_RING", mcp_tools.collections.deque(maxlen=2))
+        vim = self._make_vim(["a", "b", "c"])
+        result = json.loads(mcp_tools._exec_get_messages(vim, {"since": 0}))
+        assert [m["text"] for m in result["messages"]] == ["b", "c"]
+        assert result["dropped"] is True
+
+
 class TestExecShowDiff:
     def test_file_mode(self):
         vim = MagicMock()
@@ -599,7 +997,10 @@ class TestExecShowDiff:
 
     def test_dispatches_via_execute_on_main_thread(self):
         vim = MagicMock()
-        vim.eval = lambda expr: expr.split("'")[1] if "fnameescape" in expr else "0"
+        vim.eval = lambda expr: (
+            ["0", "", "1000", {}] if expr == _TOOL_CONTEXT_EXPR
+            else expr.split("'")[1] if "fnameescape" in expr else "0"
+        )
         result = mcp_tools.execute_on_main_thread(vim, "show_diff", {
             "file_a": "/tmp/a.py",
             "file_b": "/tmp/b.py",
@@ -607,6 +1008,111 @@ class TestExecShowDiff:
         assert "Showing diff" in result
 
 
+class TestShowDiffBinary:
+    def test_file_mode_summarizes_binary_side(self, monkeypatch, tmp_path, main_thread):
+        text = tmp_path / "a.txt"
+        text.write_text("one\ntwo\n", encoding="utf-8")
+        binary = tmp_path / "b.png"
+        binary.write_bytes(b"\x89PNG\0\0" + b"x" * 100)
+        vim = MagicMock()
+        vim.eval = lambda expr: expr.split("'")[1] if "fnameescape" in expr else "0"
+        assigned = []
+        vim.current.buffer.__setitem__ = lambda self, key, value: assigned.append(value)
+        hashed_on = []
+        summarize = mcp_tools._binary_file_summary
+        monkeypatch.setattr(
+            mcp_tools, "_binary_file_summary",
+            lambda path: hashed_on.append(path) or summarize(path),
+        )
+        main_thread.reply = lambda func_name, args: hashed_on.append("main") or mcp_tools._exec_show_diff(vim, args)
+
+        result = mcp_tools._run_show_diff({"file_a": str(text), "file_b": str(binary)})
+
+        assert "binary content summarized" in result
+        # The files are read before the main-thread step, not in it.
+        assert hashed_on[-1] == "main" and len(hashed_on) == 3
+        commands = [c.args[0] for c in vim.command.call_args_list]
+        assert not any(c.startswith("edit ") or "diffsplit" in c for c in commands)
+        assert commands.count("diffthis") == 2
+        assert assigned[0] == ["one", "two"]
+        assert assigned[1][0] == f"Binary file not shown: {binary}"
+        assert assigned[1][1] == "Size: 106 bytes"
+
+    def test_file_mode_does_not_take_the_name_of_a_loaded_file(self, tmp_path):
+        from bench.fake_vim import FakeVim
+
+        text = tmp_path / "a.txt"
+        text.write_text("one\ntwo\n", encoding="utf-8")
+        binary = tmp_path / "b.png"
+        binary.write_bytes(b"\x89PNG\0\0" + b"x" * 100)
+        vim = FakeVim()
+        vim.add_buffer(str(text), ["one", "two"], show=True)
+        vim.add_buffer(str(binary), ["\x89PNG"])
+        args = {"file_a": str(text), "file_b": str(binary)}
+        args["file_sides"] = mcp_tools._binary_file_sides(str(text), str(binary))
+        # The second diff runs while the first one's tab is still open.
+        for _ in range(2):
+            assert "binary content summarized" in mcp_tools._exec_show_diff(vim, args)
+        names = [w.buffer.name for w in vim.all_windows()]
+        assert names.count(str(text)) == 1
+        assert len({n for n in names if n.startswith(str(binary) + " (binary, diff ")}) == 2
+
+    def test_oversized_binary_file_is_summarized_for_compute_diff(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(mcp_tools, "_MAX_GIT_OUTPUT_BYTES", 64)
+        binary = tmp_path / "b.png"
+        binary.write_bytes(b"\x89PNG\0\0" + b"x" * 100)
+        lines, error = mcp_tools._load_file_side(str(binary))
+        assert error is None
+        assert lines[:2] == [f"Binary file not shown: {binary}", "Size: 106 bytes"]
+        text = tmp_path / "a.txt"
+        text.write_text("x" * 100, encoding="utf-8")
+        assert "too large" in mcp_tools._load_file_side(str(text))[1]["error"]
+
+    def test_content_mode_summarizes_nul_content(self):
+        vim = MagicMock()
+        vim.eval = lambda expr: expr.split("'")[1] if "fnameescape" in expr else "0"
+        assigned = []
+        vim.current.buffer.__setitem__ = lambda self, key, value: assigned.append(value)
+        result = mcp_tools._exec_show_diff(vim, {
+            "content_a": "abc\0def", "content_b": "text", "filetype_a": "python",
+        })
+        assert "binary content summarized" in result
+        assert assigned[0][0] == "Binary file not shown: a"
+        assert assigned[1] == ["text"]
+        commands = [c.args[0] for c in vim.command.call_args_list]
+        assert "setlocal filetype=python" not in commands
+
+
+class TestGitDiffBinarySides:
+    def _load(self, monkeypatch, data, attrs=None):
+        monkeypatch.setattr(mcp_tools, "_git_show", lambda repo, ref, path: (data, False))
+        if attrs is None:
+            monkeypatch.setattr(mcp_tools.mcp_git, "attributes", _no_git_batch)
+        else:
+            monkeypatch.setattr(mcp_tools.mcp_git, "attributes", lambda repo, path: attrs)
+        return mcp_tools._load_git_diff_side("/repo", "HEAD", "img.png", "img.png", "ref_a")
+
+    def test_nul_byte_gives_summary(self, monkeypatch):
+        (lines, label, bare), error = self._load(monkeypatch, b"PNG\0data")
+        assert error is None
+        assert label == "img.png@HEAD (binary)"
+        assert lines[0] == "Binary file not shown: img.png@HEAD (binary)"
+        assert lines[1] == "Size: 8 bytes"
+        # git hash-object of b"PNG\0data"
+        assert lines[2] == "Blob: " + mcp_tools._git_blob_id(b"PNG\0data")
+
+    def test_binary_attribute_without_nul(self, monkeypatch):
+        attrs = {"binary": "set", "diff": "unset", "text": "unset"}
+        (lines, label, _), _ = self._load(monkeypatch, b"plain", attrs)
+        assert label.endswith("(binary)")
+
+    def test_diff_attribute_forces_text(self, monkeypatch):
+        attrs = {"binary": "unspecified", "diff": "set", "text": "unspecified"}
+        (lines, label, _), _ = self._load(monkeypatch, b"a\0b\n", attrs)
+        assert lines == ["a\0b"]
+        assert not label.endswith("(binary)")
+
+
 class TestEnhanceDiffopt:
     def test_adds_linematch_and_histogram_when_supported(self):
         vim = MagicMock()
@@ -796,6 +1302,234 @@ class TestSetQuickfixListRejectsRelativePath:
         assert "entries[1]" in result["error"]
 
 
+def _make_vim_for_get_list(items, title="", changedtick=1, names=None, list_id=1):
+    vim = MagicMock()
+    names = names or {}
+    eval_calls = []
+    item_fetches = []
+
+    def list_func(*args):
+        what = args[-1]
+        if "items" in what:
+            item_fetches.append(what)
+            return {"items": items}
+        return {"title": title, "size": len(items), "id": list_id, "changedtick": changedtick}
+
+    def eval_(expr):
+        eval_calls.append(expr)
+        if expr == "win_getid()":
+            return "1000"
+        if expr.startswith("map(["):
+            bufnrs = json.loads(expr[4:expr.index("]") + 1])
+            return [names.get(n, "") for n in bufnrs]
+        return "0"
+
+    vim.Function = lambda name: list_func
+    vim.eval = eval_
+    vim._eval_calls = eval_calls
+    vim._item_fetches = item_fetches
+    return vim
+
+
+class TestGetQuickfixList:
+    def _items(self, n, bufnr=2):
+        return [
+            {"bufnr": bufnr, "lnum": i + 1, "col": 1, "text": b"msg", "type": b"E"}
+            for i in range(n)
+        ]
+
+    def test_returns_all_entries_with_metadata(self):
+        vim = _make_vim_for_get_list(
+            self._items(2), title="lint", changedtick=7, names={2: "/tmp/a.py"},
+        )
+        result = json.loads(mcp_tools._exec_get_quickfix_list(vim, {}))
+        assert result["title"] == "lint"
+        assert result["size"] == 2
+        assert result["changedtick"] == 7
+        assert result["offset"] == 0
+        assert result["entries"][1] == {
+            "filename": "/tmp/a.py",
+            "line": 2,
+            "column": 1,
+            "text": "msg",
+            "type": "E",
+        }
+
+    def test_offset_and_limit(self):
+        vim = _make_vim_for_get_list(self._items(10), names={2: "/tmp/a.py"})
+        result = json.loads(mcp_tools._exec_get_quickfix_list(vim, {
+            "offset": 3,
+            "limit": 2,
+        }))
+        assert result["offset"] == 3
+        assert [e["line"] for e in result["entries"]] == [4, 5]
+
+    def test_offset_past_end_skips_item_fetch(self):
+        vim = _make_vim_for_get_list(self._items(3))
+        result = json.loads(mcp_tools._exec_get_quickfix_list(vim, {"offset": 5}))
+        assert result["entries"] == []
+        assert vim._item_fetches == []
+
+    def test_unchanged_changedtick_omits_entries(self):
+        vim = _make_vim_for_get_list(self._items(3), changedtick=4, list_id=3)
+        result = json.loads(mcp_tools._exec_get_quickfix_list(vim, {"changedtick": 4, "id": 3}))
+        assert result["unchanged"] is True
+        assert result["id"] == 3
+        assert "entries" not in result
+        assert vim._item_fetches == []
+
+    def test_replaced_list_with_the_same_changedtick_is_returned(self):
+        # :grep or setqflist([], ' ') makes a new list, which starts again
+        # at changedtick 1.
+        vim = _make_vim_for_get_list(self._items(3), changedtick=1, list_id=2)
+        result = json.loads(mcp_tools._exec_get_quickfix_list(vim, {"changedtick": 1, "id": 1}))
+        assert "unchanged" not in result
+        assert result["id"] == 2
+        assert len(result["entries"]) == 3
+
+    def test_changedtick_without_id_is_not_trusted(self):
+        vim = _make_vim_for_get_list(self._items(2), changedtick=4)
+        result = json.loads(mcp_tools._exec_get_quickfix_list(vim, {"changedtick": 4}))
+        assert "unchanged" not in result
+        assert len(result["entries"]) == 2
+
+    def test_location_list_of_another_window_is_returned(self):
+        vim = _make_vim_for_get_list(self._items(2), changedtick=4, list_id=3)
+        same = json.loads(mcp_tools._exec_get_location_list(vim, {"changedtick": 4, "id": 3, "winid": 1000}))
+        other = json.loads(mcp_tools._exec_get_location_list(vim, {"changedtick": 4, "id": 3, "winid": 1001}))
+        assert same["unchanged"] is True
+        assert same["winid"] == 1000
+        assert len(other["entries"]) == 2
+
+    def test_non_integer_changedtick_is_an_error(self):
+        vim = _make_vim_for_get_list(self._items(2))
+        result = mcp_tools._exec_get_quickfix_list(vim, {"changedtick": "x", "id": 1})
+        assert "must be integers" in result["error"]
+
+    def test_bufnames_resolved_in_bulk_and_cached(self):
+        items = self._items(3, bufnr=2) + self._items(2, bufnr=5)
+        vim = _make_vim_for_get_list(items, names={2: "/tmp/a.py", 5: "/tmp/b.py"})
+        result = json.loads(mcp_tools._exec_get_quickfix_list(vim, {}))
+        assert [e["filename"] for e in result["entries"]] == ["/tmp/a.py"] * 3 + ["/tmp/b.py"] * 2
+        assert vim._eval_calls == ["map([2, 5], 'bufname(v:val)')"]
+        mcp_tools._exec_get_quickfix_list(vim, {})
+        assert len(vim._eval_calls) == 1
+
+    def test_location_list_uses_current_window(self):
+        vim = MagicMock()
+        vim.Function.return_value.return_value = {"size": 0, "changedtick": 1, "title": ""}
+        vim.eval.return_value = "1000"
+        mcp_tools._exec_get_location_list(vim, {})
+        vim.Function.assert_called_with("getloclist")
+        assert vim.Function.return_value.call_args.args[0] == 0
+
+
+class TestSetListNative:
+    def test_quickfix_passes_native_objects(self):
+        vim = MagicMock()
+        mcp_tools._exec_set_quickfix_list(vim, {
+            "entries": [{"filename": "/tmp/a.py", "line": 2, "text": "x"}],
+            "title": "lint",
+        })
+        vim.Function.assert_called_once_with("setqflist")
+        vim.Function.return_value.assert_called_once_with(
+            [], "r", {
+                "items": [{"filename": "/tmp/a.py", "lnum": 2, "text": "x"}],
+                "title": "lint",
+            },
+        )
+        vim.eval.assert_not_called()
+
+    def test_quickfix_append(self):
+        vim = MagicMock()
+        result = mcp_tools._exec_set_quickfix_list(vim, {
+            "entries": [{"filename": "/tmp/a.py", "line": 2, "text": "x"}],
+            "append": True,
+        })
+        assert result == "Appended 1 quickfix entries"
+        args = vim.Function.return_value.call_args.args
+        assert args[1] == "a"
+        assert "title" not in args[2]
+
+    def test_location_list_passes_window_argument(self):
+        vim = MagicMock()
+        mcp_tools._exec_set_location_list(vim, {
+            "entries": [{"filename": "/tmp/a.py", "line": 2, "text": "x"}],
+        })
+        vim.Function.assert_called_once_with("setloclist")
+        args = vim.Function.return_value.call_args.args
+        assert args[:3] == (0, [], "r")
+
+    def test_falls_back_to_eval_without_function(self):
+        vim = MagicMock(spec=["eval", "command"])
+        mcp_tools._exec_set_quickfix_list(vim, {
+            "entries": [{"filename": "/tmp/a.py", "line": 2, "text": "x"}],
+        })
+        expr = vim.eval.call_args.args[0]
+        assert expr.startswith("setqflist([], 'r', {")
+        assert '"lnum": 2' in expr
+
+
+class TestRunSetQuickfixList:
+    def _entries(self, n):
+        return [{"filename": "/tmp/a.py", "line": i + 1, "text": "x"} for i in range(n)]
+
+    def test_small_list_is_single_request(self, main_thread):
+        args = {"entries": self._entries(3)}
+        mcp_tools._run_set_quickfix_list(args)
+        assert main_thread.calls == [("set_quickfix_list", args)]
+
+    def test_large_list_sent_in_chunks(self, monkeypatch, main_thread):
+        monkeypatch.setattr(mcp_tools, "_LIST_CHUNK_SIZE", 2)
+        main_thread.reply = {"id": 7}
+        result = mcp_tools._run_set_quickfix_list({
+            "entries": self._entries(5),
+            "title": "lint",
+            "open": True,
+        })
+        assert result == "Set 5 quickfix entries"
+        assert [c[0] for c in main_thread.calls] == ["_set_quickfix_items"] * 3
+        assert [c[1]["action"] for c in main_thread.calls] == ["r", "a", "a"]
+        assert [c[1]["title"] for c in main_thread.calls] == ["lint", "", ""]
+        assert [c[1]["open"] for c in main_thread.calls] == [False, False, True]
+        assert [len(c[1]["items"]) for c in main_thread.calls] == [2, 2, 1]
+        assert [c[1].get("id") for c in main_thread.calls] == [None, 7, 7]
+
+    def test_later_chunks_do_not_land_in_a_newer_list(self, monkeypatch, main_thread):
+        from bench.fake_vim import FakeVim
+
+        monkeypatch.setattr(mcp_tools, "_LIST_CHUNK_SIZE", 2)
+        vim = FakeVim()
+
+        def run(func_name, args):
+            if len(main_thread.calls) > 1:
+                # Someone runs :cexpr between two chunks.
+                mcp_tools._set_list(vim, "setqflist", [], [{"text": "other"}], " ")
+            return mcp_tools.execute_on_main_thread(vim, func_name, args)
+
+        main_thread.reply = run
+        result = mcp_tools._run_set_quickfix_list({"entries": self._entries(3)})
+        assert result == {"error": "The quickfix list being filled no longer exists"}
+        assert [item["text"] for item in vim.quickfix.items] == ["other"]
+
+    def test_large_list_append_never_replaces(self, monkeypatch, main_thread):
+        monkeypatch.setattr(mcp_tools, "_LIST_CHUNK_SIZE", 2)
+        main_thread.reply = {"id": 7}
+        mcp_tools._run_set_quickfix_list({
+            "entries": self._entries(3),
+            "append": True,
+        })
+        assert [c[1]["action"] for c in main_thread.calls] == ["a", "a"]
+
+    def test_large_list_validated_before_any_chunk(self, monkeypatch, main_thread):
+        monkeypatch.setattr(mcp_tools, "_LIST_CHUNK_SIZE", 2)
+        entries = self._entries(4)
+        entries[3]["filename"] = "rel.py"
+        result = mcp_tools._run_set_quickfix_list({"entries": entries})
+        assert "entries[3]" in result["error"]
+        assert main_thread.calls == []
+
+
 class TestSetLocationListRejectsRelativePath:
     def test_relative_filename_returns_error(self):
         vim = MagicMock()
@@ -827,11 +1561,15 @@ class _FakeCompletedProcess:
 
 def _make_vim_for_git_diff():
     vim = MagicMock()
-    state = {"lazyredraw": "0"}
+    state = {"lazyredraw": "0", "eventignore": "", "window": "1000", "overrides": {}}
 
     def eval_(expr):
         if expr == "&lazyredraw":
             return state["lazyredraw"]
+        if expr == _TOOL_CONTEXT_EXPR:
+            return [state["lazyredraw"], state["eventignore"], state["window"], state["overrides"]]
+        if expr == "win_getid()":
+            return state["window"]
         if expr == "&diffopt":
             return "internal,filler,closeoff,linematch:60,algorithm:histogram"
         if expr.startswith("has('"):
@@ -843,6 +1581,10 @@ def _make_vim_for_git_diff():
             state["lazyredraw"] = "1"
         elif cmd == "set nolazyredraw":
             state["lazyredraw"] = "0"
+        elif cmd.startswith("set eventignore+="):
+            state["eventignore"] = ",".join(filter(None, [state["eventignore"], cmd[len("set eventignore+="):]]))
+        elif cmd.startswith("let &eventignore = "):
+            state["eventignore"] = cmd.split("'")[1]
 
     vim.eval.side_effect = eval_
     vim.command.side_effect = command
@@ -851,8 +1593,15 @@ def _make_vim_for_git_diff():
     return vim
 
 
+def _no_git_batch(repo_root, spec):
+    raise mcp_tools.mcp_git.GitBatchError("disabled in tests")
+
+
 class TestExecShowGitDiff:
     def _patch_git(self, monkeypatch, repo_root, run_git_side_effect, repo_root_lookup=None):
+        monkeypatch.setattr(mcp_tools.mcp_git, "object_info", _no_git_batch)
+        monkeypatch.setattr(mcp_tools.mcp_git, "object_contents", _no_git_batch)
+        monkeypatch.setattr(mcp_tools.mcp_git, "attributes", _no_git_batch)
         if repo_root_lookup is None:
             monkeypatch.setattr(mcp_tools, "_git_repo_root", lambda path: repo_root)
         else:
@@ -1009,7 +1758,7 @@ class TestExecShowGitDiff:
             if args[:2] == ["cat-file", "-e"]:
                 return _FakeCompletedProcess(returncode=1)
             if args[0] == "diff":
-                return _FakeCompletedProcess(stdout=b"R100\told_name.py\tnew_name.py\n")
+                return _FakeCompletedProcess(stdout=b"R100\0old_name.py\0new_name.py\0")
             if args[0] == "show" and args[1] == "HEAD:old_name.py":
                 return _FakeCompletedProcess(stdout=b"original\n")
             if args[0] == "show":
@@ -1025,6 +1774,42 @@ class TestExecShowGitDiff:
         assert "new_name.py" in result
         assert "working tree" in result
 
+    def test_uses_batch_process_when_available(self, monkeypatch, tmp_path):
+        repo_root = str(tmp_path)
+        file_path = tmp_path / "foo.py"
+        file_path.write_text("worktree\n", encoding="utf-8")
+        monkeypatch.setattr(mcp_tools, "_git_repo_root", lambda path: repo_root)
+        monkeypatch.setattr(mcp_tools, "_run_git", MagicMock(side_effect=AssertionError))
+        specs = []
+
+        def info(repo, spec):
+            specs.append(("info", spec))
+            return ("abc", "blob", 5)
+
+        def contents(repo, spec):
+            specs.append(("contents", spec))
+            return ("abc", "blob", 5, b"head\n")
+
+        monkeypatch.setattr(mcp_tools.mcp_git, "object_info", info)
+        monkeypatch.setattr(mcp_tools.mcp_git, "object_contents", contents)
+
+        vim = _make_vim_for_git_diff()
+        result = mcp_tools._exec_show_git_diff(vim, {"path": str(file_path)})
+
+        assert "foo.py@HEAD" in result
+        assert ("contents", "HEAD:foo.py") in specs
+
+    def test_batch_rejects_oversized_blob_without_reading(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(
+            mcp_tools.mcp_git, "object_info",
+            lambda repo, spec: ("abc", "blob", mcp_tools._MAX_GIT_OUTPUT_BYTES + 1),
+        )
+        monkeypatch.setattr(
+            mcp_tools.mcp_git, "object_contents",
+            MagicMock(side_effect=AssertionError),
+        )
+        assert mcp_tools._git_show(str(tmp_path), "HEAD", "big.bin") == (None, False)
+
     def test_path_not_in_repo(self, monkeypatch, tmp_path):
         monkeypatch.setattr(mcp_tools, "_git_repo_root", lambda path: None)
         file_path = tmp_path / "x.py"
@@ -1086,16 +1871,22 @@ class TestExecShowGitDiff:
         self._patch_git(monkeypatch, repo_root, fake_run)
 
         vim = _make_vim_for_git_diff()
+        base_eval = vim.eval.side_effect
+        vim.eval.side_effect = lambda expr: "python" if expr == "&filetype" else base_eval(expr)
         mcp_tools._exec_show_git_diff(vim, {"path": str(file_path)})
 
         commands = [c.args[0] for c in vim.command.call_args_list]
         buffer_setup_cmds = [c for c in commands if c.startswith("enew | ")]
         assert len(buffer_setup_cmds) == 2
-        for cmd in buffer_setup_cmds:
-            assert "file foo.py |" in cmd
-            assert "filetype detect" in cmd
-
-    def test_filetype_detect_always_issued_regardless_of_extension(
+        assert "file foo.py |" in buffer_setup_cmds[0]
+        assert "filetype detect" in buffer_setup_cmds[0]
+        # The second side has the same name, so its filetype comes from
+        # the cache without renaming the buffer.
+        assert "file foo.py |" not in buffer_setup_cmds[1]
+        assert "filetype detect" not in buffer_setup_cmds[1]
+        assert buffer_setup_cmds[1].endswith(" | setlocal filetype=python")
+
+    def test_unknown_filetype_is_cached_too(
         self, monkeypatch, tmp_path
     ):
         repo_root = str(tmp_path)
@@ -1112,14 +1903,17 @@ class TestExecShowGitDiff:
         self._patch_git(monkeypatch, repo_root, fake_run)
 
         vim = _make_vim_for_git_diff()
+        base_eval = vim.eval.side_effect
+        vim.eval.side_effect = lambda expr: "" if expr == "&filetype" else base_eval(expr)
         mcp_tools._exec_show_git_diff(vim, {"path": str(file_path)})
 
         commands = [c.args[0] for c in vim.command.call_args_list]
         buffer_setup_cmds = [c for c in commands if c.startswith("enew | ")]
         assert len(buffer_setup_cmds) == 2
-        for cmd in buffer_setup_cmds:
-            assert "filetype detect" in cmd
+        assert "filetype detect" in buffer_setup_cmds[0]
+        assert "filetype detect" not in buffer_setup_cmds[1]
         assert not any("setlocal filetype=" in c for c in commands)
+        assert mcp_tools._FILETYPE_CACHE == {"foo.xyz": ""}
 
     def test_filetype_detect_uses_per_side_basename_on_rename(
         self, monkeypatch, tmp_path
@@ -1133,7 +1927,7 @@ class TestExecShowGitDiff:
                 return _FakeCompletedProcess(returncode=1)
             if args[0] == "diff":
                 return _FakeCompletedProcess(
-                    stdout=b"R100\told_name.py\tnew_name.rs\n"
+                    stdout=b"R100\0old_name.py\0new_name.rs\0"
                 )
             if args[0] == "show" and args[1] == "HEAD:old_name.py":
                 return _FakeCompletedProcess(stdout=b"original\n")
@@ -1159,13 +1953,11 @@ class TestExecShowGitDiff:
         file_path = tmp_path / "huge.py"
         file_path.write_text("x", encoding="utf-8")
 
-        big = b"x" * (mcp_tools._MAX_GIT_OUTPUT_BYTES + 1)
-
         def fake_run(repo, args):
             if args[:2] == ["cat-file", "-e"]:
                 return _FakeCompletedProcess(returncode=0)
             if args[0] == "show":
-                return _FakeCompletedProcess(stdout=big)
+                raise mcp_tools._GitOutputTooLarge("git show")
             return _FakeCompletedProcess(returncode=1)
 
         self._patch_git(monkeypatch, repo_root, fake_run)
@@ -1190,12 +1982,13 @@ class TestExecShowGitDiff:
 
         vim = _make_vim_for_git_diff()
         vim._state["lazyredraw"] = "0"
-        mcp_tools._exec_show_git_diff(vim, {"path": str(file_path)})
+        mcp_tools.execute_on_main_thread(vim, "show_git_diff", {"path": str(file_path)})
         assert vim._state["lazyredraw"] == "0"
+        assert "set lazyredraw" in [c.args[0] for c in vim.command.call_args_list]
 
         vim2 = _make_vim_for_git_diff()
         vim2._state["lazyredraw"] = "1"
-        mcp_tools._exec_show_git_diff(vim2, {"path": str(file_path)})
+        mcp_tools.execute_on_main_thread(vim2, "show_git_diff", {"path": str(file_path)})
         assert vim2._state["lazyredraw"] == "1"
 
     def test_label_escaping_spaces_and_specials(self, monkeypatch, tmp_path):
@@ -1281,3 +2074,858 @@ class TestExecShowGitDiff:
             "path": str(file_path),
         })
         assert "Showing git diff" in result
+
+
+class TestShowGitDiffAllFiles:
+    def _patch(self, monkeypatch, main_thread, repo_root, name_status, shows=None):
+        calls = {"git": []}
+
+        def fake_run(repo, args):
+            calls["git"].append(args)
+            if "--name-status" in args:
+                return _FakeCompletedProcess(stdout=name_status)
+            return _FakeCompletedProcess(returncode=1)
+
+        def fake_show(repo, ref, rel_path):
+            return (shows or {}).get((ref, rel_path), (f"{rel_path}@{ref}\n".encode("utf-8"), False))
+
+        monkeypatch.setattr(mcp_tools, "_git_repo_root", lambda path: repo_root)
+        monkeypatch.setattr(mcp_tools, "_run_git", fake_run)
+        monkeypatch.setattr(mcp_tools, "_git_show", fake_show)
+        monkeypatch.setattr(mcp_tools.mcp_git, "attributes", _no_git_batch)
+        return calls
+
+    def test_single_file_goes_to_main_thread(self, monkeypatch, tmp_path, main_thread):
+        calls = self._patch(monkeypatch, main_thread, str(tmp_path), b"")
+        result = mcp_tools.call_tool("show_git_diff", {"path": str(tmp_path / "a.py")})
+        assert result == "ok"
+        assert main_thread.calls[0][0] == "show_git_diff"
+        assert calls["git"] == []
+
+    def test_lists_changes_once_and_stores_sides(self, monkeypatch, tmp_path, main_thread):
+        name_status = b"M\0a.py\0A\0new.py\0D\0old.py\0R087\0before.py\0after.py\0"
+        calls = self._patch(monkeypatch, main_thread, str(tmp_path), name_status)
+
+        result = mcp_tools.call_tool("show_git_diff", {
+            "path": str(tmp_path), "all_files": True, "staged": True,
+        })
+
+        assert calls["git"] == [["diff", "--name-status", "-z", "-M", "--cached", "HEAD", "--"]]
+        assert "Showing git diff of 4 files" in result
+        assert "R before.py -> after.py" in result
+
+        func_name, args = main_thread.calls[0]
+        assert func_name == "_open_lazy_git_diffs"
+        labels = [d["label"] for d in args["diffs"]]
+        assert labels == ["a.py", "new.py", "old.py", "before.py -> after.py"]
+
+        sides = [mcp_tools._LAZY_DIFFS[d["id"]][:2] for d in args["diffs"]]
+        added_a, added_b = sides[1]
+        assert added_a[0] == [""]
+        assert "(missing)" in added_a[1]
+        assert added_b[0] == ["new.py@:0:"]
+        deleted_a, deleted_b = sides[2]
+        assert deleted_a[0] == ["old.py@HEAD"]
+        assert "(missing)" in deleted_b[1]
+        renamed_a, renamed_b = sides[3]
+        assert renamed_a[1] == "before.py@HEAD"
+        assert renamed_b[1] == "after.py@index"
+
+    def test_diff_args_for_ref_combinations(self):
+        assert mcp_tools._git_diff_name_args(":0:", "") == ["diff"]
+        assert mcp_tools._git_diff_name_args("HEAD", "") == ["diff", "HEAD"]
+        assert mcp_tools._git_diff_name_args("HEAD", ":0:") == ["diff", "--cached", "HEAD"]
+        assert mcp_tools._git_diff_name_args("v1", "v2") == ["diff", "v1", "v2"]
+        assert mcp_tools._git_diff_name_args("", "HEAD") is None
+
+    def test_unsupported_ref_combination(self, monkeypatch, tmp_path, main_thread):
+        self._patch(monkeypatch, main_thread, str(tmp_path), b"")
+        result = mcp_tools.call_tool("show_git_diff", {
+            "path": str(tmp_path), "all_files": True, "ref_a": "", "ref_b": "HEAD",
+        })
+        assert "error" in result
+
+    def test_max_files_truncates(self, monkeypatch, tmp_path, main_thread):
+        name_status = b"".join(b"M\0f%d.py\0" % i for i in range(5))
+        calls = self._patch(monkeypatch, main_thread, str(tmp_path), name_status)
+        result = mcp_tools.call_tool("show_git_diff", {
+            "path": str(tmp_path), "all_files": True, "unstaged": True, "max_files": 2,
+        })
+        assert calls["git"][0][:5] == ["diff", "--name-status", "-z", "-M", "--"]
+        assert len(main_thread.calls[0][1]["diffs"]) == 2
+        assert "3 more changed files not shown" in result
+
+    def test_no_changes(self, monkeypatch, tmp_path, main_thread):
+        self._patch(monkeypatch, main_thread, str(tmp_path), b"")
+        result = mcp_tools.call_tool("show_git_diff", {"path": str(tmp_path), "all_files": True})
+        assert "No changes" in result
+        assert main_thread.calls == []
+
+    def test_unresolvable_ref_is_named(self, monkeypatch, tmp_path, main_thread):
+        self._patch(monkeypatch, main_thread, str(tmp_path), b"")
+
+        def fake_run(repo, args):
+            if args[0] == "rev-parse":
+                return _FakeCompletedProcess(returncode=0 if args[-1] == "HEAD^{commit}" else 1)
+            return _FakeCompletedProcess(returncode=128)
+
+        monkeypatch.setattr(mcp_tools, "_run_git", fake_run)
+        result = mcp_tools.call_tool("show_git_diff", {
+            "path": str(tmp_path), "all_files": True, "ref_a": "HEAD", "ref_b": "nope",
+        })
+        assert result == {"error": "ref_b could not be resolved: nope"}
+        assert main_thread.calls == []
+
+    def test_reversed_refs_are_explained(self, monkeypatch, tmp_path, main_thread):
+        calls = self._patch(monkeypatch, main_thread, str(tmp_path), b"")
+        result = mcp_tools.call_tool("show_git_diff", {
+            "path": str(tmp_path), "all_files": True, "ref_a": "", "ref_b": "HEAD",
+        })
+        assert "ref_a must not come after ref_b" in result["error"]
+        assert calls["git"] == []
+
+    def test_staged_and_unstaged_rejected(self, tmp_path):
+        result = mcp_tools.call_tool("show_git_diff", {
+            "path": str(tmp_path), "all_files": True, "staged": True, "unstaged": True,
+        })
+        assert "error" in result
+
+    def test_fill_lazy_tab_once(self):
+        side_a = (["a"], "x.py@HEAD", "x.py")
+        side_b = (["b"], "x.py@working tree", "x.py")
+        diff_id = mcp_tools._store_lazy_diff(side_a, side_b)
+
+        vim = _make_vim_for_git_diff()
+        tab_vars = {"id": diff_id}
+        base_eval = vim.eval.side_effect
+
+        def eval_(expr):
+            if expr == "get(t:, 'mcp_diff_id', '')":
+                return tab_vars.get("id", "")
+            return base_eval(expr)
+
+        vim.eval.side_effect = eval_
+
+        mcp_tools.fill_lazy_diff_tab(vim)
+        commands = [c.args[0] for c in vim.command.call_args_list]
+        assert "unlet t:mcp_diff_id" in commands
+        assert "vnew" in commands
+        assert sum(1 for c in commands if c.startswith("enew | ")) == 2
+        assert vim._state["lazyredraw"] == "0"
+
+        vim.command.reset_mock()
+        mcp_tools.fill_lazy_diff_tab(vim)
+        assert diff_id not in mcp_tools._LAZY_DIFFS
+        assert "vnew" not in [c.args[0] for c in vim.command.call_args_list]
+
+    def test_store_is_bounded_by_bytes(self, monkeypatch):
+        monkeypatch.setattr(mcp_tools, "_MAX_LAZY_DIFF_BYTES", 100)
+        side = lambda n: (["x" * 24], f"{n}@HEAD", n)
+        ids = [mcp_tools._store_lazy_diff(side(n), side(n)) for n in ("a", "b", "c")]
+        assert list(mcp_tools._LAZY_DIFFS) == ids[1:]
+        big = mcp_tools._store_lazy_diff((["x" * 200], "d@HEAD", "d"), side("d"))
+        assert list(mcp_tools._LAZY_DIFFS) == [big]
+
+    def test_evicted_tab_says_the_diff_is_gone(self):
+        vim = _make_vim_for_git_diff()
+        base_eval = vim.eval.side_effect
+        vim.eval.side_effect = lambda e: "0123abcd" if e == "get(t:, 'mcp_diff_id', '')" else base_eval(e)
+
+        mcp_tools.fill_lazy_diff_tab(vim)
+
+        commands = [c.args[0] for c in vim.command.call_args_list]
+        assert "vnew" not in commands
+        assert commands[-1] == "setlocal nomodifiable"
+        lines = vim.current.buffer.__setitem__.call_args.args[1]
+        assert "no longer available" in lines[0]
+
+    def test_closing_a_tab_drops_its_diff(self):
+        side = (["a"], "x.py@HEAD", "x.py")
+        pending, kept, closed = (mcp_tools._store_lazy_diff(side, side) for _ in range(3))
+        for diff_id in (kept, closed):
+            mcp_tools._LAZY_DIFFS[diff_id][3] = True
+        vim = MagicMock()
+        vim.eval.return_value = ["", kept]
+
+        mcp_tools.drop_closed_lazy_diffs(vim)
+
+        assert list(mcp_tools._LAZY_DIFFS) == [pending, kept]
+
+    def test_failed_open_drops_stored_sides(self, monkeypatch, tmp_path, main_thread):
+        self._patch(monkeypatch, main_thread, str(tmp_path), b"M\0a.py\0")
+        main_thread.reply = {"error": "timed out"}
+        result = mcp_tools.call_tool("show_git_diff", {"path": str(tmp_path), "all_files": True})
+        assert result == {"error": "timed out"}
+        assert not mcp_tools._LAZY_DIFFS
+
+    def test_open_lazy_tabs_fills_first(self):
+        ids = [
+            mcp_tools._store_lazy_diff(([""], f"{n}@HEAD", n), ([""], f"{n}@index", n))
+            for n in ("a.py", "b.py")
+        ]
+        vim = _make_vim_for_git_diff()
+        current = {"tab": 1, "vars": {}}
+        base_eval = vim.eval.side_effect
+        base_command = vim.command.side_effect
+
+        def eval_(expr):
+            if expr == "tabpagenr()":
+                return str(current["tab"])
+            if expr == "get(t:, 'mcp_diff_id', '')":
+                return current["vars"].get(current["tab"], "")
+            return base_eval(expr)
+
+        def command(cmd):
+            if cmd == "tabnew":
+                current["tab"] += 1
+            elif cmd.startswith("tabnext "):
+                current["tab"] = int(cmd.split()[1])
+            elif cmd.startswith("let t:mcp_diff_id = "):
+                current["vars"][current["tab"]] = cmd.split("'")[1]
+            elif cmd == "unlet t:mcp_diff_id":
+                current["vars"].pop(current["tab"])
+            base_command(cmd)
+
+        vim.eval.side_effect = eval_
+        vim.command.side_effect = command
+
+        result = mcp_tools.execute_on_main_thread(vim, "_open_lazy_git_diffs", {
+            "diffs": [{"id": i, "label": n, "sizes": [3, 3]} for i, n in zip(ids, ("a.py", "b.py"))],
+        })
+
+        assert result == {"large": []}
+        assert current["tab"] == 2
+        assert ids[0] not in mcp_tools._LAZY_DIFFS
+        assert ids[1] in mcp_tools._LAZY_DIFFS
+        assert current["vars"] == {3: ids[1]}
+        assert mcp_tools._LAZY_DIFFS[ids[1]][3]
+
+
+class TestCappedGitReads:
+    @pytest.fixture
+    def repo(self, tmp_path):
+        def git(*args):
+            subprocess.run(
+                ["git", "-c", "user.name=t", "-c", "user.email=t@example.com"] + list(args),
+                cwd=tmp_path, check=True, capture_output=True,
+            )
+
+        git("init", "-q")
+        (tmp_path / "big.txt").write_bytes(b"x" * 200000)
+        git("add", "big.txt")
+        git("commit", "-q", "-m", "init")
+        return str(tmp_path)
+
+    def test_run_git_collects_output(self, repo):
+        result = mcp_tools._run_git(repo, ["show", "HEAD:big.txt"])
+        assert result.returncode == 0
+        assert len(result.stdout) == 200000
+
+    def test_run_git_stops_at_cap(self, repo, monkeypatch):
+        monkeypatch.setattr(mcp_tools, "_MAX_GIT_OUTPUT_BYTES", 1000)
+        with pytest.raises(mcp_tools._GitOutputTooLarge):
+            mcp_tools._run_git(repo, ["show", "HEAD:big.txt"])
+
+    def test_run_git_keeps_stderr(self, repo):
+        result = mcp_tools._run_git(repo, ["show", "HEAD:nope.txt"])
+        assert result.returncode != 0
+        assert b"nope.txt" in result.stderr
+
+    def test_oversized_binary_blob_is_summarized_from_its_head(self, repo, monkeypatch):
+        data = b"\x89PNG\0" + b"x" * 5000
+        with open(f"{repo}/img.png", "wb") as f:
+            f.write(data)
+        subprocess.run(["git", "add", "img.png"], cwd=repo, check=True)
+        subprocess.run(
+            ["git", "-c", "user.name=t", "-c", "user.email=t@example.com", "commit", "-q", "-m", "img"],
+            cwd=repo, check=True,
+        )
+        blob_id = subprocess.run(
+            ["git", "rev-parse", "HEAD:img.png"], cwd=repo, check=True, capture_output=True, text=True,
+        ).stdout.strip()
+        monkeypatch.setattr(mcp_tools, "_MAX_GIT_OUTPUT_BYTES", 1000)
+        for ref in ("HEAD", ":0:", ""):
+            (lines, label, _), error = mcp_tools._load_git_diff_side(repo, ref, "img.png", "img.png", "ref_a")
+            assert error is None
+            assert label.endswith("(binary)")
+            assert lines[1:] == [f"Size: {len(data)} bytes", f"Blob: {blob_id}"]
+        _, error = mcp_tools._load_git_diff_side(repo, "HEAD", "big.txt", "big.txt", "ref_a")
+        assert "too large" in error["error"]
+
+    def test_read_worktree_cap(self, repo, monkeypatch):
+        monkeypatch.setattr(mcp_tools, "_MAX_GIT_OUTPUT_BYTES", 1000)
+        assert mcp_tools._read_worktree(repo, "big.txt") == (None, False)
+        assert mcp_tools._read_worktree(repo, "missing.txt") == (b"", True)
+
+
+class TestRunComputeDiff:
+    def test_content_unified(self):
+        result = mcp_tools.call_tool("compute_diff", {
+            "content_a": "one\ntwo\nthree\n",
+            "content_b": "one\n2\nthree\n",
+        })
+        assert result == "--- a\n+++ b\n@@ -1,3 +1,3 @@\n one\n-two\n+2\n three"
+
+    def test_files_as_hunks_without_vim(self, tmp_path, monkeypatch):
+        file_a = tmp_path / "a.txt"
+        file_b = tmp_path / "b.txt"
+        file_a.write_text("x\ny\n", encoding="utf-8")
+        file_b.write_text("x\nz\n", encoding="utf-8")
+        monkeypatch.setattr(mcp_tools, "_submit_to_main_thread", lambda *a: pytest.fail("used Vim"))
+
+        result = json.loads(mcp_tools.call_tool("compute_diff", {
+            "file_a": str(file_a), "file_b": str(file_b), "format": "hunks", "context": 0,
+        }))
+
+        assert result["label_a"] == str(file_a)
+        assert result["hunks"] == [{
+            "old_start": 2, "old_lines": 1, "new_start": 2, "new_lines": 1, "lines": ["-y", "+z"],
+        }]
+
+    def test_buffer_side_uses_one_main_thread_call(self, main_thread):
+        main_thread.reply = {7: {"name": "/tmp/x.py", "lines": ["a", "b"]}}
+        result = mcp_tools.call_tool("compute_diff", {"buffer_a": 7, "content_b": "a\nc"})
+        assert main_thread.calls == [("_buffer_lines", {"buffers": [7]})]
+        assert result.startswith("--- /tmp/x.py\n+++ b\n")
+
+    def test_identical(self):
+        result = mcp_tools.call_tool("compute_diff", {"content_a": "a", "content_b": "a"})
+        assert result == "No differences between a and b"
+
+    def test_result_cache_keyed_by_content(self, monkeypatch):
+        calls = []
+        real = mcp_tools.mcp_diff.opcodes
+        monkeypatch.setattr(mcp_tools.mcp_diff, "opcodes", lambda a, b: calls.append(1) or real(a, b))
+        for label in ("first", "second"):
+            mcp_tools.call_tool("compute_diff", {"content_a": "a", "content_b": "b", "label_a": label})
+        assert len(calls) == 1
+
+    def test_missing_side(self):
+        result = mcp_tools.call_tool("compute_diff", {"content_a": "a"})
+        assert "content_b" in result["error"]
+
+    def test_path_conflicts_with_sides(self, tmp_path):
+        result = mcp_tools.call_tool("compute_diff", {"path": str(tmp_path / "a"), "content_a": "x"})
+        assert "error" in result
+
+    def test_git_sides(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(mcp_tools, "_git_repo_root", lambda path: str(tmp_path))
+        monkeypatch.setattr(mcp_tools, "_resolve_path_at_ref", lambda repo, ref, rel: rel)
+        monkeypatch.setattr(mcp_tools, "_git_show", lambda repo, ref, rel: (b"old\n" if ref == "HEAD" else b"new\n", False))
+        monkeypatch.setattr(mcp_tools.mcp_git, "attributes", _no_git_batch)
+        result = mcp_tools.call_tool("compute_diff", {"path": str(tmp_path / "f.py")})
+        assert result == "--- f.py@HEAD\n+++ f.py@working tree\n@@ -1 +1 @@\n-old\n+new"
+
+
+class TestExecBufferLines:
+    def test_reads_and_caches_by_changedtick(self):
+        vim = MagicMock()
+        vim.eval.return_value = [["1", "/tmp/a.py", "5"]]
+        buf = MagicMock()
+        buf.__getitem__.return_value = ["x", "y"]
+        vim.buffers = {3: buf}
+
+        first = mcp_tools._exec_buffer_lines(vim, {"buffers": [3]})
+        second = mcp_tools._exec_buffer_lines(vim, {"buffers": [3]})
+
+        assert first == {3: {"name": "/tmp/a.py", "lines": ["x", "y"]}}
+        assert second == first
+        assert buf.__getitem__.call_count == 1
+
+    def test_unloaded_buffer(self):
+        vim = MagicMock()
+        vim.eval.return_value = [["0", "", ""]]
+        assert "error" in mcp_tools._exec_buffer_lines(vim, {"buffers": [9]})
+
+
+def _make_vim_for_reuse(reuse_tabs=(), visible=(3, 4), filetypes=None, keys=None, names=None):
+    vim = _make_vim_for_git_diff()
+    state = {"current": None, "ft": dict(filetypes or {}), "keys": dict(keys or {}), "names": dict(names or {})}
+    base_eval = vim.eval.side_effect
+    base_command = vim.command.side_effect
+
+    def eval_(expr):
+        if expr.startswith("filter(range(1, tabpagenr('$'))"):
+            return [str(t) for t in reuse_tabs]
+        if expr == "get(t:, 'mcp_diff_bufs', [])":
+            return ["3", "4"]
+        if expr.startswith("bufwinnr("):
+            return "1" if int(expr[9:-1]) in visible else "-1"
+        if expr == "get(b:, 'mcp_diff_detect_key', '')":
+            return state["keys"].get(state["current"], "")
+        if expr == "&filetype":
+            return state["ft"].get(state["current"], "")
+        if expr == "bufname('%')":
+            return state["names"].get(state["current"], "")
+        return base_eval(expr)
+
+    def command(cmd):
+        if cmd.startswith("execute bufwinnr("):
+            state["current"] = int(cmd[len("execute bufwinnr("):].split(")")[0])
+        elif cmd.startswith("setlocal filetype="):
+            state["ft"][state["current"]] = cmd.split("=", 1)[1]
+        base_command(cmd)
+
+    vim.eval.side_effect = eval_
+    vim.command.side_effect = command
+    vim.buffers = {3: MagicMock(), 4: MagicMock()}
+    return vim
+
+
+class TestDiffTabReuse:
+    def test_show_diff_first_call_marks_new_tab(self):
+        vim = _make_vim_for_reuse()
+        base = vim.eval.side_effect
+        vim.eval.side_effect = lambda expr: expr.split("'")[1] if "fnameescape" in expr else base(expr)
+        result = mcp_tools._exec_show_diff(vim, {"content_a": "x", "content_b": "y", "reuse_tab": True})
+        commands = [c.args[0] for c in vim.command.call_args_list]
+        assert "in new tab" in result
+        assert "tabnew" in commands
+        assert any(c.startswith("let t:mcp_diff_reuse = 1") for c in commands)
+
+    def test_show_diff_replaces_content_in_place(self):
+        vim = _make_vim_for_reuse(reuse_tabs=[2], filetypes={3: "python", 4: ""}, names={3: "a", 4: "b"})
+        result = mcp_tools._exec_show_diff(vim, {
+            "content_a": "x\ny", "content_b": "z", "filetype_a": "python", "filetype_b": "python",
+            "label_a": "a", "label_b": "b", "reuse_tab": True,
+        })
+        commands = [c.args[0] for c in vim.command.call_args_list]
+        assert "in reused tab" in result
+        assert "tabnext 2" in commands
+        assert "tabnew" not in commands and "enew" not in commands and "vnew" not in commands
+        assert [c for c in commands if c.startswith("setlocal filetype=")] == ["setlocal filetype=python"]
+        assert not any("file " in c for c in commands)
+        assert "diffupdate" in commands
+        vim.buffers[3].__setitem__.assert_called_once_with(slice(None), ["x", "y"])
+
+    def test_git_reuse_skips_detection_for_same_name(self):
+        vim = _make_vim_for_reuse(reuse_tabs=[1], keys={3: "x.py", 4: "x.py"})
+        mcp_tools._reuse_git_diff_tab(vim, (["a"], "x.py@HEAD", "x.py"), (["b"], "x.py@working tree", "x.py"))
+        commands = [c.args[0] for c in vim.command.call_args_list]
+        assert not any("filetype detect" in c for c in commands)
+        assert "keepalt file x.py@HEAD" in commands
+
+    def test_git_reuse_detects_when_extension_changes(self):
+        vim = _make_vim_for_reuse(reuse_tabs=[1], keys={3: "x.py", 4: "x.py"})
+        mcp_tools._reuse_git_diff_tab(vim, (["a"], "y.rs@HEAD", "y.rs"), (["b"], "y.rs@working tree", "y.rs"))
+        commands = [c.args[0] for c in vim.command.call_args_list]
+        assert commands.count("keepalt file y.rs | filetype detect") == 1
+        assert "let b:mcp_diff_detect_key = 'y.rs'" in commands
+
+    def test_git_reuse_detects_when_only_the_name_changes(self):
+        vim = _make_vim_for_reuse(reuse_tabs=[1], keys={3: "notes.txt", 4: "notes.txt"})
+        mcp_tools._reuse_git_diff_tab(
+            vim, (["a"], "CMakeLists.txt@HEAD", "CMakeLists.txt"), (["b"], "CMakeLists.txt", "CMakeLists.txt"),
+        )
+        commands = [c.args[0] for c in vim.command.call_args_list]
+        assert commands.count("keepalt file CMakeLists.txt | filetype detect") == 1
+        assert "let b:mcp_diff_detect_key = 'CMakeLists.txt'" in commands
+
+    def test_rearranged_tab_is_abandoned(self):
+        vim = _make_vim_for_reuse(reuse_tabs=[1], visible=(3,))
+        result = mcp_tools._reuse_git_diff_tab(vim, (["a"], "x.py@HEAD", "x.py"), (["b"], "x.py", "x.py"))
+        commands = [c.args[0] for c in vim.command.call_args_list]
+        assert result == "new"
+        assert "unlet! t:mcp_diff_reuse t:mcp_diff_bufs" in commands
+        assert "tabnew" in commands
+
+
+def _make_vim_for_large(threshold, diffopt="internal,filler,closeoff,linematch:60,algorithm:histogram"):
+    vim = _make_vim_for_reuse()
+    state = {"diffopt": diffopt, "eventignore": ""}
+    base_eval = vim.eval.side_effect
+    base_command = vim.command.side_effect
+
+    def eval_(expr):
+        if expr.startswith("get(g:, 'mcp_server_large_diff_bytes'"):
+            return str(threshold)
+        if expr == "&diffopt":
+            return state["diffopt"]
+        if expr == "&eventignore":
+            return state["eventignore"]
+        if "fnameescape" in expr:
+            return expr.split("'")[1]
+        return base_eval(expr)
+
+    def command(cmd):
+        if cmd.startswith("set diffopt-="):
+            items = state["diffopt"].split(",")
+            state["diffopt"] = ",".join(i for i in items if i != cmd[len("set diffopt-="):])
+        elif cmd.startswith("set diffopt+="):
+            state["diffopt"] += "," + cmd[len("set diffopt+="):]
+        elif cmd == "set eventignore=all":
+            state["eventignore"] = "all"
+        elif cmd.startswith("let &eventignore = "):
+            state["eventignore"] = cmd.split("'")[1]
+        base_command(cmd)
+
+    vim.eval.side_effect = eval_
+    vim.command.side_effect = command
+    vim._large_state = state
+    return vim
+
+
+class TestLargeContentMode:
+    def test_show_diff_above_threshold_uses_large_mode(self):
+        vim = _make_vim_for_large(10)
+        result = mcp_tools._exec_show_diff(vim, {
+            "content_a": "x" * 20, "content_b": "y", "filetype_a": "python", "filetype_b": "python",
+        })
+        commands = [c.args[0] for c in vim.command.call_args_list]
+        assert result.endswith("(large-content mode)")
+        assert commands.index("set eventignore=all") < commands.index("diffthis")
+        assert commands[-1] == "let &eventignore = ''"
+        assert commands.count("setlocal buftype=nofile bufhidden=wipe noswapfile syntax=OFF synmaxcol=200") == 2
+        assert not any(c.startswith("setlocal filetype=") for c in commands)
+        assert commands.count("setlocal foldmethod=manual nofoldenable | let w:mcp_diff_large = 1") == 2
+        assert "linematch" not in vim._large_state["diffopt"]
+
+    def test_show_diff_below_threshold_is_unchanged(self):
+        vim = _make_vim_for_large(100)
+        result = mcp_tools._exec_show_diff(vim, {"content_a": "x" * 20, "content_b": "y", "filetype_a": "python"})
+        commands = [c.args[0] for c in vim.command.call_args_list]
+        assert "large-content mode" not in result
+        assert "set eventignore=all" not in commands
+        assert "setlocal filetype=python" in commands
+
+    def test_zero_threshold_disables_large_mode(self):
+        vim = _make_vim_for_large(0)
+        result = mcp_tools._exec_show_diff(vim, {"content_a": "x" * 20, "content_b": "y"})
+        assert "large-content mode" not in result
+
+    def test_linematch_is_restored_after_large_diff(self):
+        vim = _make_vim_for_large(10, diffopt="internal,filler,linematch:40,algorithm:histogram")
+        mcp_tools._enhance_diffopt(vim, large=True)
+        assert vim._large_state["diffopt"] == "internal,filler,algorithm:histogram"
+        mcp_tools._enhance_diffopt(vim)
+        assert vim._large_state["diffopt"] == "internal,filler,algorithm:histogram,linematch:40"
+
+    def test_linematch_is_restored_when_the_last_large_tab_closes(self):
+        vim = _make_vim_for_large(10, diffopt="internal,filler,linematch:40,algorithm:patience")
+        large_windows = {"count": 1}
+        base_eval = vim.eval.side_effect
+        window_expr = "len(filter(getwininfo(), 'get(v:val.variables, \"mcp_diff_large\", 0)'))"
+        vim.eval.side_effect = lambda e: str(large_windows["count"]) if e == window_expr else base_eval(e)
+
+        mcp_tools._enhance_diffopt(vim, large=True)
+        mcp_tools.restore_diffopt(vim)
+        assert vim._large_state["diffopt"] == "internal,filler,algorithm:patience"
+
+        large_windows["count"] = 0
+        mcp_tools.restore_diffopt(vim)
+        assert vim._large_state["diffopt"] == "internal,filler,algorithm:patience,linematch:40"
+        vim.command.reset_mock()
+        mcp_tools.restore_diffopt(vim)
+        vim.command.assert_not_called()
+
+    def test_restore_leaves_a_linematch_the_user_set_again(self):
+        vim = _make_vim_for_large(10, diffopt="internal,linematch:40,algorithm:patience")
+        mcp_tools._enhance_diffopt(vim, large=True)
+        vim._large_state["diffopt"] = "internal,linematch:90,algorithm:patience"
+        vim.command.reset_mock()
+        mcp_tools.restore_diffopt(vim)
+        vim.command.assert_not_called()
+
+    def test_git_diff_large_side_skips_filetype_detection(self):
+        vim = _make_vim_for_large(10)
+        side_a = (["x" * 20], "a.py@HEAD", "a.py")
+        side_b = (["y"], "a.py@worktree", "a.py")
+        assert mcp_tools._is_large_git_diff(vim, side_a, side_b)
+        mcp_tools._open_git_diff_tab(vim, side_a, side_b, True)
+        commands = [c.args[0] for c in vim.command.call_args_list]
+        assert not any("filetype detect" in c for c in commands)
+        assert any("syntax=OFF" in c and c.endswith("file a.py@HEAD") for c in commands)
+        assert vim._large_state["eventignore"] == ""
+
+    def test_reused_tab_clears_syntax_and_restores_folding_later(self):
+        vim = _make_vim_for_large(10)
+        base_eval = vim.eval.side_effect
+        vim.eval.side_effect = lambda expr: ["2"] if expr.startswith("filter(range(1, tabpagenr('$'))") else base_eval(expr)
+        mcp_tools._exec_show_diff(vim, {"content_a": "x" * 20, "content_b": "y", "reuse_tab": True})
+        commands = [c.args[0] for c in vim.command.call_args_list]
+        assert commands.count("setlocal filetype= syntax=OFF synmaxcol=200 | syntax clear") == 2
+
+        vim.command.reset_mock()
+        result = mcp_tools._exec_show_diff(vim, {"content_a": "x", "content_b": "y", "reuse_tab": True})
+        commands = [c.args[0] for c in vim.command.call_args_list]
+        assert "large-content mode" not in result
+        assert sum(c.startswith("if get(w:, 'mcp_diff_large', 0)") for c in commands) == 2
+
+    def test_lazy_tabs_report_large_diffs(self):
+        vim = _make_vim_for_large(10)
+        ids = [mcp_tools._store_lazy_diff((["a"], "a", "a"), (["b"], "b", "b")) for _ in range(2)]
+        result = mcp_tools._exec_open_lazy_git_diffs(vim, {"diffs": [
+            {"id": ids[0], "label": "a", "sizes": [2, 2]},
+            {"id": ids[1], "label": "b", "sizes": [2, 50]},
+        ]})
+        assert result == {"large": [ids[1]]}
+
+
+class TestUnifiedDiffView:
+    def test_split_view_still_runs_on_main_thread(self, main_thread):
+        assert mcp_tools.call_tool("show_diff", {"content_a": "x", "content_b": "y"}) == "ok"
+        assert main_thread.calls[0][0] == "show_diff"
+
+    def test_content_is_diffed_off_the_main_thread(self, main_thread):
+        result = mcp_tools.call_tool("show_diff", {
+            "content_a": "one\ntwo\nthree\n", "content_b": "one\n2\nthree\n",
+            "label_a": "old", "label_b": "new", "view": "unified", "context": 0,
+        })
+        assert result == "Showing unified diff in new tab: old vs new (1 hunks in the quickfix list)"
+        func_name, args = main_thread.calls[0]
+        assert func_name == "_show_unified_diff"
+        assert args["lines"] == ["--- old", "+++ new", "@@ -2 +2 @@", "-two", "+2"]
+        assert args["hunks"] == [{"lnum": 3, "text": "new @@ -2 +2 @@"}]
+
+    def test_file_mode_reads_files(self, tmp_path, main_thread):
+        (tmp_path / "a").write_text("a\n", encoding="utf-8")
+        (tmp_path / "b").write_text("b\n", encoding="utf-8")
+        mcp_tools.call_tool("show_diff", {
+            "file_a": str(tmp_path / "a"), "file_b": str(tmp_path / "b"), "view": "unified",
+        })
+        assert main_thread.calls[0][1]["lines"][:2] == [f"--- {tmp_path / 'a'}", f"+++ {tmp_path / 'b'}"]
+
+    def test_identical_sides_open_nothing(self, main_thread):
+        result = mcp_tools.call_tool("show_diff", {"content_a": "x", "content_b": "x", "view": "unified"})
+        assert result == "No differences between a vs b"
+        assert main_thread.calls == []
+
+    def test_unknown_view_is_rejected(self, main_thread):
+        result = mcp_tools.call_tool("show_diff", {"content_a": "x", "content_b": "y", "view": "inline"})
+        assert result == {"error": "Unknown view: inline"}
+
+    def test_all_files_go_into_one_buffer(self, monkeypatch, tmp_path, main_thread):
+        TestShowGitDiffAllFiles()._patch(monkeypatch, main_thread, str(tmp_path), b"M\0a.py\0M\0b.py\0")
+        result = mcp_tools.call_tool("show_git_diff", {
+            "path": str(tmp_path), "all_files": True, "staged": True, "view": "unified",
+        })
+        func_name, args = main_thread.calls[0]
+        assert func_name == "_show_unified_diff"
+        assert args["title"] == "HEAD vs index"
+        assert [h["lnum"] for h in args["hunks"]] == [3, 8]
+        assert args["lines"][5:8] == ["--- b.py@HEAD", "+++ b.py@index", "@@ -1 +1 @@"]
+        assert "2 hunks" in result
+
+    def test_exec_fills_diff_buffer_and_quickfix(self):
+        vim = MagicMock()
+        vim.current.buffer.number = 7
+        del vim.Function
+        result = mcp_tools._exec_show_unified_diff(vim, {
+            "title": "a vs b",
+            "lines": ["--- a", "+++ b", "@@ -1 +1 @@", "-x", "+y"],
+            "hunks": [{"lnum": 3, "text": "b @@ -1 +1 @@"}],
+        })
+        commands = [c.args[0] for c in vim.command.call_args_list]
+        assert commands[0] == "tabnew"
+        assert "bufhidden=hide" in commands[1]
+        assert "setlocal filetype=diff nomodifiable" in commands
+        assert vim.current.buffer.__setitem__.call_args.args[1][2] == "@@ -1 +1 @@"
+        setqflist = vim.eval.call_args.args[0]
+        assert setqflist.startswith("setqflist([], 'r', ")
+        assert '"bufnr": 7, "lnum": 3' in setqflist
+        assert '"title": "diff: a vs b"' in setqflist
+        assert "a vs b" in result
+
+
+class TestFiletypeCache:
+    def test_cached_filetype_skips_detection_on_refill(self):
+        mcp_tools._FILETYPE_CACHE["y.rs"] = "rust"
+        vim = _make_vim_for_reuse(reuse_tabs=[1], keys={3: "x.py", 4: "x.py"})
+        mcp_tools._reuse_git_diff_tab(vim, (["a"], "y.rs@HEAD", "y.rs"), (["b"], "y.rs@working tree", "y.rs"))
+        commands = [c.args[0] for c in vim.command.call_args_list]
+        assert not any("filetype detect" in c for c in commands)
+        assert commands.count("setlocal filetype=rust") == 2
+        assert "let b:mcp_diff_detect_key = 'y.rs'" in commands
+
+    def test_names_with_the_same_extension_are_detected_separately(self):
+        vim = _make_vim_for_git_diff()
+        base_eval = vim.eval.side_effect
+        vim.eval.side_effect = lambda expr: "cmake" if expr == "&filetype" else base_eval(expr)
+        mcp_tools._setup_git_diff_buffer(vim, ["x"], "CMakeLists.txt@HEAD", "CMakeLists.txt")
+        mcp_tools._setup_git_diff_buffer(vim, ["x"], "notes.txt@HEAD", "notes.txt")
+        commands = [c.args[0] for c in vim.command.call_args_list]
+        assert sum("filetype detect" in c for c in commands) == 2
+
+    def test_cache_is_bounded(self, monkeypatch):
+        monkeypatch.setattr(mcp_tools, "_FILETYPE_CACHE_ENTRIES", 2)
+        vim = MagicMock()
+        vim.eval.return_value = "text"
+        for name in ("a", "b", "c"):
+            mcp_tools._remember_filetype(vim, name)
+        assert list(mcp_tools._FILETYPE_CACHE) == ["b", "c"]
+
+
+class TestToolContext:
+    def _vim(self, eventignore="", overrides=None):
+        vim = _make_vim_for_git_diff()
+        vim._state["eventignore"] = eventignore
+        vim._state["overrides"] = overrides or {}
+        return vim
+
+    def _run(self, vim, func_name, func):
+        return mcp_tools._run_in_tool_context(vim, func_name, func)
+
+    def test_switch_events_are_ignored_and_restored(self):
+        vim = self._vim(eventignore="CursorHold")
+        seen = {}
+
+        def work(vim):
+            seen["eventignore"] = vim._state["eventignore"]
+            seen["lazyredraw"] = vim._state["lazyredraw"]
+            return "done"
+
+        assert self._run(vim, "show_diff", work) == "done"
+        assert seen["eventignore"] == "CursorHold," + mcp_tools._SWITCH_EVENTS
+        assert seen["lazyredraw"] == "1"
+        assert vim._state["eventignore"] == "CursorHold"
+        assert vim._state["lazyredraw"] == "0"
+
+    def test_tools_without_context_are_untouched(self):
+        vim = self._vim()
+        self._run(vim, "get_cursor", lambda vim: None)
+        vim.command.assert_not_called()
+        vim.eval.assert_not_called()
+
+    def test_lazyredraw_only_tools_keep_events(self):
+        vim = self._vim()
+        self._run(vim, "open_file", lambda vim: None)
+        commands = [c.args[0] for c in vim.command.call_args_list]
+        assert "set lazyredraw" in commands
+        assert not any(c.startswith("set eventignore+=") for c in commands)
+
+    def test_user_override_per_tool(self):
+        vim = self._vim(overrides={"show_diff": "", "open_file": "BufEnter", "show_git_diff": "Bad Event"})
+        self._run(vim, "show_diff", lambda vim: None)
+        self._run(vim, "open_file", lambda vim: None)
+        self._run(vim, "show_git_diff", lambda vim: None)
+        ignored = [c.args[0] for c in vim.command.call_args_list if c.args[0].startswith("set eventignore+=")]
+        assert ignored == ["set eventignore+=BufEnter", "set eventignore+=" + mcp_tools._SWITCH_EVENTS]
+
+    def test_internal_tools_use_public_override_name(self):
+        vim = self._vim(overrides={"open_lazy_git_diffs": ""})
+        self._run(vim, "_open_lazy_git_diffs", lambda vim: None)
+        assert not any(c.args[0].startswith("set eventignore+=") for c in vim.command.call_args_list)
+
+    def test_enter_events_replayed_when_window_changed(self):
+        vim = self._vim()
+
+        def work(vim):
+            vim._state["window"] = "1001"
+
+        self._run(vim, "show_diff", work)
+        commands = [c.args[0] for c in vim.command.call_args_list]
+        assert commands[-2:] == [
+            "silent doautocmd <nomodeline> WinEnter",
+            "silent doautocmd <nomodeline> BufEnter",
+        ]
+
+    def test_restores_after_error(self):
+        vim = self._vim(eventignore="all")
+
+        def work(vim):
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            self._run(vim, "save_buffer", work)
+        assert vim._state["eventignore"] == "all"
+        assert vim._state["lazyredraw"] == "0"
+
+
+class _VimError(Exception):
+    pass
+
+
+def _make_vim_for_save(buffers, current=1, windows=None, popupwin=True, modified=()):
+    vim = MagicMock()
+    vim.error = _VimError
+    vim.buffers = {b.number: b for b in buffers}
+    vim.current.buffer = vim.buffers[current]
+    windows = windows or {}
+    failing = set()
+
+    def eval_(expr):
+        if expr == "get(g:, 'mcp_server_allow_save', 0)":
+            return "1"
+        if expr.startswith("get(win_findbuf("):
+            return str(windows.get(int(expr[len("get(win_findbuf("):].split(")")[0]), -1))
+        if expr == "has('popupwin')":
+            return "1" if popupwin else "0"
+        if expr.startswith("popup_create("):
+            return "5000"
+        if expr.startswith("map(filter(getbufinfo({'bufmodified': 1})"):
+            return [str(n) for n in modified]
+        return "0"
+
+    def command(cmd):
+        if cmd == "call win_execute(5000, 'write')" and 5000 in failing:
+            raise _VimError("E212: Can't open file for writing")
+
+    vim.eval.side_effect = eval_
+    vim.command.side_effect = command
+    vim._failing = failing
+    return vim
+
+
+class TestExecSaveBuffer:
+    def _commands(self, vim):
+        return [c.args[0] for c in vim.command.call_args_list]
+
+    def test_current_buffer_is_written_in_place(self):
+        vim = _make_vim_for_save([_ListBuffer(1, "/tmp/a.py", [])])
+        assert mcp_tools._exec_save_buffer(vim, {}) == "Saved buffer 1: /tmp/a.py"
+        assert self._commands(vim) == ["write"]
+
+    def test_visible_buffer_is_written_from_its_window(self):
+        vim = _make_vim_for_save([_ListBuffer(1, "/tmp/a.py", []), _ListBuffer(2, "/tmp/b.py", [])], windows={2: 1001})
+        mcp_tools._exec_save_buffer(vim, {"buffer_id": 2})
+        assert self._commands(vim) == ["call win_execute(1001, 'write')"]
+
+    def test_hidden_buffer_is_written_from_a_hidden_popup(self):
+        vim = _make_vim_for_save([_ListBuffer(1, "/tmp/a.py", []), _ListBuffer(2, "/tmp/b.py", [])])
+        mcp_tools._exec_save_buffer(vim, {"buffer_id": 2})
+        assert "popup_create(2, {'hidden': 1})" in [c.args[0] for c in vim.eval.call_args_list]
+        assert self._commands(vim) == ["call win_execute(5000, 'write')", "call popup_close(5000)"]
+
+    def test_popup_is_closed_when_write_fails(self):
+        vim = _make_vim_for_save([_ListBuffer(1, "/tmp/a.py", []), _ListBuffer(2, "/tmp/b.py", [])])
+        vim._failing.add(5000)
+        with pytest.raises(_VimError):
+            mcp_tools._exec_save_buffer(vim, {"buffer_id": 2})
+        assert self._commands(vim)[-1] == "call popup_close(5000)"
+
+    def test_without_popups_switches_without_autocommands(self):
+        vim = _make_vim_for_save([_ListBuffer(1, "/tmp/a.py", []), _ListBuffer(2, "/tmp/b.py", [])], popupwin=False)
+        mcp_tools._exec_save_buffer(vim, {"buffer_id": 2})
+        assert self._commands(vim) == [
+            "noautocmd keepalt keepjumps hide buffer 2",
+            "write",
+            "noautocmd keepalt keepjumps hide buffer 1",
+        ]
+
+    def test_saves_listed_buffers_and_reports_each(self):
+        buffers = [_ListBuffer(1, "/tmp/a.py", []), _ListBuffer(2, "/tmp/b.py", [])]
+        vim = _make_vim_for_save(buffers, windows={2: 1001})
+        result = mcp_tools._exec_save_buffer(vim, {"buffer_ids": [1, 2, 9]})
+        assert result == (
+            "Saved 2 of 3 buffers\n"
+            "Saved buffer 1: /tmp/a.py\n"
+            "Saved buffer 2: /tmp/b.py\n"
+            "Buffer 9 not found"
+        )
+
+    def test_all_modified_continues_past_failures(self):
+        buffers = [_ListBuffer(1, "/tmp/a.py", []), _ListBuffer(2, "/tmp/b.py", []), _ListBuffer(3, "/tmp/c.py", [])]
+        vim = _make_vim_for_save(buffers, windows={3: 1003}, modified=(2, 3))
+        vim._failing.add(5000)
+        result = mcp_tools._exec_save_buffer(vim, {"all_modified": True})
+        assert result.startswith("Saved 1 of 2 buffers\nFailed to save buffer 2: E212")
+        assert result.endswith("Saved buffer 3: /tmp/c.py")
+
+    def test_nothing_modified(self):
+        vim = _make_vim_for_save([_ListBuffer(1, "/tmp/a.py", [])])
+        assert mcp_tools._exec_save_buffer(vim, {"all_modified": True}) == "No buffers to save"
+
+    def test_all_failures_are_an_error(self):
+        vim = _make_vim_for_save([_ListBuffer(1, "/tmp/a.py", [])])
+        result = mcp_tools._exec_save_buffer(vim, {"buffer_ids": [7]})
+        assert result == {"error": "Buffer 7 not found"}
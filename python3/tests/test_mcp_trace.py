@@ -0,0 +1,162 @@
+import json
+import threading
+import time
+import urllib.request
+
+import mcp_server
+import mcp_tools
+import mcp_trace
+import mcp_vim_bridge
+
+
+def _post(port, payload):
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}/mcp",
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return json.loads(response.read())
+
+
+def _call(name, meta=None):
+    params = {"name": name, "arguments": {}}
+    if meta is not None:
+        params["_meta"] = meta
+    return {"jsonrpc": "2.0", "id": 7, "method": "tools/call", "params": params}
+
+
+def _run_vim_loop(stop):
+    while not stop.is_set():
+        for req_id, func_name, args in mcp_vim_bridge.drain_requests():
+            mcp_vim_bridge.post_result(req_id, "line 1, column 1")
+        time.sleep(0.005)
+
+
+class TestTraceState:
+    def test_status_follows_enable_and_disable(self):
+        assert mcp_trace.status() == "MCP request tracing is off"
+        assert mcp_trace.enable("/tmp/t.jsonl") == "MCP request tracing is on, logging to /tmp/t.jsonl"
+        assert mcp_trace.is_enabled()
+        assert mcp_trace.disable() == "MCP request tracing is off"
+
+    def test_begin_only_traces_when_wanted_or_enabled(self):
+        assert mcp_trace.begin() is None
+        mcp_trace.add("execute", 1.0)
+        assert mcp_trace.begin(True) == {"phases": {}}
+        mcp_trace.add("execute", 0.001)
+        mcp_trace.add("execute", 0.002)
+        assert mcp_trace.breakdown(mcp_trace.current()) == {"execute": 3.0}
+        mcp_trace.end()
+        assert mcp_trace.current() is None
+
+    def test_write_appends_json_lines(self, tmp_path):
+        path = tmp_path / "sub" / "trace.jsonl"
+        mcp_trace.write({"tool": "ignored"})
+        mcp_trace.enable(str(path))
+        mcp_trace.write({"tool": "a"})
+        mcp_trace.write({"tool": "b"})
+        lines = path.read_text().splitlines()
+        assert [json.loads(line)["tool"] for line in lines] == ["a", "b"]
+
+
+class TestBridgePhases:
+    def test_phases_cover_the_main_thread_round_trip(self):
+        holder = {}
+
+        def submit():
+            mcp_trace.begin(True)
+            mcp_vim_bridge.submit_request("t-1", "get_cursor", {})
+            holder["phases"] = mcp_trace.current()["phases"]
+            mcp_trace.end()
+
+        thread = threading.Thread(target=submit)
+        thread.start()
+        while mcp_vim_bridge._request_queue.qsize() == 0:
+            time.sleep(0.001)
+        time.sleep(0.02)
+        assert [r[0] for r in mcp_vim_bridge.drain_requests()] == ["t-1"]
+        time.sleep(0.01)
+        mcp_vim_bridge.post_result("t-1", "ok")
+        thread.join(timeout=2)
+
+        phases = holder["phases"]
+        assert set(phases) == {"tick_wait", "queue_wait", "execute", "wakeup"}
+        assert phases["tick_wait"] >= 0.015
+        assert phases["execute"] >= 0.005
+        assert phases["queue_wait"] == 0
+
+    def test_later_requests_of_a_tick_wait_for_earlier_ones(self):
+        mcp_vim_bridge._request_times["a"] = ["get_cursor", 0.0, None, None, None]
+        mcp_vim_bridge._request_times["b"] = ["get_cursor", 0.0, None, None, None]
+        try:
+            mcp_vim_bridge.drain_requests()
+            for key in ("a", "b"):
+                mcp_vim_bridge._request_times[key][2] = 10.0
+            mcp_vim_bridge._last_tick["cursor"] = 10.0
+            mcp_vim_bridge.post_result("a", "ok")
+            a_posted = mcp_vim_bridge._request_times["a"][4]
+            mcp_vim_bridge.post_result("b", "ok")
+            assert mcp_vim_bridge._request_times["a"][3] == 10.0
+            assert mcp_vim_bridge._request_times["b"][3] == a_posted
+        finally:
+            with mcp_vim_bridge._result_lock:
+                for key in ("a", "b"):
+                    mcp_vim_bridge._request_times.pop(key, None)
+                    mcp_vim_bridge._result_slots.pop(key, None)
+
+
+class TestTimingInResponses:
+    def _serve(self):
+        mcp_server.start(0)
+        return mcp_server._server.server_address[1]
+
+    def test_meta_breakdown_on_request(self):
+        stop = threading.Event()
+        loop = threading.Thread(target=_run_vim_loop, args=(stop,))
+        loop.start()
+        port = self._serve()
+        try:
+            plain = _post(port, _call("get_cursor"))
+            traced = _post(port, _call("get_cursor", {mcp_trace.META_KEY: True}))
+        finally:
+            mcp_server.stop()
+            stop.set()
+            loop.join(timeout=2)
+        assert "_meta" not in plain["result"]
+        timing = traced["result"]["_meta"][mcp_trace.META_KEY]
+        assert {"http_parse", "handler", "tick_wait", "queue_wait", "execute", "wakeup"} <= set(timing["phases_ms"])
+        assert timing["total_ms"] >= timing["phases_ms"]["handler"]
+
+    def test_worker_tools_have_no_main_thread_phases(self, monkeypatch):
+        monkeypatch.setitem(mcp_tools._WORKER_TOOLS, "get_cursor", lambda args: "done")
+        port = self._serve()
+        try:
+            traced = _post(port, _call("get_cursor", {mcp_trace.META_KEY: True}))
+        finally:
+            mcp_server.stop()
+        assert set(traced["result"]["_meta"][mcp_trace.META_KEY]["phases_ms"]) == {"http_parse", "handler"}
+
+    def test_trace_on_logs_every_call(self, tmp_path):
+        path = tmp_path / "trace.jsonl"
+        mcp_trace.enable(str(path))
+        stop = threading.Event()
+        loop = threading.Thread(target=_run_vim_loop, args=(stop,))
+        loop.start()
+        port = self._serve()
+        try:
+            response = _post(port, _call("get_cursor"))
+            _post(port, {"jsonrpc": "2.0", "id": 8, "method": "ping"})
+        finally:
+            mcp_server.stop()
+            stop.set()
+            loop.join(timeout=2)
+        assert mcp_trace.META_KEY in response["result"]["_meta"]
+        records = [json.loads(line) for line in path.read_text().splitlines()]
+        assert len(records) == 1
+        record = records[0]
+        assert record["tool"] == "get_cursor"
+        assert record["id"] == 7
+        assert record["error"] is False
+        assert "serialize" in record["phases_ms"]
+        assert record["response_bytes"] > 0